@@ -1,8 +1,11 @@
 # Standard modules
-from typing import Optional
+import asyncio
+import logging
+from time import time
+from typing import Dict, Optional
 
 # Third party modules
-from nextcord import Interaction, Member, SlashOption, slash_command
+from nextcord import Guild, Interaction, Member, SlashOption, TextChannel, slash_command
 from nextcord.ext.application_checks import has_guild_permissions
 from nextcord.ext.commands import (
     Bot,
@@ -12,12 +15,16 @@ from nextcord.ext.commands import (
 )
 
 # Internal modules
-from utility import request_handler as rh
+from utility import backfill, cache, purge, request_handler as rh
+from utility.redis import redis
 
 
 class AdminCommands(Cog):
     def __init__(self, bot: Bot):
         self.bot: Bot = bot
+        self.backfills: Dict[int, asyncio.Task] = {}
+        # guild id -> time the current /purge preview is evaluated at.
+        self.previews: Dict[int, float] = {}
 
     @slash_command(name = "set")
     @has_guild_permissions(administrator = True)
@@ -31,10 +38,19 @@ class AdminCommands(Cog):
         interaction: Interaction,
         enabled: bool = SlashOption(required = True)
     ):
-        guild_settings = rh.get_guilds(interaction.guild.id)["guild"]["settings"]
+        guild_settings: dict = await cache.guild_settings(redis, interaction.guild.id)
+        changed: bool = bool(guild_settings.get("auto_kick")) != enabled
         guild_settings["auto_kick"] = enabled
 
-        rh.update_guild(interaction.guild.id, **{"settings": guild_settings})
+        await cache.store_guild_settings(redis, interaction.guild.id, guild_settings)
+        await interaction.response.send_message(
+            f"Auto kick {'enabled' if enabled else 'disabled'}.", ephemeral = True
+        )
+        await rh.update_guild(interaction.guild.id, **{"settings": guild_settings})
+
+        # Members who were already inactive are scheduled, or unscheduled, as well.
+        if changed:
+            await purge.set_auto_kick(redis, interaction.guild.id, guild_settings, enabled)
 
 
     @set.subcommand(name = "time_until_inactive", description = "How long until members should be set inactive?")
@@ -43,10 +59,14 @@ class AdminCommands(Cog):
         interaction: Interaction,
         days: int = SlashOption(default = 30, min_value = 7),
     ):
-        guild_settings: dict = rh.get_guilds(interaction.guild.id)["guild"]["settings"]
+        guild_settings: dict = await cache.guild_settings(redis, interaction.guild.id)
         guild_settings["set_inactive"] = days
 
-        rh.update_guild(interaction.guild.id, **{"settings": guild_settings})
+        await cache.store_guild_settings(redis, interaction.guild.id, guild_settings)
+        await interaction.response.send_message(
+            f"Members will be set inactive after {days} days.", ephemeral = True
+        )
+        await rh.update_guild(interaction.guild.id, **{"settings": guild_settings})
 
 
     @set.subcommand(name = "auto_prune_timer", description = "Prune members after this long after falling inactive.")
@@ -55,10 +75,14 @@ class AdminCommands(Cog):
         interaction: Interaction,
         days: int = SlashOption(default = 14, min_value = 7),
     ):
-        guild_settings: dict = rh.get_guilds(interaction.guild.id)["guild"]["settings"]
+        guild_settings: dict = await cache.guild_settings(redis, interaction.guild.id)
         guild_settings["auto_prune_timer"] = days
 
-        rh.update_guild(interaction.guild.id, **{"settings": guild_settings})
+        await cache.store_guild_settings(redis, interaction.guild.id, guild_settings)
+        await interaction.response.send_message(
+            f"Inactive members will be pruned after {days} days.", ephemeral = True
+        )
+        await rh.update_guild(interaction.guild.id, **{"settings": guild_settings})
 
     @set.error
     async def set_error(interaction: Interaction, error):
@@ -75,7 +99,7 @@ class AdminCommands(Cog):
         interaction: Interaction,
         member: Optional[Member] = SlashOption(required = False)
     ):
-        auto_prune_timer: bool = rh.get_guilds(interaction.guild.id)["guild"]["settings"]["auto_prune_timer"]
+        auto_prune_timer: int = (await cache.guild_settings(redis, interaction.guild.id)).get("auto_prune_timer")
 
         if member:
             if member.dm_channel:
@@ -89,8 +113,8 @@ class AdminCommands(Cog):
                                              f'{interaction.guild.name}.'
                                             )
         else:
-            interaction.guild.system_channel.send("@everyone!")
-            interaction.guild.system_channel.send("https://tenor.com/view/wake-the-fuck-up-samuel-l-jackson-wake-up-gif-5635365")
+            await interaction.guild.system_channel.send("@everyone!")
+            await interaction.guild.system_channel.send("https://tenor.com/view/wake-the-fuck-up-samuel-l-jackson-wake-up-gif-5635365")
 
 
     @ping.error
@@ -110,11 +134,52 @@ class AdminCommands(Cog):
     @slash_command(name = "baseline")
     @has_guild_permissions(administrator = True)
     async def baseline(self, interaction: Interaction):
-        # To be performed automatically, but can also be done manually in the same way setup is done.
-        # This is to establish a baseline for the server.
-        # For message in messages, look for last sent message by each member in the guild and update last_activity_ts.
+        # Establishes a baseline for the server by finding each member's last message in the
+        # channel history. It runs in the background and resumes after a restart.
+        if interaction.guild.id in self.backfills:
+            await interaction.response.send_message(
+                "I'm already reading through this server's history.", ephemeral = True
+            )
+            return
+
+        await interaction.response.send_message(
+            "Reading through the history. I'll post here when I'm done.", ephemeral = True
+        )
+        self._start_backfill(interaction.guild, interaction.channel)
+
+    def _start_backfill(self, guild: Guild, channel: Optional[TextChannel] = None):
+        task = asyncio.create_task(self._backfill(guild, channel))
+        self.backfills[guild.id] = task
+        task.add_done_callback(lambda _: self.backfills.pop(guild.id, None))
+
+    async def _backfill(self, guild: Guild, channel: Optional[TextChannel]):
+        try:
+            expiry = getattr(self.bot.get_cog("Listeners"), "expiry", None)
+            result = await backfill.HistoryBackfill(redis, guild, expiry = expiry).run()
+        except Exception:
+            logging.exception(f"Baseline of guild {guild.id} failed.")
+            return
+
+        logging.info(f"Baseline of guild {guild.id}: {result}")
+
+        if channel is not None:
+            await channel.send(
+                f"Baseline done: {result.messages} messages in {result.channels} channels, "
+                f"{result.members} members updated."
+                + (f" {result.failed} channels could not be read." if result.failed else "")
+            )
 
-        pass
+    # Resumes any baseline that a restart interrupted.
+    @Cog.listener()
+    async def on_ready(self):
+        pipe = redis.pipeline(transaction = False)
+
+        for guild in self.bot.guilds:
+            pipe.exists(backfill.state_key(guild.id))
+
+        for guild, interrupted in zip(self.bot.guilds, await pipe.execute()):
+            if interrupted and guild.id not in self.backfills:
+                self._start_backfill(guild)
 
     @baseline.error
     async def backlog_error(self, interaction: Interaction, error):
@@ -124,5 +189,58 @@ class AdminCommands(Cog):
             )
 
 
+    @slash_command(name = "purge")
+    @has_guild_permissions(kick_members = True)
+    async def purge(self, interaction: Interaction):
+        pass
+
+
+    @purge.subcommand(name = "preview", description = "Who would be pruned with auto kick on?")
+    async def purge_preview(
+        self,
+        interaction: Interaction,
+        page: int = SlashOption(default = 1, min_value = 1),
+    ):
+        guild_id = interaction.guild.id
+        taken_at = self.previews.get(guild_id, 0)
+        fresh = page == 1 or time() - taken_at > purge.PREVIEW_TTL
+
+        if fresh:
+            taken_at = self.previews[guild_id] = time()
+
+        settings = await cache.guild_settings(redis, guild_id)
+        result = await purge.preview(redis, guild_id, settings, taken_at, page - 1, fresh = fresh)
+        pages = max(1, -(-result.removable // purge.PREVIEW_PAGE))
+
+        lines = [
+            f"{result.removable} of {result.members} members would be pruned with auto kick on: "
+            f"those marked inactive ({result.inactive}) who are still idle past the threshold. "
+            "Each goes at their purge deadline, which auto kick sets "
+            f"{settings.get('auto_prune_timer') or 14} days after it is switched on for members "
+            "already inactive.",
+        ]
+
+        if result.untracked:
+            lines.append(
+                f"{result.untracked} members have no recorded activity and are not counted."
+            )
+
+        lines += [
+            f"<@{member_id}> idle for {int((taken_at - ts) // 86400)} days, pruned in "
+            f"{max(0, int((deadline - taken_at) // 86400))} days"
+            for member_id, ts, deadline in result.page
+        ]
+        lines.append(f"Page {page} of {pages}.")
+
+        await interaction.response.send_message("\n".join(lines), ephemeral = True)
+
+    @purge.error
+    async def purge_error(self, interaction: Interaction, error):
+        if isinstance(error, MissingPermissions):
+            await interaction.response.send_message(
+                "Unfortunately, you do not have the required permissions to perform this command."
+            )
+
+
 def setup(bot):
     bot.add_cog(AdminCommands(bot))
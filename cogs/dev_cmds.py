@@ -9,6 +9,7 @@ from nextcord.ext.commands import CheckFailure, Cog, Context, command
 # Internal modules
 import utility.request_handler as rh
 from utility.decorators.checks import user_is_bot_developer
+from utility.loader import MemberLoader
 
 
 class DevCommands(Cog):
@@ -34,21 +35,22 @@ class DevCommands(Cog):
         sys_chan = guild.system_channel
 
         # Add guild
-        response = rh.guild(guild.id)
+        response = await rh.guild(guild.id)
 
-        if response.status_code != 200:
+        if response["code"] != 200:
             await sys_chan.send(
                 "I couldn't find any coffee. I no workee without coffee. Please pass a this code to my"
-                " owner: {0}".format(response.status_code)
+                " owner: {0}".format(response["code"])
             )
         else:
             await sys_chan.send("I'm now in business! Time to start collecting names")
 
         # Add members
-        for member in guild.members:
-            response = rh.member(guild.id, member)
+        gql_members = await MemberLoader().load_many(
+            guild.id, (member.id for member in guild.members if not member.bot)
+        )
 
-        if response == 200:
+        if all(gql_members):
             await sys_chan.send(
                 "Names have been collected, eyeglasses have been cleaned, and bunnies have been killed. Carry on."
             )
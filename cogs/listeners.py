@@ -1,22 +1,77 @@
 # Standard modules
-import json
+import asyncio
+import logging
+from time import time
 
 # Third party modules
-import arrow
-from nextcord import Guild, Member, Message, TextChannel, User
+from nextcord import (
+    Guild,
+    Interaction,
+    Member,
+    Message,
+    RawReactionActionEvent,
+    Status,
+    TextChannel,
+    ThreadMember,
+    User,
+    VoiceState,
+)
 from nextcord.ext.commands import Bot, Cog
 from nextcord.utils import get
 
 # Internal modules
-import utility.request_handler as rh
-from main import redis
-from utility.helpers import _check_time_idle
+from utility import cache
+from utility.activity import ActivityAggregator
+from utility.batcher import writer
+from utility.idle_expiry import IdleExpiry
+from utility.ingest import ActivityIngest
+from utility.onboarding import onboard_member
+from utility.redis import redis
+from utility.roles import RoleReconciler, inactive_role
+from utility.voice import VoiceTracker
+
+
+# Only presence changes the member made count as activity: coming online, or starting an activity
+# they did not have before. Activities are told apart by type and name, so passive updates of a
+# running one, such as the next Spotify track or a game's rich presence, are not counted.
+def started_something(before: Member, after: Member) -> bool:
+    if after.status is Status.online and before.status is not Status.online:
+        return True
+
+    running = {(a.type, a.name) for a in before.activities}
+
+    return any((a.type, a.name) not in running for a in after.activities)
 
 
 class Listeners(Cog):
     def __init__(self, bot: Bot):
         self.bot: Bot = bot
         self.ignore_list: tuple = ("?ping", "?reset", "?check", "?sync")
+        self.roles: RoleReconciler = RoleReconciler(redis, bot)
+        self.expiry: IdleExpiry = IdleExpiry(redis)
+        self.expiry.reconciler = self.roles
+        self.activity: ActivityAggregator = ActivityAggregator(redis, expiry=self.expiry)
+        self.ingest: ActivityIngest = ActivityIngest(self.activity)
+        self.voice: VoiceTracker = VoiceTracker(redis, self.activity)
+        self.closed: bool = False
+
+    # Awaited by Presence.close before the writer, the client and Redis are closed, since the
+    # last flushes still go through all three.
+    async def shutdown(self):
+        self.closed = True
+        self.expiry.stop()
+        self.roles.stop()
+        await self.voice.close()
+        await self.activity.close()
+
+    def cog_unload(self):
+        if self.closed:
+            return
+
+        self.expiry.stop()
+        self.roles.stop()
+        asyncio.create_task(self.voice.flush())
+        asyncio.create_task(self.activity.flush())
 
     @Cog.listener()
     async def on_member_join(self, member: Member):
@@ -33,57 +88,24 @@ class Listeners(Cog):
         else:
             await general.send("Welcome {0.mention}!".format(member))
 
-        try:
-            member = rh.member(member.guild.id, member)
-
-            r_data = {k: "" if v is None else str(v) for k, v in member}
-            r_data["name"] = member.display_name if not member.nick else member.nick
-            r_data["status"] = member.status
-
-            redis.hset(f"member:{member.id}@{member.guild.id}", mapping=r_data)
-
-        except Exception:
-            raise
+        if not member.bot:
+            await onboard_member(redis, member, self.expiry)
 
     @Cog.listener()
     async def on_message(self, message: Message):
-        hset = redis.hset
-
         if message.guild is not None and message.author.status != "invisible":
             if message.content.startswith(self.ignore_list):
                 return
 
             if not message.author.bot:
-                dt: arrow.Arrow = arrow.utcnow().datetime
-                get_time_idle: dict = _check_time_idle(dt)
-                idle_stats: dict[str, int | list] = json.loads(
-                    redis.hget(f"guild_id:{message.guild.id}", "idleStats")
+                self.ingest.offer(
+                    "message",
+                    message.guild.id,
+                    message.author.id,
+                    message.channel.id,
+                    str(message.channel.type),
+                    message.created_at.timestamp(),
                 )
-                last_loc = json.loads(redis.hget(f"guild_id:{message.guild.id}", "lastAct"))
-                last_loc["ch"] = message.channel.id
-                last_loc["type"] = str(message.channel.type)
-                last_loc["ts"] = arrow.utcnow().isoformat()
-
-                hset(f"guild_id:{message.guild.id}", "last_loc", mapping=last_loc)
-
-                idle_stats["timesIdle"].append(get_time_idle)
-
-                if idle_stats["avgIdleTime"]:
-                    idle_stats["prevAvgs"].append(idle_stats["avgIdleTime"])
-                else:
-                    pass
-
-                idle_stats["avgIdleTime"] = sum(idle_stats["timesIdle"]) / len(
-                    idle_stats["timesIdle"]
-                )
-
-                if len(idle_stats["timesIdle"]) > 50:
-                    idle_stats["timesIdle"].remove(idle_stats["timesIdle"][0])
-
-                if len(idle_stats["prevAvgs"]) > 50:
-                    idle_stats["prevAvgs"].remove(idle_stats["prevAvgs"][0])
-
-                hset(f"guild_id:{message.guild.id}", "idleStats", mapping=idle_stats)
 
         elif (
             not message.guild
@@ -95,14 +117,72 @@ class Listeners(Cog):
                 "that I am in."
             )
 
+    @Cog.listener()
+    async def on_raw_reaction_add(self, payload: RawReactionActionEvent):
+        if payload.guild_id is None or (payload.member and payload.member.bot):
+            return
+
+        channel = self.bot.get_channel(payload.channel_id)
+        self.ingest.offer(
+            "reaction",
+            payload.guild_id,
+            payload.user_id,
+            payload.channel_id,
+            str(channel.type) if channel else "text",
+        )
+
+    @Cog.listener()
+    async def on_typing(self, channel, user, when):
+        if isinstance(user, Member) and not user.bot:
+            self.ingest.offer(
+                "typing", user.guild.id, user.id, channel.id, str(channel.type), when.timestamp()
+            )
+
+    @Cog.listener()
+    async def on_thread_member_join(self, member: ThreadMember):
+        thread = member.thread
+        guild_member = thread.guild.get_member(member.id)
+
+        if guild_member is not None and not guild_member.bot:
+            self.ingest.offer("thread", thread.guild.id, member.id, thread.id, str(thread.type))
+
+    @Cog.listener()
+    async def on_interaction(self, interaction: Interaction):
+        if interaction.guild_id is None or interaction.user is None or interaction.user.bot:
+            return
+
+        self.ingest.offer(
+            "interaction",
+            interaction.guild_id,
+            interaction.user.id,
+            interaction.channel_id or 0,
+            str(interaction.channel.type) if interaction.channel else "text",
+        )
+
+    # Coming online or changing what they are playing counts; going offline does not.
+    @Cog.listener()
+    async def on_presence_update(self, before: Member, after: Member):
+        if after.bot or str(after.status) == "offline":
+            return
+
+        if started_something(before, after):
+            self.ingest.offer("presence", after.guild.id, after.id, 0, "presence")
+
     @Cog.listener()
     async def on_member_update(self, before: Member, after: Member):
         try:
             if before.nick != after.nick:
-                rh.update_member(after.id, **{"nickname": after.nick})
+                writer.update_member(after.guild.id, after.id, nickname=after.nick)
             else:
                 pass
 
+            if before.roles != after.roles:
+                settings = await cache.guild_settings(redis, after.guild.id)
+                role = inactive_role(after.guild, settings)
+
+                if role is not None and (role in before.roles) != (role in after.roles):
+                    await self.roles.role_changed(after.guild.id, after.id, role in after.roles)
+
         except AttributeError:
             raise
 
@@ -112,48 +192,87 @@ class Listeners(Cog):
             if before.name != after.name or before.discriminator != after.discriminator:
                 username = f"{after.name}#{after.discriminator}"
 
-                rh.update_member(after.id, **{"username": username})
+                for guild in after.mutual_guilds:
+                    writer.update_member(guild.id, after.id, username=username)
             else:
                 pass
 
         except Exception:
             raise
 
-    """@Cog.listener()
-    async def on_voice_state_update(
-        self, member: Member, before: VoiceState, after: VoiceState
-    ):
-
-        with open("utility/storeTest.json", "rw") as file:
-            data: Dict = json.load(file)
-
-        guild_idx: int = next(
-            (
-                index
-                for (index, d) in enumerate(data)
-                if d["guild_id"] == member.guild.id
-            ),
-            None,
+    @Cog.listener()
+    async def on_voice_state_update(self, member: Member, before: VoiceState, after: VoiceState):
+        if member.bot:
+            return
+
+        self.voice.update(
+            member.guild.id,
+            member.id,
+            after.channel.id if after.channel else None,
+            _muted(after),
         )
-        member_idx: int = next(
-            (
-                index
-                for (index, d) in enumerate(data[guild_idx]["members"])
-                if d["member_id"] == member.id
-            ),
-            None,
-        )"""
+
+    @Cog.listener()
+    async def on_ready(self):
+        await self._reconcile_voice()
+
+        # Each step runs even if an earlier one failed, so e.g. Redis refusing the expiry
+        # subscription does not also leave roles unreconciled and idle members unmarked.
+        try:
+            await self.expiry.start()
+        except Exception:
+            logging.exception("Could not start listening for idle expiries.")
+
+        try:
+            self.roles.start()
+        except Exception:
+            logging.exception("Could not start the role reconciler.")
+
+        try:
+            await self.expiry.catch_up(guild.id for guild in self.bot.guilds)
+        except Exception:
+            logging.exception("Could not catch up on members who went idle while offline.")
+
+    @Cog.listener()
+    async def on_resumed(self):
+        await self._reconcile_voice()
+
+    @Cog.listener()
+    async def on_disconnect(self):
+        if self.voice.disconnected_at is None:
+            self.voice.disconnected_at = time()
+
+    # Closes sessions that ended while the gateway was away and opens ones that started.
+    async def _reconcile_voice(self):
+        for guild in self.bot.guilds:
+            in_voice = {
+                member_id: (channel.id, _muted(state))
+                for channel in (*guild.voice_channels, *guild.stage_channels)
+                for member_id, state in channel.voice_states.items()
+                if not getattr(guild.get_member(member_id), "bot", False)
+            }
+
+            try:
+                await self.voice.reconcile(guild.id, in_voice)
+            except Exception:
+                logging.exception("Could not reconcile voice sessions for guild %s.", guild.id)
+
+        self.voice.disconnected_at = None
 
     @Cog.listener()
     async def on_guild_update(self, before: Guild, after: Guild):
         try:
             if before.name != after.name:
-                rh.update_guild(after.id, **{"name": after.name})
+                writer.update_guild(after.id, name=after.name)
             else:
                 pass
         except Exception:
             raise
 
 
+def _muted(state: VoiceState) -> bool:
+    return state.self_mute or state.self_deaf or state.mute or state.deaf
+
+
 def setup(bot):
     bot.add_cog(Listeners(bot))
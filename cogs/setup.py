@@ -1,3 +1,7 @@
+# Standard modules
+import json
+import logging
+
 # Third party modules
 from nextcord import Guild
 from nextcord.ext.commands import Bot, Cog, bot_has_guild_permissions
@@ -5,7 +9,10 @@ from nextcord.utils import find
 
 # Internal modules
 import utility.request_handler as rh
-from main import redis
+from lib.typings import IdleStats
+from utility import cache
+from utility.onboarding import checkpoint_key, onboard_guild
+from utility.redis import redis
 
 
 class Setup(Cog):
@@ -33,7 +40,7 @@ class Setup(Cog):
     async def setup(self, guild: Guild):
         sys_chan = guild.system_channel
 
-        response = rh.guild(guild.id, guild.name)
+        response = await rh.guild(guild.id)
 
         if response["code"] != 200:
             await sys_chan.send(
@@ -41,57 +48,63 @@ class Setup(Cog):
                 f" owner: {response.status_code}"
             )
         else:
-            if not redis.exists(f"guild:{guild.id}:meta"):
+            if not await redis.exists(f"guild:{guild.id}:meta"):
                 meta = {
                     "guild_id": response["guild"]["guildId"],
                     "name": guild.name,
                     "status": response["guild"]["status"],
                     "date_added": response["guild"]["dateAdded"]
                 }
-                redis.hset(f"guild:{guild.id}:meta", mapping=meta)
+                await redis.hset(f"guild:{guild.id}:meta", mapping=meta)
 
                 stats = {
-                    "last_act": response["guild"]["lastAct"],
-                    "idle_stats": response["guild"]["idleStats"],
-                    "settings": response["guild"]["settings"]
+                    "last_act": json.dumps(response["guild"]["lastAct"]),
+                    "settings": json.dumps(response["guild"]["settings"])
                 }
-                redis.hset(f"guild:{guild.id}:stats", mapping=stats)
-
-            await sys_chan.send("I'm now in business! Time to start collecting names")
-
-            pipe = redis.pipeline()
+                await redis.hset(f"guild:{guild.id}:stats", mapping=stats)
+                await cache.invalidate(redis, "meta", guild.id)
+                await cache.invalidate(redis, "settings", guild.id)
 
-            for member in guild.members:
-                if member.bot:
-                    continue
+                # A guild with no recorded activity has null idle stats (or null fields in
+                # them). Its windows are then left for record_activity.lua to start empty.
+                idle_stats = response["guild"].get("idleStats") or {}
 
-                m_response = rh.member(guild.id, member)
-
-                if m_response["code"] != 200:
-                    await sys_chan.send(
-                        f"My pencil broke and I'm unable to write names. Received code {response['code']} from server."
-                    )
-                    break
-
-                if not redis.sismember(f"guild:{guild.id}:members", member.id):
-                    redis.sadd(f"guild:{guild.id}:members", member.id)
-                    r_data = {
-                        k: "" if v is None else str(v)
-                        for k, v in m_response["member"].items()
-                    }
-                    r_data["name"] = member.display_name
-                    pipe.hset(
-                        f"guild:{guild.id}:member:{member.id}",
-                        mapping=r_data,
+                if idle_stats and None not in idle_stats.values():
+                    await cache.store_idle_stats(
+                        redis, guild.id, IdleStats.model_validate(idle_stats)
                     )
 
-            if len(pipe.command_stack) > 0:
-                pipe.execute()
+            await sys_chan.send("I'm now in business! Time to start collecting names")
+
+            try:
+                await onboard_guild(redis, guild, expiry=self._expiry())
+            except Exception:
+                await sys_chan.send(
+                    "My pencil broke and I'm unable to write names. Please let my owner know."
+                )
+                raise
 
             await sys_chan.send(
                 "Names have been collected, eyeglasses have been cleaned, and bunnies have been killed. Carry on"
             )
 
+    # The listeners' handler, so role changes from onboarding wake its reconciler.
+    def _expiry(self):
+        return getattr(self.bot.get_cog("Listeners"), "expiry", None)
+
+    # Finishes onboarding any guild whose join was cut short by a restart.
+    @Cog.listener()
+    async def on_ready(self):
+        pipe = redis.pipeline(transaction=False)
+
+        for guild in self.bot.guilds:
+            pipe.exists(checkpoint_key(guild.id))
+
+        for guild, interrupted in zip(self.bot.guilds, await pipe.execute()):
+            if interrupted:
+                result = await onboard_guild(redis, guild, expiry=self._expiry())
+                logging.info(f"Resumed onboarding of {guild.id}: {result.members} members.")
+
 
 def setup(bot):
     bot.add_cog(Setup(bot))
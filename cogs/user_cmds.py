@@ -9,8 +9,12 @@ from nextcord import Interaction, Member, SlashOption, slash_command
 from nextcord.ext.commands import Bot, Cog
 
 # Internal modules
-from main import redis
-from utility.helpers import _check_time_idle
+from utility import cache, last_seen
+from utility.helpers import _check_time_idle, calculate_average_idle_time
+from utility.idle_expiry import DAY, inactive_after
+from utility.metrics import metrics
+from utility.moderation import moderation
+from utility.redis import pool_stats, redis, redis_raw
 
 
 class UserCommands(Cog):
@@ -33,16 +37,24 @@ class UserCommands(Cog):
     async def member_status_command(
         self, interaction: Interaction, member: Optional[Member] = SlashOption(required=False)
     ):
-        member = json.loads(redis.hgetall(f"guild:{interaction.guild.id}:member:{member.id}"))
-
-        iso_timestamp: str = member["last_activity_ts"]
-        status: str = member["status"]
-        timestamp: datetime.datetime = arrow.get(iso_timestamp).datetime
+        member_id: int = (member or interaction.user).id
+        display_name: str = (member or interaction.user).display_name
+        seen: Optional[float] = await last_seen.last_seen(redis, interaction.guild.id, member_id)
+        member = await redis.hgetall(f"guild:{interaction.guild.id}:member:{member_id}")
+
+        if seen is None:
+            await interaction.response.send_message("I haven't seen that member do anything yet.")
+            return
+
+        status: str = member.get("status", "active")
+        # Members only seen by activity tracking have no stored name yet.
+        name: str = member.get("name") or display_name
+        timestamp: datetime.datetime = arrow.get(seen).datetime
         get_idle_time: Dict = _check_time_idle(timestamp)
 
         if status != "active":
             await interaction.response.send_message(
-                f'I\'m sorry, but {member["name"]} is not currently active.'
+                f"I'm sorry, but {name} is not currently active."
             )
         else:
             idle_time: str = (
@@ -62,7 +74,7 @@ class UserCommands(Cog):
                 idle_time: str = f"{years} years, " + idle_time
 
             response_str: str = (
-                f'Last activity for {member["name"]} was '
+                f"Last activity for {name} was "
                 f"performed {idle_time} ago."
             )
 
@@ -70,11 +82,11 @@ class UserCommands(Cog):
 
     @status_command.subcommand(name="guild", description=help_lib["guild_status"])
     async def guild_status_command(self, interaction: Interaction):
-        guild_m = json.loads(redis.hgetall(f"guild:{interaction.guild.id}:meta"))
-        guild_s = json.loads(redis.hgetall(f"guild:{interaction.guild.id}:stats"))
+        guild_m = await cache.guild_meta(redis, interaction.guild.id)
+        guild_s = await redis.hgetall(f"guild:{interaction.guild.id}:stats")
 
-        iso_timestamp: str = guild_s["last_activity_ts"]
-        status: str = guild_m["status"]
+        iso_timestamp: str = json.loads(guild_s["last_act"])["ts"]
+        status: str = await cache.guild_status(redis, interaction.guild.id)
         timestamp: datetime.datetime = arrow.get(iso_timestamp).datetime
         get_idle_time: Dict = _check_time_idle(timestamp)
 
@@ -102,12 +114,71 @@ class UserCommands(Cog):
             response_str: str = (
                 f'Last activity for {guild_m["name"]} was ' f"performed {idle_time} ago."
             )
+            settings: Dict = await cache.guild_settings(redis, interaction.guild.id)
+            idle_for: int = inactive_after(settings)
+            idle_count: int = await last_seen.count_idle(redis, interaction.guild.id, idle_for)
+            response_str += (
+                f" {idle_count} members have been idle for over {idle_for / DAY:g} days."
+            )
+            times_idle, _ = await cache.guild_idle_windows(redis_raw, interaction.guild.id)
+
+            if times_idle:
+                average = calculate_average_idle_time(times_idle)
+                response_str += (
+                    f" It usually goes quiet for {average // 60} minutes between messages"
+                    f" (longest {times_idle.max // 60})."
+                )
 
             await interaction.response.send_message(response_str)
 
     @slash_command(name="bot_performance_check", description=help_lib["bot_performance"])
     async def performance_check_command(self, interaction: Interaction):
-        pass
+        snapshot = metrics.snapshot()
+
+        if not snapshot:
+            await interaction.response.send_message(
+                "No backend calls recorded yet.", ephemeral=True
+            )
+            return
+
+        rows = [f"{'operation':<22}{'count':>7}{'err':>5}{'p50 ms':>9}{'p99 ms':>9}{'avg B':>8}"]
+
+        for name, stats in snapshot.items():
+            rows.append(
+                f"{name[:21]:<22}{stats['count']:>7}{stats['errors']:>5}"
+                f"{stats['p50_ms']:>9}{stats['p99_ms']:>9}{stats['avg_response_bytes']:>8}"
+            )
+
+        pool = pool_stats(redis)
+        rows.append(
+            f"\nredis pool: {pool['in_use']}/{pool['max']} in use "
+            f"({pool['utilisation_pct']}%), {pool['idle']} idle"
+        )
+
+        listeners = self.bot.get_cog("Listeners")
+
+        if listeners is not None:
+            rows.append(f"\n{'activity source':<22}{'written':>9}{'debounced':>11}")
+
+            for source, counts in listeners.ingest.stats().items():
+                rows.append(f"{source:<22}{counts['accepted']:>9}{counts['dropped']:>11}")
+
+        queue = moderation.stats()
+        rows.append(
+            f"\nmoderation: {queue['queued']} queued, {queue['parked']} parked, "
+            f"{queue['running']} running, {queue['per_minute']:.0f}/min "
+            f"({queue['done']} done, {queue['failed']} failed, {queue['retried']} retried)"
+        )
+
+        for kind, counts in cache.stats().items():
+            rows.append(
+                f"{kind} cache: {counts['hits']} hits, {counts['misses']} misses, "
+                f"{counts['evictions']} evictions, {counts['entries']} entries"
+            )
+
+        await interaction.response.send_message(
+            "```\n" + "\n".join(rows) + "\n```", ephemeral=True
+        )
 
     @slash_command(name="guild_health", description=["guild_health"])
     async def guild_health(self, interaction: Interaction):
@@ -0,0 +1,135 @@
+# Standard modules
+import struct
+import sys
+from array import array
+from math import sqrt
+from typing import Iterable, Iterator, Optional
+
+# capacity, count, head, padding, sum, sum of squares, min, max. utility/lua/record_activity.lua
+# reads and writes the same layout, so keep the two in step.
+HEADER = struct.Struct("<HHHxxddII")
+
+
+# Fixed-capacity ring buffer of idle times in seconds. Pushing and reading the mean, min, max or
+# variance are O(1); the values sit in a uint32 array and serialise to HEADER plus 4 bytes each.
+class IdleWindow:
+    __slots__ = ("capacity", "values", "head", "count", "total", "total_sq", "min", "max")
+
+    def __init__(self, capacity: int = 50, values: Iterable[int] = ()):
+        self.capacity: int = capacity
+        self.values: array = array("I", bytes(4 * capacity))
+        # Index of the oldest value.
+        self.head: int = 0
+        self.count: int = 0
+        self.total: float = 0.0
+        self.total_sq: float = 0.0
+        self.min: int = 0
+        self.max: int = 0
+
+        for value in values:
+            self.push(value)
+
+    def __len__(self) -> int:
+        return self.count
+
+    # Oldest first.
+    def __iter__(self) -> Iterator[int]:
+        for i in range(self.count):
+            yield self.values[(self.head + i) % self.capacity]
+
+    # Adds a value and returns the one it pushed out, if the window was full.
+    def push(self, value: int) -> Optional[int]:
+        value = max(0, int(value))
+        evicted: Optional[int] = None
+
+        if self.count == self.capacity:
+            evicted = self.values[self.head]
+            self.values[self.head] = value
+            self.head = (self.head + 1) % self.capacity
+            self.total -= evicted
+            self.total_sq -= evicted * evicted
+        else:
+            self.values[(self.head + self.count) % self.capacity] = value
+            self.count += 1
+
+        self.total += value
+        self.total_sq += value * value
+
+        if self.count == 1:
+            self.min = self.max = value
+        elif evicted is not None and evicted in (self.min, self.max) and evicted != value:
+            # Only an evicted extreme forces a rescan, which is rare for idle times.
+            self.min = min(self)
+            self.max = max(self)
+        else:
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+
+        return evicted
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    # Population variance.
+    @property
+    def variance(self) -> float:
+        if not self.count:
+            return 0.0
+
+        mean = self.mean
+
+        return max(0.0, self.total_sq / self.count - mean * mean)
+
+    @property
+    def stdev(self) -> float:
+        return sqrt(self.variance)
+
+    def to_bytes(self) -> bytes:
+        values = array("I", self.values)
+
+        if sys.byteorder == "big":
+            values.byteswap()
+
+        return (
+            HEADER.pack(
+                self.capacity,
+                self.count,
+                self.head,
+                self.total,
+                self.total_sq,
+                self.min,
+                self.max,
+            )
+            + values.tobytes()
+        )
+
+    # A blob written with a different capacity is replayed into one of the requested size.
+    @classmethod
+    def from_bytes(cls, blob: Optional[bytes], capacity: int = 50) -> "IdleWindow":
+        if not blob:
+            return cls(capacity)
+
+        stored_capacity, count, head, total, total_sq, low, high = HEADER.unpack_from(blob)
+        values = array("I")
+        values.frombytes(blob[HEADER.size : HEADER.size + 4 * stored_capacity])
+
+        if sys.byteorder == "big":
+            values.byteswap()
+
+        if stored_capacity != capacity:
+            ordered = (values[(head + i) % stored_capacity] for i in range(count))
+
+            return cls(capacity, ordered)
+
+        window = cls.__new__(cls)
+        window.capacity = capacity
+        window.values = values
+        window.head = head
+        window.count = count
+        window.total = total
+        window.total_sq = total_sq
+        window.min = low
+        window.max = high
+
+        return window
@@ -0,0 +1,463 @@
+# Standard modules
+import hashlib
+from typing import Dict, NamedTuple
+
+# Internal modules
+from lib.enums import Mode
+
+ACTIVITY_FIELDS = """
+fragment ActivityFields on Activity {
+    ch
+    type
+    ts
+}
+"""
+
+IDLE_STATS_FIELDS = """
+fragment IdleStatsFields on IdleStats {
+    timesIdle
+    avgIdleTime
+    prevAvgs
+}
+"""
+
+MEMBER_FIELDS = """
+fragment MemberFields on Member {
+    memberId
+    adminAccess
+    status
+    flags
+    lastAct {
+        ...ActivityFields
+    }
+    idleStats {
+        ...IdleStatsFields
+    }
+    dateAdded
+}
+"""
+
+GUILD_FIELDS = """
+fragment GuildFields on Guild {
+    guildId
+    lastAct {
+        ...ActivityFields
+    }
+    idleStats {
+        ...IdleStatsFields
+    }
+    status
+    settings
+    dateAdded
+}
+"""
+
+RESULT_FIELDS = """
+fragment ResultFields on Result {
+    code
+    success
+    errors
+}
+"""
+
+
+class Operation(NamedTuple):
+    name: str
+    mode: Mode
+    document: str
+    sha256: str
+
+
+operations: Dict[str, Operation] = {}
+
+
+def build(name: str, mode: Mode, document: str) -> Operation:
+    return Operation(name, mode, document, hashlib.sha256(document.encode("utf-8")).hexdigest())
+
+
+# Only registered operations are sent as persisted query hashes. Ad hoc documents from build()
+# always carry their full text.
+def register(name: str, mode: Mode, body: str, *fragments: str) -> Operation:
+    operation = build(name, mode, body.strip() + "\n" + "".join(fragments))
+    operations[name] = operation
+
+    return operation
+
+
+PURGE_LIST = register(
+    "PurgeList",
+    Mode.QUERY,
+    """
+    query PurgeList {
+        code
+        success
+        message
+        errors
+        list {
+            guildId
+            members {
+                memberId
+            }
+        }
+    }
+    """,
+)
+
+ADD_TO_PURGE_LIST = register(
+    "AddToPurgeList",
+    Mode.MUTATION,
+    """
+    mutation AddToPurgeList($memberId: Snowflake!, $guildId: Snowflake!) {
+        addToPurgeList(memberId: $memberId, guildId: $guildId) {
+            ...ResultFields
+        }
+    }
+    """,
+    RESULT_FIELDS,
+)
+
+ADD_PURGE_LIST_ENTRIES = register(
+    "AddPurgeListEntries",
+    Mode.MUTATION,
+    """
+    mutation AddPurgeListEntries($guildId: Snowflake!, $memberIds: [Snowflake!]!) {
+        addPurgeListEntries(guildId: $guildId, memberIds: $memberIds) {
+            ...ResultFields
+        }
+    }
+    """,
+    RESULT_FIELDS,
+)
+
+DELETE_PURGE_LIST_ENTRY = register(
+    "DeletePurgeListEntry",
+    Mode.MUTATION,
+    """
+    mutation DeletePurgeListEntry($memberId: Snowflake!) {
+        deletePurgeListEntry(memberId: $memberId) {
+            ...ResultFields
+        }
+    }
+    """,
+    RESULT_FIELDS,
+)
+
+DELETE_PURGE_LIST_ENTRIES = register(
+    "DeletePurgeListEntries",
+    Mode.MUTATION,
+    """
+    mutation DeletePurgeListEntries($memberIds: [Snowflake!]!) {
+        deletePurgeListEntries(memberIds: $memberIds) {
+            ...ResultFields
+        }
+    }
+    """,
+    RESULT_FIELDS,
+)
+
+GUILD = register(
+    "Guild",
+    Mode.QUERY,
+    """
+    query Guild($guildId: Snowflake!) {
+        guild {
+            guild(guildId: $guildId) {
+                ...ResultFields
+                created
+                guild {
+                    ...GuildFields
+                    members {
+                        ...MemberFields
+                    }
+                }
+            }
+        }
+    }
+    """,
+    RESULT_FIELDS,
+    GUILD_FIELDS,
+    MEMBER_FIELDS,
+    ACTIVITY_FIELDS,
+    IDLE_STATS_FIELDS,
+)
+
+GUILDS = register(
+    "Guilds",
+    Mode.QUERY,
+    """
+    query Guilds {
+        guild {
+            guilds {
+                ...ResultFields
+                guilds {
+                    ...GuildFields
+                    members {
+                        ...MemberFields
+                    }
+                }
+            }
+        }
+    }
+    """,
+    RESULT_FIELDS,
+    GUILD_FIELDS,
+    MEMBER_FIELDS,
+    ACTIVITY_FIELDS,
+    IDLE_STATS_FIELDS,
+)
+
+MEMBERS = register(
+    "Members",
+    Mode.QUERY,
+    """
+    query Members {
+        member {
+            members {
+                ...ResultFields
+                members {
+                    ...MemberFields
+                }
+            }
+        }
+    }
+    """,
+    RESULT_FIELDS,
+    MEMBER_FIELDS,
+    ACTIVITY_FIELDS,
+    IDLE_STATS_FIELDS,
+)
+
+MEMBER = register(
+    "GetMember",
+    Mode.QUERY,
+    """
+    query GetMember($guildId: Snowflake!, $memberId: Snowflake!) {
+        member {
+            member(guildId: $guildId, memberId: $memberId) {
+                ...ResultFields
+                created
+                member {
+                    ...MemberFields
+                }
+            }
+        }
+    }
+    """,
+    RESULT_FIELDS,
+    MEMBER_FIELDS,
+    ACTIVITY_FIELDS,
+    IDLE_STATS_FIELDS,
+)
+
+UPDATE_GUILD = register(
+    "UpdateGuild",
+    Mode.MUTATION,
+    """
+    mutation UpdateGuild($guildId: Snowflake!, $input: GuildUpdate) {
+        guild {
+            updateGuild(guildId: $guildId, input: $input) {
+                ...ResultFields
+                guild {
+                    ...GuildFields
+                }
+            }
+        }
+    }
+    """,
+    RESULT_FIELDS,
+    GUILD_FIELDS,
+    ACTIVITY_FIELDS,
+    IDLE_STATS_FIELDS,
+)
+
+UPDATE_MEMBER = register(
+    "UpdateMember",
+    Mode.MUTATION,
+    """
+    mutation UpdateMember($memberId: Snowflake!, $guildId: Snowflake!, $input: MemberUpdate) {
+        member {
+            updateMember(memberId: $memberId, guildId: $guildId, input: $input) {
+                ...ResultFields
+                member {
+                    ...MemberFields
+                }
+            }
+        }
+    }
+    """,
+    RESULT_FIELDS,
+    MEMBER_FIELDS,
+    ACTIVITY_FIELDS,
+    IDLE_STATS_FIELDS,
+)
+
+DELETE_GUILD = register(
+    "DeleteGuild",
+    Mode.MUTATION,
+    """
+    mutation DeleteGuild($guildId: Snowflake!) {
+        guild {
+            deleteGuild(guildId: $guildId) {
+                ...ResultFields
+            }
+        }
+    }
+    """,
+    RESULT_FIELDS,
+)
+
+DELETE_MEMBER = register(
+    "DeleteMember",
+    Mode.MUTATION,
+    """
+    mutation DeleteMember($memberId: Snowflake!) {
+        member {
+            deleteMember(memberId: $memberId) {
+                ...ResultFields
+            }
+        }
+    }
+    """,
+    RESULT_FIELDS,
+)
+
+PAGE_INFO_FIELDS = """
+fragment PageInfoFields on PageInfo {
+    endCursor
+    hasNextPage
+}
+"""
+
+GUILDS_PAGE = register(
+    "GuildsPage",
+    Mode.QUERY,
+    """
+    query GuildsPage($first: Int!, $after: String) {
+        guild {
+            guildsPage(first: $first, after: $after) {
+                ...ResultFields
+                pageInfo {
+                    ...PageInfoFields
+                }
+                guilds {
+                    ...GuildFields
+                }
+            }
+        }
+    }
+    """,
+    RESULT_FIELDS,
+    PAGE_INFO_FIELDS,
+    GUILD_FIELDS,
+    ACTIVITY_FIELDS,
+    IDLE_STATS_FIELDS,
+)
+
+MEMBERS_PAGE = register(
+    "MembersPage",
+    Mode.QUERY,
+    """
+    query MembersPage($guildId: Snowflake, $first: Int!, $after: String) {
+        member {
+            membersPage(guildId: $guildId, first: $first, after: $after) {
+                ...ResultFields
+                pageInfo {
+                    ...PageInfoFields
+                }
+                members {
+                    ...MemberFields
+                }
+            }
+        }
+    }
+    """,
+    RESULT_FIELDS,
+    PAGE_INFO_FIELDS,
+    MEMBER_FIELDS,
+    ACTIVITY_FIELDS,
+    IDLE_STATS_FIELDS,
+)
+
+GUILD_SETTINGS = register(
+    "GuildSettings",
+    Mode.QUERY,
+    """
+    query GuildSettings($guildId: Snowflake!) {
+        guild {
+            guild(guildId: $guildId) {
+                ...ResultFields
+                guild {
+                    guildId
+                    settings
+                }
+            }
+        }
+    }
+    """,
+    RESULT_FIELDS,
+)
+
+GUILD_STATUS = register(
+    "GuildStatus",
+    Mode.QUERY,
+    """
+    query GuildStatus($guildId: Snowflake!) {
+        guild {
+            guild(guildId: $guildId) {
+                ...ResultFields
+                guild {
+                    guildId
+                    status
+                    lastAct {
+                        ...ActivityFields
+                    }
+                }
+            }
+        }
+    }
+    """,
+    RESULT_FIELDS,
+    ACTIVITY_FIELDS,
+)
+
+MEMBERS_BY_ID = register(
+    "MembersById",
+    Mode.QUERY,
+    """
+    query MembersById($guildId: Snowflake!, $ids: [Snowflake!]!) {
+        member {
+            members(guildId: $guildId, ids: $ids) {
+                ...ResultFields
+                members {
+                    ...MemberFields
+                }
+            }
+        }
+    }
+    """,
+    RESULT_FIELDS,
+    MEMBER_FIELDS,
+    ACTIVITY_FIELDS,
+    IDLE_STATS_FIELDS,
+)
+
+UPSERT_MEMBERS = register(
+    "UpsertMembers",
+    Mode.MUTATION,
+    """
+    mutation UpsertMembers($guildId: Snowflake!, $members: [MemberInput!]!) {
+        member {
+            upsertMembers(guildId: $guildId, members: $members) {
+                ...ResultFields
+                members {
+                    ...MemberFields
+                }
+            }
+        }
+    }
+    """,
+    RESULT_FIELDS,
+    MEMBER_FIELDS,
+    ACTIVITY_FIELDS,
+    IDLE_STATS_FIELDS,
+)
@@ -4,6 +4,9 @@ from datetime import datetime
 # Third party modules
 from pydantic import BaseModel, Field
 
+# Internal modules
+from lib.idle_window import IdleWindow
+
 
 class Activity(BaseModel):
     type: str
@@ -16,6 +19,18 @@ class IdleStats(BaseModel):
     avg_idle_time: int = Field(alias="avgIdleTime")
     prev_avgs: list[int] = Field(alias="prevAvgs")
 
+    # Built from the guild:{id}:idle blobs, so the average comes from the window's running sum.
+    @classmethod
+    def from_windows(cls, times_idle: IdleWindow, prev_avgs: IdleWindow) -> "IdleStats":
+        return cls(
+            timesIdle=list(times_idle),
+            avgIdleTime=int(times_idle.mean),
+            prevAvgs=list(prev_avgs),
+        )
+
+    def windows(self, capacity: int = 50) -> tuple[IdleWindow, IdleWindow]:
+        return IdleWindow(capacity, self.times_idle), IdleWindow(capacity, self.prev_avgs)
+
 
 class Member(BaseModel):
     member_id: int = Field(alias="memberId")
@@ -1,8 +1,10 @@
 # Standard modules
+import asyncio
 import logging
 import os
 import traceback
 from logging.handlers import RotatingFileHandler
+from typing import Optional
 
 # Third party modules
 from dotenv import load_dotenv
@@ -10,12 +12,17 @@ from nextcord import Game, Intents
 from nextcord.ext.commands import Bot
 
 # Internal modules
-from utility.redis import create_redis_connection
+from utility import cache
+from utility.batcher import writer
+from utility.client import client
+from utility.moderation import moderation
+from utility.redis import redis, redis_raw
 
 load_dotenv()
 TOKEN = os.getenv("TOKEN")
-
-redis = create_redis_connection()
+# Presence updates count as member activity. The intent is privileged and by far the busiest
+# gateway event, so it is opt-in and has to be enabled for the application as well.
+PRESENCE_INTENT = os.getenv("PRESENCE_INTENT", "false").lower() == "true"
 
 description = """Got idle? Have no more"""
 intents = Intents.default()
@@ -23,11 +30,41 @@ intents.members = True
 intents.guilds = True
 intents.message_content = True
 intents.voice_states = True
+intents.presences = PRESENCE_INTENT
+
+
+class Presence(Bot):
+    # Keeps the in-process caches in utility.cache coherent with other processes.
+    invalidations: Optional[asyncio.Task] = None
+
+    async def close(self):
+        if self.invalidations is not None:
+            self.invalidations.cancel()
+
+        # Stopped first, so no purge batch is mid-kick once moderation and the client are gone.
+        automated = self.get_cog("Automated")
+
+        if automated is not None:
+            automated.purge.stop()
+
+        listeners = self.get_cog("Listeners")
 
-bot = Bot(description=description, intents=intents, command_prefix="?")
+        if listeners is not None:
+            await listeners.shutdown()
+
+        moderation.stop()
+        await writer.close()
+        await client.close()
+        await super().close()
+        await redis.aclose()
+        await redis_raw.aclose()
+
+
+bot = Presence(description=description, intents=intents, command_prefix="?")
 
 extensions = [
     "cogs.admin_cmds",
+    "cogs.automated",
     "cogs.dev_cmds",
     "cogs.listeners",
     "cogs.setup",
@@ -38,22 +75,27 @@ ignore_list: tuple = ("?ping", "?reset", "?check")
 
 @bot.event
 async def on_ready():
-    global redis
+    try:
+        await redis.ping()
+    except Exception as e:
+        logging.error("Cannot reach Redis: %s", e)
+
+    # Replay any mutations left in the outbox by a previous run.
+    client.start_replay()
+    moderation.start(bot)
 
-    if redis is None:
-        try:
-            redis = create_redis_connection()
-        except Exception as e:
-            logging.error("Still cannot connect to Redis: %s", e)
+    if bot.invalidations is None:
+        bot.invalidations = asyncio.create_task(cache.listen_for_invalidations(redis))
 
     print(f"{bot.user} is connected to the following guilds:")
 
+    pipe = redis.pipeline(transaction=False)
+
     for guild in bot.guilds:
-        health = (
-            "\033[32mOK\033[0m"
-            if redis.exists(f"guild:{guild.id}:meta")
-            else "\033[31mX\033[0m"
-        )
+        pipe.exists(f"guild:{guild.id}:meta")
+
+    for guild, exists in zip(bot.guilds, await pipe.execute()):
+        health = "\033[32mOK\033[0m" if exists else "\033[31mX\033[0m"
 
         print(
             f"\033[4;35m{guild.name}\033[0m (id: \033[1;34m{guild.id}\033[0m), \033[32mhealth:\033[0m {health}"
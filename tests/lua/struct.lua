@@ -0,0 +1,111 @@
+-- Stand-in for the struct library Redis embeds, for running scripts on fakeredis in tests. Only
+-- what record_activity.lua uses is supported: little-endian formats made of H (uint16),
+-- I (uint32), d (double) and x (a padding byte). Lua 5.1 has no string.pack, so the bytes are
+-- put together by hand.
+local M = {}
+local sizes = {H = 2, I = 4}
+
+local function pack_uint(v, n)
+    local out = {}
+
+    for i = 1, n do
+        out[i] = string.char(v % 256)
+        v = math.floor(v / 256)
+    end
+
+    return table.concat(out)
+end
+
+local function unpack_uint(s, pos, n)
+    local v = 0
+
+    for i = n, 1, -1 do
+        v = v * 256 + s:byte(pos + i - 1)
+    end
+
+    return v
+end
+
+local function pack_double(x)
+    local sign = 0
+
+    if x < 0 or (x == 0 and 1 / x < 0) then
+        sign = 1
+        x = -x
+    end
+
+    local mantissa, exponent = 0, 0
+
+    if x > 0 then
+        local m, e = math.frexp(x)
+        exponent = e + 1022
+
+        if exponent <= 0 then
+            mantissa = math.ldexp(m, 52 + exponent)
+            exponent = 0
+        else
+            mantissa = (m * 2 - 1) * 2 ^ 52
+        end
+    end
+
+    local low = mantissa % 2 ^ 32
+    local high = math.floor(mantissa / 2 ^ 32) + exponent * 2 ^ 20 + sign * 2 ^ 31
+
+    return pack_uint(low, 4) .. pack_uint(high, 4)
+end
+
+local function unpack_double(s, pos)
+    local low = unpack_uint(s, pos, 4)
+    local high = unpack_uint(s, pos + 4, 4)
+    local sign = high >= 2 ^ 31 and -1 or 1
+    local exponent = math.floor(high / 2 ^ 20) % 2048
+    local mantissa = (high % 2 ^ 20) * 2 ^ 32 + low
+
+    if exponent == 0 then
+        return sign * math.ldexp(mantissa, -1074)
+    end
+
+    return sign * math.ldexp(mantissa + 2 ^ 52, exponent - 1075)
+end
+
+function M.pack(format, ...)
+    local args, out, i = {...}, {}, 1
+
+    for c in format:gmatch('.') do
+        if c == 'x' then
+            out[#out + 1] = '\0'
+        elseif sizes[c] then
+            out[#out + 1] = pack_uint(args[i], sizes[c])
+            i = i + 1
+        elseif c == 'd' then
+            out[#out + 1] = pack_double(args[i])
+            i = i + 1
+        end
+    end
+
+    return table.concat(out)
+end
+
+-- Like struct.unpack, returns the values followed by the position after them.
+function M.unpack(format, s, pos)
+    local out = {}
+    pos = pos or 1
+
+    for c in format:gmatch('.') do
+        if c == 'x' then
+            pos = pos + 1
+        elseif sizes[c] then
+            out[#out + 1] = unpack_uint(s, pos, sizes[c])
+            pos = pos + sizes[c]
+        elseif c == 'd' then
+            out[#out + 1] = unpack_double(s, pos)
+            pos = pos + 8
+        end
+    end
+
+    out[#out + 1] = pos
+
+    return unpack(out)
+end
+
+return M
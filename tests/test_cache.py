@@ -0,0 +1,148 @@
+# Standard modules
+import asyncio
+import unittest
+from time import monotonic
+from unittest.mock import AsyncMock, patch
+
+# Third party modules
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+
+# Internal modules
+from utility import cache
+from utility.cache import INVALIDATE_CHANNEL, LocalCache
+
+
+class LocalCacheCase(unittest.TestCase):
+    def test_least_recently_used_is_evicted(self):
+        local = LocalCache(size=2, ttl=60)
+        local.set(1, "a")
+        local.set(2, "b")
+        local.get(1)
+        local.set(3, "c")
+
+        self.assertIsNone(local.get(2))
+        self.assertEqual((local.get(1), local.get(3)), ("a", "c"))
+        self.assertEqual(local.evictions, 1)
+
+    def test_entries_expire(self):
+        local = LocalCache(size=2, ttl=60)
+
+        with patch("utility.cache.monotonic", return_value=1000):
+            local.set(1, "a")
+
+        with patch("utility.cache.monotonic", return_value=1059):
+            self.assertEqual(local.get(1), "a")
+
+        with patch("utility.cache.monotonic", return_value=1061):
+            self.assertIsNone(local.get(1))
+
+        self.assertEqual((local.hits, local.misses), (1, 1))
+
+    def test_invalidate(self):
+        local = LocalCache()
+        local.set(1, "a")
+        local.invalidate(1)
+        local.invalidate(2)
+
+        self.assertIsNone(local.get(1))
+
+    # A value read before an invalidation (or a clear) landed is not cached after it.
+    def test_stale_generation_is_not_cached(self):
+        local = LocalCache()
+        generation = local.generation(1)
+        local.invalidate(1)
+        local.set(1, "a", generation)
+        local.set(2, "b", local.generation(2))
+        generation = local.generation(2)
+        local.clear()
+        local.set(2, "c", generation)
+
+        self.assertIsNone(local.get(1))
+        self.assertIsNone(local.get(2))
+
+
+class GuildSettingsCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = FakeRedis(server=FakeServer(), decode_responses=True)
+
+    async def asyncTearDown(self):
+        cache.settings_cache.clear()
+        await self.redis.aclose()
+
+    async def test_settings_invalidated_during_the_read_are_not_cached(self):
+        await self.redis.hset("guild:1:stats", "settings", '{"set_inactive": 7}')
+        hget = self.redis.hget
+
+        async def invalidated_hget(*args):
+            value = await hget(*args)
+            cache.settings_cache.invalidate(1)
+
+            return value
+
+        with patch.object(self.redis, "hget", invalidated_hget):
+            self.assertEqual(await cache.guild_settings(self.redis, 1), {"set_inactive": 7})
+
+        self.assertIsNone(cache.settings_cache.get(1))
+
+    @patch("utility.cache.rh.guild_settings", new_callable=AsyncMock, return_value=None)
+    async def test_missing_settings_are_not_stored(self, guild_settings: AsyncMock):
+        self.assertEqual(await cache.guild_settings(self.redis, 1), {})
+        self.assertEqual(await cache.guild_settings(self.redis, 1), {})
+        self.assertEqual(guild_settings.await_count, 1)
+        self.assertFalse(await self.redis.hexists("guild:1:stats", "settings"))
+
+        with patch("utility.cache.monotonic", return_value=monotonic() + cache.LOCAL_CACHE_TTL):
+            await cache.guild_settings(self.redis, 1)
+
+        self.assertEqual(guild_settings.await_count, 2)
+
+
+class InvalidationCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = FakeRedis(server=FakeServer(), decode_responses=True)
+        self.listener = asyncio.create_task(cache.listen_for_invalidations(self.redis))
+
+        while (await self.redis.pubsub_numsub(INVALIDATE_CHANNEL))[0][1] == 0:
+            await asyncio.sleep(0.01)
+
+    async def asyncTearDown(self):
+        self.listener.cancel()
+        await asyncio.gather(self.listener, return_exceptions=True)
+        cache.settings_cache.clear()
+        cache.meta_cache.clear()
+        await self.redis.aclose()
+
+    async def wait_for(self, local: LocalCache, key: int):
+        for _ in range(100):
+            if local.get(key) is None:
+                return
+
+            await asyncio.sleep(0.01)
+
+        self.fail(f"{key} was not invalidated.")
+
+    # A message from another process drops the entry here, and only that entry.
+    async def test_published_invalidation_drops_the_entry(self):
+        cache.settings_cache.set(1, {"set_inactive": 7})
+        cache.settings_cache.set(2, {"set_inactive": 9})
+        cache.meta_cache.set(1, {"status": "active"})
+
+        await self.redis.publish(INVALIDATE_CHANNEL, "settings:1")
+        await self.wait_for(cache.settings_cache, 1)
+
+        self.assertEqual(cache.settings_cache.get(2), {"set_inactive": 9})
+        self.assertEqual(cache.meta_cache.get(1), {"status": "active"})
+
+    async def test_unknown_kind_is_ignored(self):
+        cache.meta_cache.set(1, {"status": "active"})
+
+        await self.redis.publish(INVALIDATE_CHANNEL, "other:1")
+        await self.redis.publish(INVALIDATE_CHANNEL, "meta:1")
+        await self.wait_for(cache.meta_cache, 1)
+
+        self.assertFalse(self.listener.done())
+
+
+if __name__ == "__main__":
+    unittest.main()
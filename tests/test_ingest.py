@@ -0,0 +1,60 @@
+# Standard modules
+import unittest
+from unittest.mock import Mock, call
+
+# Internal modules
+from utility.ingest import ActivityIngest, parse_windows
+
+
+class ActivityIngestCase(unittest.TestCase):
+    def setUp(self):
+        self.activity = Mock()
+        self.ingest = ActivityIngest(self.activity, {"message": 0, "reaction": 60, "typing": 10})
+
+    def test_repeats_within_the_window_are_merged(self):
+        offered = [self.ingest.offer("reaction", 1, 2, 3, "text", ts) for ts in (100, 130, 159)]
+
+        self.assertEqual(offered, [True, False, False])
+        self.activity.record.assert_called_once_with(1, 2, 3, "text", 100, guild=False)
+        self.assertEqual(self.ingest.stats(), {"reaction": {"accepted": 1, "dropped": 2}})
+
+    # The window runs from the last accepted event, not from the last dropped one.
+    def test_next_window_starts_at_the_last_accepted_event(self):
+        for ts in (100, 150, 160, 200, 219):
+            self.ingest.offer("reaction", 1, 2, 3, "text", ts)
+
+        self.assertEqual([c.args[4] for c in self.activity.record.call_args_list], [100, 160])
+
+    def test_windows_are_per_source_and_member(self):
+        self.ingest.offer("reaction", 1, 2, 3, "text", 100)
+        self.ingest.offer("typing", 1, 2, 3, "text", 101)
+        self.ingest.offer("reaction", 1, 4, 3, "text", 102)
+        self.ingest.offer("reaction", 5, 2, 3, "text", 103)
+
+        self.assertEqual(self.activity.record.call_count, 4)
+
+    def test_messages_are_not_debounced_and_count_for_the_guild(self):
+        self.ingest.offer("message", 1, 2, 3, "text", 100)
+        self.ingest.offer("message", 1, 2, 3, "text", 100.5)
+
+        self.assertEqual(
+            self.activity.record.call_args_list,
+            [call(1, 2, 3, "text", 100, guild=True), call(1, 2, 3, "text", 100.5, guild=True)],
+        )
+
+    # Entries older than the longest window (60s) are dropped as newer ones come in.
+    def test_expired_entries_are_forgotten(self):
+        self.ingest.offer("reaction", 1, 2, 3, "text", 100)
+        self.ingest.offer("typing", 1, 4, 3, "text", 120)
+        self.ingest.offer("typing", 1, 5, 3, "text", 170)
+
+        self.assertEqual(list(self.ingest._last), [("typing", 1, 4), ("typing", 1, 5)])
+
+    def test_parse_windows(self):
+        self.assertEqual(
+            parse_windows(" message=0, reaction = 60,,"), {"message": 0, "reaction": 60}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+# Standard modules
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+# Internal modules
+from utility.loader import MemberLoader
+from utility.resilience import BackendError
+
+
+def record(member_id: int) -> dict:
+    return {"memberId": str(member_id)}
+
+
+async def lookup(guild_id: int, member_ids: list) -> list:
+    return [record(m) for m in member_ids if m != 404]
+
+
+@patch("utility.loader.rh.members", new_callable=AsyncMock, side_effect=lookup)
+class MemberLoaderCase(unittest.IsolatedAsyncioTestCase):
+    async def test_lookups_in_one_iteration_share_a_query(self, members: AsyncMock):
+        loader = MemberLoader()
+
+        results = await asyncio.gather(loader.load(1, 10), loader.load(1, 11), loader.load(2, 10))
+
+        self.assertEqual(results, [record(10), record(11), record(10)])
+        self.assertEqual(members.await_count, 2)
+        members.assert_any_await(1, [10, 11])
+        members.assert_any_await(2, [10])
+
+    async def test_repeated_lookups_are_cached(self, members: AsyncMock):
+        loader = MemberLoader()
+
+        self.assertIs(loader.load(1, 10), loader.load(1, 10))
+        await loader.load(1, 10)
+        await loader.load(1, 10)
+
+        self.assertEqual(members.await_count, 1)
+
+    async def test_batches_are_split(self, members: AsyncMock):
+        loader = MemberLoader(max_batch=2)
+
+        results = await loader.load_many(1, range(5))
+
+        self.assertEqual(results, [record(m) for m in range(5)])
+        self.assertEqual([c.args[1] for c in members.await_args_list], [[0, 1], [2, 3], [4]])
+
+    async def test_unknown_member_is_none(self, members: AsyncMock):
+        self.assertIsNone(await MemberLoader().load(1, 404))
+
+    async def test_failed_lookup_is_forgotten(self, members: AsyncMock):
+        loader = MemberLoader()
+        members.side_effect = BackendError("down", 503)
+
+        with self.assertRaises(BackendError):
+            await loader.load(1, 10)
+
+        members.side_effect = lookup
+        self.assertEqual(await loader.load(1, 10), record(10))
+        self.assertEqual(members.await_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
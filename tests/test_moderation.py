@@ -0,0 +1,132 @@
+# Standard modules
+import asyncio
+import unittest
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+
+# Third party modules
+from nextcord import Forbidden, HTTPException, NotFound
+
+# Internal modules
+from utility.moderation import ModerationExecutor
+
+
+def response(status: int, retry_after: float = 0.0) -> SimpleNamespace:
+    return SimpleNamespace(status=status, reason="", headers={"Retry-After": str(retry_after)})
+
+
+# Stands in for bot.http. Each kick fails with the errors queued for that member first, then
+# succeeds, and the calls are recorded in order.
+class FakeHTTP:
+    def __init__(self, delay: float = 0.0):
+        self.delay: float = delay
+        self.errors: Dict[int, List[Exception]] = {}
+        self.calls: List[Tuple[str, int, int]] = []
+        self.running: int = 0
+        self.peak: int = 0
+
+    async def _call(self, kind: str, guild_id: int, member_id: int):
+        self.calls.append((kind, guild_id, member_id))
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+
+        try:
+            await asyncio.sleep(self.delay)
+
+            if self.errors.get(member_id):
+                raise self.errors[member_id].pop(0)
+        finally:
+            self.running -= 1
+
+    async def kick(self, member_id: int, guild_id: int, reason: str = None):
+        await self._call("kick", guild_id, member_id)
+
+    async def add_role(self, guild_id: int, member_id: int, role_id: int, reason: str = None):
+        await self._call("add_role", guild_id, member_id)
+
+    async def remove_role(self, guild_id: int, member_id: int, role_id: int, reason: str = None):
+        await self._call("remove_role", guild_id, member_id)
+
+
+class ModerationExecutorCase(unittest.IsolatedAsyncioTestCase):
+    def start(self, concurrency: int = 4, per_bucket: int = 2, delay: float = 0.0):
+        self.http = FakeHTTP(delay)
+        self.executor = ModerationExecutor(concurrency, per_bucket)
+        self.executor.start(SimpleNamespace(http=self.http))
+        self.addCleanup(self.executor.stop)
+
+    async def test_outcomes(self):
+        self.start()
+        self.http.errors = {
+            2: [NotFound(response(404), "Unknown Member")],
+            3: [Forbidden(response(403), "Missing Permissions")],
+        }
+
+        outcomes = await asyncio.gather(
+            self.executor.kick(1, 1), self.executor.kick(1, 2), self.executor.kick(1, 3)
+        )
+
+        self.assertEqual(outcomes, [True, False, None])
+        self.assertEqual(self.executor.stats()["done"], 2)
+        self.assertEqual(self.executor.stats()["failed"], 1)
+
+    async def test_429_is_retried_after_the_given_delay(self):
+        self.start()
+        self.http.errors = {1: [HTTPException(response(429, 0.05), "Rate limited")]}
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        self.assertTrue(await self.executor.kick(1, 1))
+        self.assertGreaterEqual(loop.time() - started, 0.05)
+        self.assertEqual(len(self.http.calls), 2)
+        self.assertEqual(self.executor.retried, 1)
+
+    async def test_429_gives_up_after_the_retries(self):
+        self.start()
+        self.http.errors = {1: [HTTPException(response(429), "Rate limited") for _ in range(5)]}
+
+        self.assertIsNone(await self.executor.kick(1, 1))
+
+    async def test_bucket_limits_concurrency_per_guild(self):
+        self.start(concurrency=6, per_bucket=2, delay=0.01)
+
+        await asyncio.gather(*(self.executor.kick(1, m) for m in range(6)))
+
+        self.assertEqual(self.http.peak, 2)
+
+    async def test_guilds_run_side_by_side(self):
+        self.start(concurrency=4, per_bucket=1, delay=0.01)
+
+        await asyncio.gather(*(self.executor.kick(g, m) for g in (1, 2, 3) for m in range(2)))
+
+        self.assertEqual(self.http.peak, 3)
+
+    # Kicks and role changes are separate buckets, while adding and removing a role share one.
+    async def test_role_changes_share_a_bucket(self):
+        self.start(concurrency=4, per_bucket=1, delay=0.01)
+
+        await asyncio.gather(
+            self.executor.add_role(1, 1, 9),
+            self.executor.remove_role(1, 2, 9),
+            self.executor.kick(1, 3),
+        )
+
+        self.assertEqual(self.http.peak, 2)
+
+    async def test_smaller_backlog_goes_first(self):
+        self.start(concurrency=1, per_bucket=1)
+
+        with self.executor.backlog(1, 5):
+            large = [self.executor.kick(1, m) for m in range(5)]
+
+        with self.executor.backlog(2, 1):
+            small = self.executor.kick(2, 9)
+
+        await asyncio.gather(*large, small)
+
+        self.assertEqual(self.http.calls[0], ("kick", 2, 9))
+        self.assertEqual(self.executor.priorities, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+# Standard modules
+import unittest
+
+# Third party modules
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+
+# Internal modules
+from utility.scripts import lua
+
+KEY = "purge:deadlines"
+
+
+class PurgeLeaseCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = FakeRedis(server=FakeServer(), decode_responses=True)
+        self.claim_due = self.redis.register_script(lua("claim_due"))
+        self.release_claimed = self.redis.register_script(lua("release_claimed"))
+        await self.redis.zadd(KEY, {"1:1": 100, "1:2": 200, "1:3": 300})
+
+    async def asyncTearDown(self):
+        await self.redis.aclose()
+
+    async def claim(self, now: int, lease: int, batch: int = 10) -> list:
+        return await self.claim_due(keys=[KEY], args=[now, batch, lease])
+
+    async def test_only_due_entries_are_claimed(self):
+        self.assertEqual(await self.claim(200, 800), ["1:1", "1:2"])
+        self.assertEqual(await self.redis.zscore(KEY, "1:1"), 800)
+        self.assertEqual(await self.redis.zscore(KEY, "1:3"), 300)
+
+    async def test_batch_takes_the_earliest(self):
+        self.assertEqual(await self.claim(300, 900, batch=1), ["1:1"])
+
+    async def test_live_lease_is_not_claimed_twice(self):
+        await self.claim(200, 800)
+
+        self.assertEqual(await self.claim(300, 900), ["1:3"])
+
+    async def test_expired_lease_is_claimed_again(self):
+        await self.claim(200, 800)
+
+        self.assertEqual(await self.claim(800, 1400), ["1:3", "1:1", "1:2"])
+
+    async def test_released_entries_are_removed(self):
+        await self.claim(200, 800)
+
+        self.assertEqual(await self.release_claimed(keys=[KEY], args=[800, "1:1", "1:2"]), 2)
+        self.assertEqual(await self.redis.zrange(KEY, 0, -1), ["1:3"])
+
+    # An entry re-scored after the claim, e.g. because the member went inactive again, stays.
+    async def test_rescheduled_entry_is_kept(self):
+        await self.claim(200, 800)
+        await self.redis.zadd(KEY, {"1:2": 5000})
+
+        self.assertEqual(await self.release_claimed(keys=[KEY], args=[800, "1:1", "1:2"]), 1)
+        self.assertEqual(await self.redis.zscore(KEY, "1:2"), 5000)
+
+
+if __name__ == "__main__":
+    unittest.main()
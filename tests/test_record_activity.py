@@ -0,0 +1,125 @@
+# Standard modules
+import os
+import socket
+import unittest
+import uuid
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# Third party modules
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+from redis.asyncio import Redis
+
+# Internal modules
+from lib.idle_window import IdleWindow
+from utility.redis import R_HOST, R_PORT
+from utility.scripts import lua
+
+WINDOW = 5
+# A pure Lua stand-in for the subset of Redis' struct library record_activity.lua uses. Lua reads
+# LUA_PATH when fakeredis creates its runtime, which happens on the first script call.
+STRUCT_SHIM = Path(__file__).parent / "lua" / "?.lua"
+
+
+def redis_reachable() -> bool:
+    try:
+        socket.create_connection((R_HOST, int(R_PORT)), timeout=1).close()
+    except OSError:
+        return False
+
+    return True
+
+
+# Each case compares the blobs record_activity.lua writes byte for byte with what IdleWindow
+# produces. The script packs them with Redis' struct library, so the cases run on fakeredis with
+# tests/lua/struct.lua standing in for it, and again on a real server when one is reachable at
+# REDIS_HOST:REDIS_PORT.
+class RoundTripCases:
+    redis: Redis
+
+    async def asyncSetUp(self):
+        prefix = f"test:{uuid.uuid4().hex}"
+        self.stats, self.idle = f"{prefix}:stats", f"{prefix}:idle"
+        self.record = self.redis.register_script(lua("record_activity"))
+
+    async def asyncTearDown(self):
+        await self.redis.delete(self.stats, self.idle)
+        await self.redis.aclose()
+
+    async def flush(
+        self, first_ts: float, last_ts: float, gaps: List[int], window: int = WINDOW
+    ) -> int:
+        return await self.record(
+            keys=[self.stats, self.idle],
+            args=[1, "text", repr(first_ts), repr(last_ts), "", window, *gaps],
+        )
+
+    async def windows(self) -> Tuple[Optional[bytes], Optional[bytes]]:
+        times_idle, prev_avgs = await self.redis.hmget(self.idle, "times_idle", "prev_avgs")
+
+        return times_idle, prev_avgs
+
+    async def test_first_flush(self):
+        self.assertEqual(await self.flush(100.0, 130.0, [10, 20]), 15)
+
+        times_idle, prev_avgs = await self.windows()
+        self.assertEqual(times_idle, IdleWindow(WINDOW, [10, 20]).to_bytes())
+        self.assertEqual(prev_avgs, IdleWindow(WINDOW).to_bytes())
+
+    # The gap since the previous flush comes first, and the full window evicts its minimum.
+    async def test_later_flush_wraps_the_window(self):
+        await self.flush(100.0, 130.0, [10, 20])
+        avg = await self.flush(200.0, 260.0, [30, 30, 40, 50])
+
+        expected = IdleWindow(WINDOW, [10, 20, 70, 30, 30, 40, 50])
+        times_idle, prev_avgs = await self.windows()
+        self.assertEqual(times_idle, expected.to_bytes())
+        self.assertEqual(prev_avgs, IdleWindow(WINDOW, [15]).to_bytes())
+        self.assertEqual(avg, int(expected.mean))
+
+    async def test_reads_windows_written_by_python(self):
+        times_idle = IdleWindow(WINDOW, [5, 500, 7, 9, 11])
+        prev_avgs = IdleWindow(WINDOW, [40, 41])
+        await self.redis.hset(
+            self.idle,
+            mapping={"times_idle": times_idle.to_bytes(), "prev_avgs": prev_avgs.to_bytes()},
+        )
+        await self.redis.hset(self.stats, "last_ts", "1000.0")
+
+        await self.flush(1003.0, 1010.0, [7])
+
+        # The average before this flush joins prev_avgs, then both gaps evict the oldest values,
+        # 500 among them, which was the maximum.
+        prev_avgs.push(int(times_idle.mean))
+        times_idle.push(3)
+        times_idle.push(7)
+        self.assertEqual(await self.windows(), (times_idle.to_bytes(), prev_avgs.to_bytes()))
+
+    async def test_capacity_change_replays_the_stored_values(self):
+        await self.flush(100.0, 200.0, [10, 20, 30, 40])
+        await self.flush(300.0, 300.0, [50], window=3)
+
+        times_idle, prev_avgs = await self.windows()
+        self.assertEqual(times_idle, IdleWindow(3, [10, 20, 30, 40, 100, 50]).to_bytes())
+        # The average is taken after the replay, over the three values kept.
+        self.assertEqual(prev_avgs, IdleWindow(3, [30]).to_bytes())
+        self.assertEqual(IdleWindow.from_bytes(times_idle, 3).max, 100)
+
+
+class RecordActivityOnFakeRedis(RoundTripCases, unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        os.environ["LUA_PATH"] = f"{STRUCT_SHIM};;"
+        self.redis = FakeRedis(server=FakeServer(), lua_modules={"struct"})
+        await super().asyncSetUp()
+
+
+@unittest.skipUnless(redis_reachable(), f"No Redis at {R_HOST}:{R_PORT}.")
+class RecordActivityOnRedis(RoundTripCases, unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = Redis(host=R_HOST, port=R_PORT)
+        await super().asyncSetUp()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+# Standard modules
+import unittest
+
+# Internal modules
+from utility.resilience import CircuitBreaker, RetryBudget
+
+
+class CircuitBreakerCase(unittest.TestCase):
+    def open_breaker(self, reset_timeout: float = 0.0) -> CircuitBreaker:
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=reset_timeout)
+        breaker.record_failure()
+        breaker.record_failure()
+
+        return breaker
+
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_lets_one_trial_through(self):
+        breaker = self.open_breaker()
+
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_trial_success_closes(self):
+        breaker = self.open_breaker()
+        breaker.allow()
+        breaker.record_success()
+
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_trial_failure_reopens(self):
+        breaker = self.open_breaker(reset_timeout=60)
+        breaker.opened_at -= 60
+        breaker.allow()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    # A trial cancelled before it recorded an outcome must not keep the breaker half open.
+    def test_released_trial_lets_the_next_call_try(self):
+        breaker = self.open_breaker()
+        breaker.allow()
+        breaker.release()
+
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+
+    def test_release_outside_half_open_does_nothing(self):
+        breaker = CircuitBreaker()
+        breaker.release()
+
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+
+class RetryBudgetCase(unittest.TestCase):
+    def test_withdraw_until_empty(self):
+        budget = RetryBudget(ratio=0.5, min_rate=0, capacity=2)
+
+        self.assertTrue(budget.withdraw())
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        self.assertEqual(budget.exhausted, 1)
+
+    def test_requests_earn_retries(self):
+        budget = RetryBudget(ratio=0.5, min_rate=0, capacity=2)
+        budget.tokens = 0
+        budget.deposit()
+        self.assertFalse(budget.withdraw())
+
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+# Standard modules
+import unittest
+from time import time
+from unittest.mock import Mock
+
+# Third party modules
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+
+# Internal modules
+from utility.voice import HEARTBEAT_KEY, VoiceSession, VoiceTracker
+
+GUILD = 1
+SESSIONS = f"guild:{GUILD}:voice:sessions"
+
+
+# Each case starts where a previous run stopped: its open sessions are in Redis and its last
+# flush left the heartbeat five minutes ago.
+class ReconcileAfterRestartCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = FakeRedis(server=FakeServer(), decode_responses=True)
+        self.now = time()
+        self.heartbeat = self.now - 300
+        await self.redis.set(HEARTBEAT_KEY, repr(self.heartbeat))
+        self.tracker = VoiceTracker(self.redis, Mock(), interval_ms=60000)
+
+    async def asyncTearDown(self):
+        await self.tracker.close()
+        await self.redis.aclose()
+
+    async def stored(self, member_id: int, session: VoiceSession):
+        await self.redis.hset(SESSIONS, member_id, session.encode())
+
+    async def minutes(self, member_id: int, key: str = "minutes") -> float:
+        return float(await self.redis.hget(f"guild:{GUILD}:voice:{key}", member_id) or 0)
+
+    async def test_member_who_left_is_closed_at_the_heartbeat(self):
+        await self.stored(10, VoiceSession(5, self.now - 600))
+
+        await self.tracker.reconcile(GUILD, {})
+        await self.tracker.flush()
+
+        self.assertEqual(await self.minutes(10), 5)
+        self.assertEqual(await self.redis.hgetall(SESSIONS), {})
+
+    async def test_member_still_in_voice_restarts_now(self):
+        await self.stored(10, VoiceSession(5, self.now - 600))
+
+        await self.tracker.reconcile(GUILD, {10: (5, False)})
+        await self.tracker.flush()
+
+        self.assertEqual(await self.minutes(10), 5)
+        session = VoiceSession.decode(await self.redis.hget(SESSIONS, 10))
+        self.assertEqual(session.channel_id, 5)
+        self.assertGreaterEqual(session.start, self.now)
+
+    async def test_muted_time_ends_at_the_heartbeat(self):
+        await self.stored(10, VoiceSession(5, self.now - 600, muted_since=self.now - 400))
+
+        await self.tracker.reconcile(GUILD, {})
+        await self.tracker.flush()
+
+        self.assertAlmostEqual(await self.minutes(10, "muted_minutes"), 100 / 60)
+
+    async def test_sessions_of_this_run_are_kept(self):
+        self.tracker.update(GUILD, 20, 5, False, self.now - 60, record=False)
+        await self.stored(10, VoiceSession(5, self.now - 600))
+
+        await self.tracker.reconcile(GUILD, {20: (5, False)})
+        await self.tracker.flush()
+
+        self.assertEqual(await self.minutes(20), 0)
+        self.assertEqual(self.tracker.sessions[GUILD][20].start, self.now - 60)
+        self.assertEqual(set(await self.redis.hkeys(SESSIONS)), {"20"})
+
+    async def test_guild_total_is_updated(self):
+        await self.stored(10, VoiceSession(5, self.now - 600))
+        await self.stored(11, VoiceSession(6, self.now - 900))
+
+        await self.tracker.reconcile(GUILD, {})
+        await self.tracker.flush()
+
+        stats = await self.redis.hget(f"guild:{GUILD}:stats", "voice_minutes")
+        self.assertEqual(float(stats), 15)
+
+
+if __name__ == "__main__":
+    unittest.main()
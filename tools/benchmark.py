@@ -0,0 +1,250 @@
+# Throughput and tail-latency benchmark for utility.request_handler. Without --url it starts
+# tools.fake_backend in-process, so numbers can be compared across client changes on a laptop.
+#
+#   python -m tools.benchmark --scenarios member update batch pages --requests 5000 \
+#       --concurrency 50 --latency-ms 5
+
+# Standard modules
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+from time import perf_counter
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# Third party modules
+from aiohttp import web
+
+# Internal modules
+import utility.batcher
+import utility.request_handler as rh
+from tools.fake_backend import GUILD_ID_BASE, MEMBER_ID_BASE, FakeBackend
+from utility.batcher import MutationBatcher
+from utility.client import GraphQLClient
+from utility.loader import MemberLoader
+from utility.resilience import BackendError, MutationDeferred
+
+
+class Result:
+    def __init__(self, name: str):
+        self.name: str = name
+        self.latencies: List[float] = []
+        self.errors: int = 0
+        self.elapsed: float = 0.0
+        self.items: int = 0
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies:
+            return 0.0
+
+        ordered = sorted(self.latencies)
+
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    def row(self) -> str:
+        count = self.items or len(self.latencies)
+        rate = count / self.elapsed if self.elapsed else 0.0
+
+        return (
+            f"{self.name:<10}{count:>9}{self.errors:>7}{self.elapsed:>9.2f}{rate:>11.1f}"
+            f"{self.percentile(0.5):>9.2f}{self.percentile(0.95):>9.2f}"
+            f"{self.percentile(0.99):>9.2f}{self.percentile(1.0):>9.2f}"
+        )
+
+
+async def run_concurrent(
+    name: str, requests: int, concurrency: int, call: Callable[[int], Awaitable]
+) -> Result:
+    result = Result(name)
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            start = perf_counter()
+
+            try:
+                await call(i)
+            except (BackendError, MutationDeferred):
+                result.errors += 1
+            finally:
+                result.latencies.append(perf_counter() - start)
+
+    start = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = perf_counter() - start
+
+    return result
+
+
+def guild_id(args: argparse.Namespace) -> int:
+    return GUILD_ID_BASE + random.randrange(args.guilds)
+
+
+def member_id(args: argparse.Namespace, g_id: int) -> int:
+    offset = (g_id - GUILD_ID_BASE) * args.members
+
+    return MEMBER_ID_BASE + offset + random.randrange(args.members)
+
+
+async def bench_guild(args: argparse.Namespace) -> Result:
+    return await run_concurrent(
+        "guild", args.requests, args.concurrency, lambda i: rh.guild(guild_id(args))
+    )
+
+
+async def bench_member(args: argparse.Namespace) -> Result:
+    async def member(i: int):
+        g_id = guild_id(args)
+        await rh.member(g_id, SimpleNamespace(id=member_id(args, g_id)))
+
+    return await run_concurrent("member", args.requests, args.concurrency, member)
+
+
+async def bench_loader(args: argparse.Namespace) -> Result:
+    result = Result("loader")
+    g_id = guild_id(args)
+    ids = [member_id(args, g_id) for _ in range(args.requests)]
+    start = perf_counter()
+    await MemberLoader().load_many(g_id, ids)
+    result.elapsed = perf_counter() - start
+    result.latencies.append(result.elapsed)
+    result.items = len(ids)
+
+    return result
+
+
+async def bench_update(args: argparse.Namespace) -> Result:
+    async def update(i: int):
+        g_id = guild_id(args)
+        await rh.update_member(g_id, member_id(args, g_id), nickname=f"bench-{i}")
+
+    return await run_concurrent("update", args.requests, args.concurrency, update)
+
+
+async def bench_batch(args: argparse.Namespace) -> Result:
+    result = Result("batch")
+    batcher = MutationBatcher(max_batch=args.batch_size, interval=0.05)
+    start = perf_counter()
+
+    for i in range(args.requests):
+        g_id = guild_id(args)
+        batcher.update_member(g_id, member_id(args, g_id), nickname=f"bench-{i}")
+
+        # Let flushes triggered by a full buffer run alongside the producer.
+        if i % args.batch_size == 0:
+            await asyncio.sleep(0)
+
+    await batcher.close()
+    result.elapsed = perf_counter() - start
+    result.latencies.append(batcher.last_flush_latency)
+    result.items = args.requests
+
+    return result
+
+
+async def bench_pages(args: argparse.Namespace) -> Result:
+    result = Result("pages")
+    start = perf_counter()
+    page_start = start
+
+    async for _ in rh.iter_members(page_size=args.page_size):
+        result.items += 1
+
+        if result.items % args.page_size == 0:
+            now = perf_counter()
+            result.latencies.append(now - page_start)
+            page_start = now
+
+    result.elapsed = perf_counter() - start
+
+    return result
+
+
+SCENARIOS: Dict[str, Callable[[argparse.Namespace], Awaitable[Result]]] = {
+    "guild": bench_guild,
+    "member": bench_member,
+    "loader": bench_loader,
+    "update": bench_update,
+    "batch": bench_batch,
+    "pages": bench_pages,
+}
+
+
+async def run_scenario(name: str, args: argparse.Namespace) -> Result:
+    if name not in SCENARIOS:
+        raise ValueError(f"Unknown scenario {name}")
+
+    return await SCENARIOS[name](args)
+
+
+async def main(args: argparse.Namespace):
+    runner: Optional[web.AppRunner] = None
+    backend: Optional[FakeBackend] = None
+    # A client of its own, whose outbox is thrown away afterwards. Mutations the benchmark could
+    # not deliver must never be replayed against a real backend by the bot.
+    workdir = tempfile.TemporaryDirectory(prefix="benchmark-")
+    client = GraphQLClient(outbox_path=os.path.join(workdir.name, "outbox.sqlite3"))
+    rh.client = utility.batcher.client = client
+
+    if args.url:
+        client.url = args.url
+    else:
+        backend = FakeBackend(
+            args.guilds, args.members, args.latency_ms, args.jitter_ms, args.error_rate
+        )
+        runner = web.AppRunner(backend.app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        client.url = f"http://127.0.0.1:{port}/gql"
+
+    print(f"Benchmarking against {client.url}\n")
+    print(
+        f"{'scenario':<10}{'ops':>9}{'errors':>7}{'secs':>9}{'ops/s':>11}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    )
+
+    try:
+        for name in args.scenarios:
+            sent = backend.requests if backend else 0
+            deferred = client.deferred
+            result = await run_scenario(name, args)
+            # request_handler logs and swallows MutationDeferred, so mutations queued for replay
+            # are counted from the client instead.
+            result.errors += client.deferred - deferred
+            line = result.row()
+
+            if backend:
+                line += f"   ({backend.requests - sent} backend requests)"
+
+            print(line)
+    finally:
+        await client.close()
+
+        if runner is not None:
+            await runner.cleanup()
+
+        workdir.cleanup()
+
+    stats: Dict = client.flights.stats()
+    print(f"\nSingle-flight: {stats['collapsed']} of {stats['calls']} queries collapsed.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark utility.request_handler.")
+    parser.add_argument("--url", help="Benchmark a running backend instead of the fake one.")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--members", type=int, default=1000, help="Members per guild.")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+
+    asyncio.run(main(parser.parse_args()))
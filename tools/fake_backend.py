@@ -0,0 +1,300 @@
+# Local stand-in for the GraphQL backend, for exercising utility.request_handler without the real
+# service. Responses follow the operations registered in lib.operations. Data is generated from
+# ids on demand, so a large fleet costs no memory.
+#
+#   python -m tools.fake_backend --guilds 50 --members 5000 --latency-ms 20 --error-rate 0.01
+
+# Standard modules
+import argparse
+import asyncio
+import base64
+import random
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+# Third party modules
+from aiohttp import web
+
+# Internal modules
+from lib.operations import operations
+
+GUILD_ID_BASE = 800000000000000000
+MEMBER_ID_BASE = 100000000000000000
+
+
+class FakeBackend:
+    def __init__(
+        self,
+        guilds: int = 10,
+        members: int = 1000,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        persisted_queries: bool = True,
+    ):
+        self.guilds: int = guilds
+        self.members: int = members
+        self.latency_ms: float = latency_ms
+        self.jitter_ms: float = jitter_ms
+        self.error_rate: float = error_rate
+        self.persisted_queries: bool = persisted_queries
+        # Hashes the "server" has seen the full text for.
+        self.documents: Dict[str, str] = {}
+        self.requests: int = 0
+        self.resolvers: Dict[str, Callable[[Dict], Dict]] = {
+            "Guild": self.guild,
+            "Guilds": self.all_guilds,
+            "GuildsPage": self.guilds_page,
+            "GuildSettings": self.guild_fields("settings"),
+            "GuildStatus": self.guild_fields("status", "lastAct"),
+            "Members": self.all_members,
+            "MembersPage": self.members_page,
+            "MembersById": self.members_by_id,
+            "GetMember": self.get_member,
+            "UpdateGuild": self.update_guild,
+            "UpdateMember": self.update_member,
+            "BatchUpdate": self.batch_update,
+            "UpsertMembers": self.upsert_members,
+            "PurgeList": self.purge_list,
+            "AddToPurgeList": lambda v: {"addToPurgeList": _result()},
+            "AddPurgeListEntries": lambda v: {"addPurgeListEntries": _result()},
+            "DeletePurgeListEntry": lambda v: {"deletePurgeListEntry": _result()},
+            "DeletePurgeListEntries": lambda v: {"deletePurgeListEntries": _result()},
+            "DeleteGuild": lambda v: {"guild": {"deleteGuild": _result()}},
+            "DeleteMember": lambda v: {"member": {"deleteMember": _result()}},
+        }
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/gql", self.handle)
+
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+
+        if self.latency_ms or self.jitter_ms:
+            await asyncio.sleep(
+                max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            )
+
+        if self.error_rate and random.random() < self.error_rate:
+            return web.Response(status=503, text="injected failure")
+
+        body = await request.json()
+        name: Optional[str] = body.get("operationName")
+        persisted = (body.get("extensions") or {}).get("persistedQuery")
+
+        if persisted and "query" not in body:
+            if not self.persisted_queries:
+                return _errors("PERSISTED_QUERY_NOT_SUPPORTED")
+            if persisted["sha256Hash"] not in self.documents:
+                return _errors("PERSISTED_QUERY_NOT_FOUND")
+        elif persisted:
+            self.documents[persisted["sha256Hash"]] = body["query"]
+
+        if name is None and "query" in body:
+            match = re.match(r"\s*(?:query|mutation)\s+(\w+)", body["query"])
+            name = match.group(1) if match else None
+
+        resolver = self.resolvers.get(name)
+
+        if resolver is None:
+            return web.json_response(
+                {"errors": [{"message": f"Unknown operation {name}"}]}, status=400
+            )
+
+        return web.json_response({"data": resolver(body.get("variables") or {})})
+
+    def _guild(self, guild_id: int) -> Dict:
+        return {
+            "guildId": guild_id,
+            "lastAct": _activity(guild_id),
+            "idleStats": _idle_stats(guild_id),
+            "status": "active",
+            "settings": {"auto_kick": False, "set_inactive": 30, "auto_prune_timer": 14},
+            "dateAdded": "2024-01-01T00:00:00+00:00",
+        }
+
+    def _member(self, member_id: int) -> Dict:
+        return {
+            "memberId": member_id,
+            "adminAccess": False,
+            "status": "active",
+            "flags": [],
+            "lastAct": _activity(member_id),
+            "idleStats": _idle_stats(member_id),
+            "dateAdded": "2024-01-01T00:00:00+00:00",
+        }
+
+    def _member_ids(self, guild_id: Optional[int]) -> range:
+        if guild_id is None:
+            return range(MEMBER_ID_BASE, MEMBER_ID_BASE + self.guilds * self.members)
+
+        offset = (guild_id - GUILD_ID_BASE) * self.members
+
+        return range(MEMBER_ID_BASE + offset, MEMBER_ID_BASE + offset + self.members)
+
+    def guild(self, variables: Dict) -> Dict:
+        guild = self._guild(int(variables["guildId"]))
+        guild["members"] = [self._member(m) for m in self._member_ids(guild["guildId"])]
+
+        return {"guild": {"guild": {**_result(), "created": False, "guild": guild}}}
+
+    # Resolver for the narrow guild queries, which only get the fields they select, so their
+    # payload sizes match the real backend's.
+    def guild_fields(self, *fields: str) -> Callable[[Dict], Dict]:
+        def resolve(variables: Dict) -> Dict:
+            guild = self._guild(int(variables["guildId"]))
+            guild = {k: guild[k] for k in ("guildId", *fields)}
+
+            return {"guild": {"guild": {**_result(), "created": False, "guild": guild}}}
+
+        return resolve
+
+    def all_guilds(self, variables: Dict) -> Dict:
+        guilds = []
+
+        for i in range(self.guilds):
+            guild = self._guild(GUILD_ID_BASE + i)
+            guild["members"] = [self._member(m) for m in self._member_ids(guild["guildId"])]
+            guilds.append(guild)
+
+        return {"guild": {"guilds": {**_result(), "guilds": guilds}}}
+
+    def guilds_page(self, variables: Dict) -> Dict:
+        ids = range(GUILD_ID_BASE, GUILD_ID_BASE + self.guilds)
+        page, page_info = _page(ids, variables)
+
+        return {
+            "guild": {
+                "guildsPage": {
+                    **_result(),
+                    "pageInfo": page_info,
+                    "guilds": [self._guild(g) for g in page],
+                }
+            }
+        }
+
+    def all_members(self, variables: Dict) -> Dict:
+        members = [self._member(m) for m in self._member_ids(None)]
+
+        return {"member": {"members": {**_result(), "members": members}}}
+
+    def members_page(self, variables: Dict) -> Dict:
+        guild_id = variables.get("guildId")
+        ids = self._member_ids(int(guild_id) if guild_id is not None else None)
+        page, page_info = _page(ids, variables)
+
+        return {
+            "member": {
+                "membersPage": {
+                    **_result(),
+                    "pageInfo": page_info,
+                    "members": [self._member(m) for m in page],
+                }
+            }
+        }
+
+    def members_by_id(self, variables: Dict) -> Dict:
+        members = [self._member(int(m)) for m in variables["ids"]]
+
+        return {"member": {"members": {**_result(), "members": members}}}
+
+    def get_member(self, variables: Dict) -> Dict:
+        member = self._member(int(variables["memberId"]))
+
+        return {"member": {"member": {**_result(), "created": False, "member": member}}}
+
+    def update_guild(self, variables: Dict) -> Dict:
+        guild = {**self._guild(int(variables["guildId"])), **(variables.get("input") or {})}
+
+        return {"guild": {"updateGuild": {**_result(), "guild": guild}}}
+
+    def update_member(self, variables: Dict) -> Dict:
+        member = {**self._member(int(variables["memberId"])), **(variables.get("input") or {})}
+
+        return {"member": {"updateMember": {**_result(), "member": member}}}
+
+    def upsert_members(self, variables: Dict) -> Dict:
+        members = [
+            {**self._member(int(m["memberId"])), **m} for m in variables.get("members") or []
+        ]
+
+        return {"member": {"upsertMembers": {**_result(), "members": members}}}
+
+    def batch_update(self, variables: Dict) -> Dict:
+        data = {}
+
+        for key in variables:
+            if not key.startswith("i"):
+                continue
+
+            alias = f"u{key[1:]}"
+
+            if f"m{key[1:]}" in variables:
+                data[alias] = {"updateMember": _result()}
+            else:
+                data[alias] = {"updateGuild": _result()}
+
+        return data
+
+    def purge_list(self, variables: Dict) -> Dict:
+        return {**_result(), "message": "", "list": []}
+
+
+def _result() -> Dict[str, Any]:
+    return {"code": 200, "success": True, "errors": None}
+
+
+def _errors(code: str) -> web.Response:
+    return web.json_response({"errors": [{"message": code, "extensions": {"code": code}}]})
+
+
+def _activity(seed: int) -> Dict:
+    return {"ch": seed % 1000, "type": "text", "ts": "2024-06-01T12:00:00+00:00"}
+
+
+def _idle_stats(seed: int) -> Dict:
+    times = [(seed >> i) % 3600 for i in range(10)]
+
+    return {"timesIdle": times, "avgIdleTime": sum(times) // len(times), "prevAvgs": []}
+
+
+def _page(ids: range, variables: Dict) -> tuple[List[int], Dict]:
+    after = variables.get("after")
+    start = int(base64.b64decode(after)) if after else 0
+    end = min(start + int(variables.get("first", 100)), len(ids))
+
+    return list(ids[start:end]), {
+        "endCursor": base64.b64encode(str(end).encode()).decode(),
+        "hasNextPage": end < len(ids),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake GraphQL backend for local benchmarking.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--members", type=int, default=1000, help="Members per guild.")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--no-persisted-queries", action="store_true")
+    args = parser.parse_args()
+
+    backend = FakeBackend(
+        args.guilds,
+        args.members,
+        args.latency_ms,
+        args.jitter_ms,
+        args.error_rate,
+        not args.no_persisted_queries,
+    )
+    print(f"Serving {len(operations)} registered operations on http://{args.host}:{args.port}/gql")
+    web.run_app(backend.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Builds guild:{id}:last_seen from the last_act field of every guild:{id}:member:{mid} hash, for
+# guilds that were set up before the index existed. Safe to run against a live bot: scores only
+# ever move forward, so a member who is active during the rebuild keeps the newer timestamp.
+#
+#   python -m tools.rebuild_last_seen                   # every guild
+#   python -m tools.rebuild_last_seen --guild 1234 --reset
+
+# Standard modules
+import argparse
+import ast
+import asyncio
+import json
+from typing import AsyncIterator, Dict, List, Optional
+
+# Third party modules
+import arrow
+from redis.asyncio import Redis
+
+# Internal modules
+from utility import last_seen
+from utility.redis import create_redis_connection
+
+
+async def guild_ids(redis: Redis) -> AsyncIterator[int]:
+    async for key in redis.scan_iter(match="guild:*:members", count=1000):
+        yield int(key.split(":")[1])
+
+
+# Member hashes written at setup hold str() of the backend dict rather than JSON.
+def parse_ts(last_act: Optional[str]) -> Optional[float]:
+    if not last_act:
+        return None
+
+    try:
+        activity = json.loads(last_act)
+    except ValueError:
+        try:
+            activity = ast.literal_eval(last_act)
+        except (ValueError, SyntaxError):
+            return None
+
+    try:
+        return arrow.get(activity["ts"]).timestamp()
+    except (KeyError, TypeError, arrow.parser.ParserError):
+        return None
+
+
+async def rebuild(redis: Redis, guild_id: int, batch_size: int, reset: bool) -> Dict[str, int]:
+    counts = {"members": 0, "indexed": 0, "skipped": 0}
+
+    if reset:
+        await redis.delete(last_seen.key(guild_id))
+
+    batch: List[str] = []
+
+    async def flush():
+        pipe = redis.pipeline(transaction=False)
+
+        for member_id in batch:
+            pipe.hget(f"guild:{guild_id}:member:{member_id}", "last_act")
+
+        seen = {}
+
+        for member_id, last_act in zip(batch, await pipe.execute()):
+            ts = parse_ts(last_act)
+
+            if ts is None:
+                counts["skipped"] += 1
+            else:
+                seen[int(member_id)] = ts
+
+        pipe = redis.pipeline(transaction=False)
+        last_seen.touch(pipe, guild_id, seen)
+        await pipe.execute()
+        counts["indexed"] += len(seen)
+        batch.clear()
+
+    async for member_id in redis.sscan_iter(f"guild:{guild_id}:members", count=batch_size):
+        counts["members"] += 1
+        batch.append(member_id)
+
+        if len(batch) >= batch_size:
+            await flush()
+
+    if batch:
+        await flush()
+
+    return counts
+
+
+async def run(args: argparse.Namespace):
+    redis = create_redis_connection()
+    guilds = args.guild or [guild_id async for guild_id in guild_ids(redis)]
+
+    try:
+        for guild_id in guilds:
+            counts = await rebuild(redis, guild_id, args.batch_size, args.reset)
+            print(
+                f"guild {guild_id}: {counts['indexed']} of {counts['members']} members indexed, "
+                f"{counts['skipped']} without a usable last_act"
+            )
+    finally:
+        await redis.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the per-guild last_seen index.")
+    parser.add_argument("--guild", type=int, action="append", help="Only these guilds.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--reset", action="store_true", help="Drop each index first instead of merging into it."
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
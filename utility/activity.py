@@ -0,0 +1,181 @@
+# Standard modules
+import asyncio
+import json
+import logging
+import os
+from time import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Third party modules
+import arrow
+from redis.asyncio import Redis
+
+# Internal modules
+from utility import last_seen
+from utility.scripts import lua
+
+ACTIVITY_FLUSH_MS = int(os.getenv("ACTIVITY_FLUSH_MS", 5000))
+ACTIVITY_FLUSH_EVENTS = int(os.getenv("ACTIVITY_FLUSH_EVENTS", 1000))
+# How many idle samples and previous averages are kept per guild, in guild:{id}:idle.
+IDLE_WINDOW = 50
+
+
+class GuildActivity:
+    __slots__ = ("ch", "type", "first_ts", "last_ts", "gaps", "members")
+
+    def __init__(self):
+        self.ch: int = 0
+        self.type: str = ""
+        # Span of the guild-level events inside this flush window, None while there were none.
+        self.first_ts: Optional[float] = None
+        self.last_ts: Optional[float] = None
+        # Idle gaps, in seconds, between consecutive guild-level events inside this window.
+        self.gaps: List[int] = []
+        # member_id -> (ts, channel id, channel type) of that member's latest event.
+        self.members: Dict[int, Tuple[float, int, str]] = {}
+
+
+# Absorbs activity events in memory and writes the merged result per guild to Redis every
+# ACTIVITY_FLUSH_MS, or sooner once ACTIVITY_FLUSH_EVENTS have piled up. A busy guild then costs
+# one write per flush instead of several round trips per message.
+class ActivityAggregator:
+    def __init__(
+        self,
+        redis: Redis,
+        interval_ms: int = ACTIVITY_FLUSH_MS,
+        max_events: int = ACTIVITY_FLUSH_EVENTS,
+        expiry=None,
+    ):
+        self.redis: Redis = redis
+        # utility.idle_expiry.IdleExpiry. When set, each flush also renews the members'
+        # guild:{id}:active:{mid} keys and reactivates members who were inactive until now.
+        self.expiry = expiry
+        # Folds a batch into the guild's idle stats inside Redis, so concurrent flushes from this
+        # or another process cannot lose updates.
+        self._record_activity = redis.register_script(lua("record_activity"))
+        self.interval: float = interval_ms / 1000
+        self.max_events: int = max_events
+        self._pending: Dict[int, GuildActivity] = {}
+        self._events: int = 0
+        self._task: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.events_received: int = 0
+        self.flushes: int = 0
+
+    def record(
+        self,
+        guild_id: int,
+        member_id: int,
+        channel_id: int,
+        channel_type: str,
+        ts: Optional[float] = None,
+        guild: bool = True,
+    ):
+        ts = ts or time()
+        activity = self._pending.get(guild_id)
+
+        if activity is None:
+            activity = self._pending[guild_id] = GuildActivity()
+
+        # Only guild-level events move the guild's last_act and feed its idle gaps. The others
+        # (see utility.ingest.GUILD_SOURCES) mark the member active and nothing more.
+        if guild:
+            if activity.last_ts is None:
+                activity.first_ts = activity.last_ts = ts
+            elif ts > activity.last_ts:
+                activity.gaps.append(int(ts - activity.last_ts))
+
+                if len(activity.gaps) > IDLE_WINDOW:
+                    del activity.gaps[0]
+
+            if ts >= activity.last_ts:
+                activity.ch = channel_id
+                activity.type = channel_type
+                activity.last_ts = ts
+
+        latest = activity.members.get(member_id)
+
+        if latest is None or ts > latest[0]:
+            activity.members[member_id] = (ts, channel_id, channel_type)
+
+        self._events += 1
+        self.events_received += 1
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+        if self._events >= self.max_events:
+            task = asyncio.create_task(self.flush())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self):
+        while self._pending:
+            await asyncio.sleep(self.interval)
+
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("Activity flush failed.")
+
+    # Writes out whatever is still pending and waits for flushes already running.
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+        await self.flush()
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def flush(self):
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        self._events = 0
+        pipe = self.redis.pipeline(transaction=False)
+        checks: List[Tuple[int, Any]] = []
+
+        for guild_id, activity in pending.items():
+            if activity.last_ts is not None:
+                await self._record_activity(
+                    keys=[f"guild:{guild_id}:stats", f"guild:{guild_id}:idle"],
+                    args=[
+                        activity.ch,
+                        activity.type,
+                        repr(activity.first_ts),
+                        repr(activity.last_ts),
+                        arrow.get(activity.last_ts).isoformat(),
+                        IDLE_WINDOW,
+                        *activity.gaps,
+                    ],
+                    client=pipe,
+                )
+
+            for member_id, (ts, channel_id, channel_type) in activity.members.items():
+                pipe.hset(
+                    f"guild:{guild_id}:member:{member_id}",
+                    "last_act",
+                    json.dumps(_activity(channel_id, channel_type, ts)),
+                )
+
+            seen = {m: ts for m, (ts, _, _) in activity.members.items()}
+            last_seen.touch(pipe, guild_id, seen)
+
+            if self.expiry is not None:
+                checks.append((guild_id, await self.expiry.track(pipe, guild_id, seen)))
+
+        results = await pipe.execute()
+        self.flushes += 1
+
+        for guild_id, tracked in checks:
+            try:
+                await self.expiry.settle(guild_id, tracked, results)
+            except Exception:
+                logging.exception("Could not update idle state of guild %s.", guild_id)
+
+
+def _activity(channel_id: int, channel_type: str, ts: float) -> Dict:
+    return {"ch": channel_id, "type": channel_type, "ts": arrow.get(ts).isoformat()}
@@ -0,0 +1,203 @@
+# Standard modules
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+# Third party modules
+import arrow
+from nextcord import Guild, Object, TextChannel, Thread
+from redis.asyncio import Redis
+
+# Internal modules
+import utility.request_handler as rh
+from utility import cache, last_seen
+from utility.idle_expiry import IdleExpiry
+from utility.onboarding import ONBOARD_CHUNK
+
+# Channels scanned at once. nextcord already waits out each route's rate-limit bucket and retries
+# 429s, so this mainly bounds how much of the global request budget a backfill can take.
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", 4))
+# Messages per history request. 100 is the most Discord returns.
+BACKFILL_PAGE = int(os.getenv("BACKFILL_PAGE", 100))
+
+DONE = "done"
+
+Channel = Union[TextChannel, Thread]
+
+
+class BackfillResult(NamedTuple):
+    channels: int
+    messages: int
+    members: int
+    resumed: bool
+    # Channels that stopped early. Their cursors are kept so the next run resumes them.
+    failed: int
+
+
+# guild:{id}:backfill           channel id -> id of the oldest message scanned so far, or "done"
+# guild:{id}:backfill:latest    member id -> "ts:channel id" of their newest message found so far
+# Both are written after every page, in one transaction, and removed once the backfill completes.
+def state_key(guild_id: int) -> str:
+    return f"guild:{guild_id}:backfill"
+
+
+def latest_key(guild_id: int) -> str:
+    return f"guild:{guild_id}:backfill:latest"
+
+
+# Walks every readable channel from the newest message back, recording each member's most
+# recent message. Resuming continues every channel from its stored cursor.
+class HistoryBackfill:
+    def __init__(
+        self,
+        redis: Redis,
+        guild: Guild,
+        concurrency: int = BACKFILL_CONCURRENCY,
+        page: int = BACKFILL_PAGE,
+        expiry: Optional[IdleExpiry] = None,
+    ):
+        self.redis: Redis = redis
+        self.guild: Guild = guild
+        self.expiry: IdleExpiry = expiry or IdleExpiry(redis)
+        self.page: int = page
+        self._slots: asyncio.Semaphore = asyncio.Semaphore(concurrency)
+        self._latest: Dict[int, Tuple[float, int]] = {}
+        self._cursors: Dict[str, str] = {}
+        self.messages: int = 0
+        self.failed: int = 0
+
+    def channels(self) -> List[Channel]:
+        me = self.guild.me
+
+        return [
+            channel
+            for channel in (*self.guild.text_channels, *self.guild.threads)
+            if channel.permissions_for(me).read_message_history
+        ]
+
+    async def run(self) -> BackfillResult:
+        gid = self.guild.id
+        self._cursors = await self.redis.hgetall(state_key(gid))
+        resumed = bool(self._cursors)
+
+        for member_id, raw in (await self.redis.hgetall(latest_key(gid))).items():
+            ts, channel_id = raw.split(":")
+            self._latest[int(member_id)] = (float(ts), int(channel_id))
+
+        if not resumed:
+            await self.redis.hset(state_key(gid), "started", arrow.utcnow().isoformat())
+
+        channels = [c for c in self.channels() if self._cursors.get(str(c.id)) != DONE]
+        await asyncio.gather(*(self._scan(channel) for channel in channels))
+        members = await self._commit()
+
+        return BackfillResult(len(channels), self.messages, members, resumed, self.failed)
+
+    async def _scan(self, channel: Channel):
+        async with self._slots:
+            cursor = self._cursors.get(str(channel.id))
+            before = Object(id=int(cursor)) if cursor else None
+
+            while True:
+                found: Dict[int, Tuple[float, int]] = {}
+                oldest: Optional[int] = None
+                count = 0
+
+                try:
+                    async for message in channel.history(limit=self.page, before=before):
+                        count += 1
+                        oldest = message.id
+
+                        if message.author.bot or message.webhook_id:
+                            continue
+
+                        ts = message.created_at.timestamp()
+                        best = self._latest.get(message.author.id)
+
+                        if best is None or ts > best[0]:
+                            self._latest[message.author.id] = found[message.author.id] = (
+                                ts,
+                                channel.id,
+                            )
+                except Exception:
+                    # The cursor from the last good page is kept, so a rerun retries from there.
+                    logging.exception(f"Backfill of channel {channel.id} stopped.")
+                    self.failed += 1
+                    return
+
+                self.messages += count
+                pipe = self.redis.pipeline(transaction=True)
+
+                if found:
+                    pipe.hset(
+                        latest_key(self.guild.id),
+                        mapping={m: f"{ts!r}:{ch}" for m, (ts, ch) in found.items()},
+                    )
+
+                if count < self.page:
+                    pipe.hset(state_key(self.guild.id), channel.id, DONE)
+                    await pipe.execute()
+                    return
+
+                pipe.hset(state_key(self.guild.id), channel.id, oldest)
+                await pipe.execute()
+                before = Object(id=oldest)
+
+    # Writes what was found in one Redis pipeline and one backend upsert per chunk. Authors who
+    # have left are dropped, and activity recorded live since is not overwritten. The scan state
+    # is only cleared once every channel finished.
+    async def _commit(self) -> int:
+        gid = self.guild.id
+        ids = list(self._latest)
+
+        if ids:
+            is_member = await self.redis.smismember(f"guild:{gid}:members", ids)
+            ids = [m for m, known in zip(ids, is_member) if known]
+
+        current = await self.redis.zmscore(last_seen.key(gid), ids) if ids else []
+        newer = [
+            m for m, score in zip(ids, current) if score is None or score < self._latest[m][0]
+        ]
+
+        seen = {m: self._latest[m][0] for m in newer}
+        pipe = self.redis.pipeline(transaction=True)
+        last_seen.touch(pipe, gid, seen)
+        tracked = await self.expiry.track(pipe, gid, seen)
+
+        for member_id in newer:
+            activity = json.dumps(self._activity(member_id))
+            pipe.hset(f"guild:{gid}:member:{member_id}", "last_act", activity)
+
+        if not self.failed:
+            pipe.delete(state_key(gid), latest_key(gid))
+            pipe.hset(f"guild:{gid}:meta", "baselined", arrow.utcnow().isoformat())
+
+        # Members the history shows active come back from inactive, and those whose last message
+        # is already past the threshold are marked now rather than at the next restart.
+        await self.expiry.settle(gid, tracked, await pipe.execute())
+
+        if not self.failed:
+            await cache.invalidate(self.redis, "meta", gid)
+
+        for i in range(0, len(newer), ONBOARD_CHUNK):
+            await rh.upsert_members(
+                gid,
+                [
+                    {"memberId": m, "lastAct": self._activity(m)}
+                    for m in newer[i : i + ONBOARD_CHUNK]
+                ],
+            )
+
+        return len(newer)
+
+    def _activity(self, member_id: int) -> Dict:
+        ts, channel_id = self._latest[member_id]
+        channel = self.guild.get_channel_or_thread(channel_id)
+
+        return {
+            "ch": channel_id,
+            "type": str(channel.type) if channel else "text",
+            "ts": arrow.get(ts).isoformat(),
+        }
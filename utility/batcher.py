@@ -0,0 +1,137 @@
+# Standard modules
+import asyncio
+import logging
+import os
+from time import perf_counter
+from typing import Dict, List, Optional, Set, Tuple
+
+# Internal modules
+from lib.enums import Mode
+from lib.operations import build
+from utility.client import client
+from utility.resilience import MutationDeferred
+
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 100))
+BATCH_INTERVAL = float(os.getenv("BATCH_INTERVAL", 2))
+
+# (kind, guild_id, member_id). member_id is None for guild patches.
+EntityKey = Tuple[str, int, Optional[int]]
+
+
+# Write-behind buffer for guild/member patches. Repeated updates to the same entity are merged,
+# and the buffer is sent as one aliased mutation once it holds max_batch entities or interval
+# seconds have passed since the first pending write.
+class MutationBatcher:
+    def __init__(self, max_batch: int = BATCH_SIZE, interval: float = BATCH_INTERVAL):
+        self.max_batch: int = max_batch
+        self.interval: float = interval
+        self._pending: Dict[EntityKey, Dict] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.updates_received: int = 0
+        self.flushes: int = 0
+        self.last_batch_size: int = 0
+        self.last_flush_latency: float = 0.0
+
+    def update_member(self, guild_id: int, member_id: int, **data):
+        self._enqueue(("member", guild_id, member_id), data)
+
+    def update_guild(self, guild_id: int, **data):
+        self._enqueue(("guild", guild_id, None), data)
+
+    def _enqueue(self, key: EntityKey, data: Dict):
+        self.updates_received += 1
+        self._pending.setdefault(key, {}).update(data)
+
+        if len(self._pending) >= self.max_batch:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.interval, self._schedule_flush
+            )
+
+    def _schedule_flush(self):
+        task = asyncio.create_task(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        payload = build_batch_mutation(batch)
+        operation = build("BatchUpdate", Mode.MUTATION, payload["query"])
+
+        func_start: float = perf_counter()
+
+        try:
+            response = await client.execute(operation, payload["variables"], "PATCH")
+        except MutationDeferred:
+            logging.warning(f"Backend unavailable. {len(batch)} entity updates queued for replay.")
+            return
+        except Exception:
+            logging.exception(f"Batch mutation of {len(batch)} entities failed.")
+            return
+
+        self.last_flush_latency = perf_counter() - func_start
+        self.last_batch_size = len(batch)
+        self.flushes += 1
+
+        logging.info(
+            f"Flushed {self.last_batch_size} entities in {self.last_flush_latency} seconds."
+        )
+
+        if response.status != 200 or response.body.get("errors"):
+            logging.error(f"Batch mutation failed with status {response.status}.")
+
+    async def close(self):
+        await self.flush()
+
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            "pending": len(self._pending),
+            "updates_received": self.updates_received,
+            "flushes": self.flushes,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_latency": self.last_flush_latency,
+        }
+
+
+def build_batch_mutation(batch: Dict[EntityKey, Dict]) -> Dict:
+    arguments: List[str] = []
+    selections: List[str] = []
+    variables: Dict = {}
+
+    for i, ((kind, guild_id, member_id), data) in enumerate(batch.items()):
+        variables[f"g{i}"] = guild_id
+        variables[f"i{i}"] = data
+
+        if kind == "guild":
+            arguments.append(f"$g{i}: Snowflake!, $i{i}: GuildUpdate")
+            selections.append(
+                f"u{i}: guild {{ updateGuild(guildId: $g{i}, input: $i{i}) "
+                "{ code success errors } }"
+            )
+        else:
+            variables[f"m{i}"] = member_id
+            arguments.append(f"$m{i}: Snowflake!, $g{i}: Snowflake!, $i{i}: MemberUpdate")
+            selections.append(
+                f"u{i}: member {{ updateMember(memberId: $m{i}, guildId: $g{i}, input: $i{i}) "
+                "{ code success errors } }"
+            )
+
+    query = f"mutation BatchUpdate({', '.join(arguments)}) {{\n" + "\n".join(selections) + "\n}"
+
+    return {"query": query, "variables": variables}
+
+
+writer = MutationBatcher()
@@ -0,0 +1,225 @@
+# Standard modules
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# Third party modules
+from redis.asyncio import Redis
+from redis.exceptions import ConnectionError, TimeoutError
+
+# Internal modules
+import utility.request_handler as rh
+from lib.idle_window import IdleWindow
+from lib.typings import IdleStats
+from utility.activity import IDLE_WINDOW
+
+# Entries each in-process cache holds before the least recently used is evicted.
+LOCAL_CACHE_SIZE = int(os.getenv("LOCAL_CACHE_SIZE", 10000))
+# Seconds an entry is trusted. Invalidations arrive over pub/sub, so this only bounds how stale
+# an entry can get when one is missed, e.g. while the subscription reconnects.
+LOCAL_CACHE_TTL = float(os.getenv("LOCAL_CACHE_TTL", 60))
+INVALIDATE_CHANNEL = "cache:invalidate"
+
+
+# Size-bounded LRU with a TTL per entry, in front of Redis.
+class LocalCache:
+    def __init__(self, size: int = LOCAL_CACHE_SIZE, ttl: float = LOCAL_CACHE_TTL):
+        self.size: int = size
+        self.ttl: float = ttl
+        self._entries: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        # Bumped by every invalidation of a key, and _epoch by every clear(), so a value read
+        # from Redis before an invalidation landed is not cached after it.
+        self._generations: Dict[Hashable, int] = {}
+        self._epoch: int = 0
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+
+        if entry is None or entry[0] < monotonic():
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+
+        return entry[1]
+
+    # Taken before reading the value from Redis and passed to set(), which then drops the value
+    # if the key was invalidated in the meantime.
+    def generation(self, key: Hashable) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(key, 0)
+
+    def set(self, key: Hashable, value: Any, generation: Optional[Tuple[int, int]] = None):
+        if generation is not None and generation != self.generation(key):
+            return
+
+        self._entries[key] = (monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self):
+        self._entries.clear()
+        self._generations.clear()
+        self._epoch += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+settings_cache = LocalCache()
+meta_cache = LocalCache()
+_caches = {"settings": settings_cache, "meta": meta_cache}
+
+
+# Settings live in the guild:{id}:stats hash as a JSON string, behind settings_cache. The backend
+# is only asked when Redis does not have them yet, and the answer is written back for the next
+# caller. Callers get their own copy, since they change it before storing it.
+async def guild_settings(redis: Redis, guild_id: int) -> Dict:
+    cached = settings_cache.get(guild_id)
+
+    if cached is not None:
+        return dict(cached)
+
+    generation = settings_cache.generation(guild_id)
+    stored = await redis.hget(f"guild:{guild_id}:stats", "settings")
+
+    if stored:
+        settings = json.loads(stored)
+        settings_cache.set(guild_id, settings, generation)
+
+        return dict(settings)
+
+    settings = await rh.guild_settings(guild_id)
+
+    # A guild the backend has no settings for falls back to the defaults. They are only kept
+    # here until the entry expires, and not written to Redis, so the backend is asked again.
+    if not settings:
+        settings_cache.set(guild_id, {}, generation)
+
+        return {}
+
+    # Copied, since concurrent lookups share the same response object.
+    settings = json.loads(settings) if isinstance(settings, str) else dict(settings)
+    await store_guild_settings(redis, guild_id, settings)
+
+    return dict(settings)
+
+
+async def store_guild_settings(redis: Redis, guild_id: int, settings: Dict):
+    await redis.hset(f"guild:{guild_id}:stats", "settings", json.dumps(settings))
+    await invalidate(redis, "settings", guild_id)
+    settings_cache.set(guild_id, dict(settings))
+
+
+# guild:{id}:meta, behind meta_cache. Anything writing the hash calls invalidate() afterwards.
+async def guild_meta(redis: Redis, guild_id: int) -> Dict[str, str]:
+    cached = meta_cache.get(guild_id)
+
+    if cached is not None:
+        return cached
+
+    generation = meta_cache.generation(guild_id)
+    meta = await redis.hgetall(f"guild:{guild_id}:meta")
+    meta_cache.set(guild_id, meta, generation)
+
+    return meta
+
+
+async def guild_status(redis: Redis, guild_id: int) -> str:
+    cached = (await guild_meta(redis, guild_id)).get("status")
+
+    if cached:
+        return cached
+
+    status = (await rh.guild_status(guild_id))["status"]
+    await redis.hset(f"guild:{guild_id}:meta", "status", status)
+    await invalidate(redis, "meta", guild_id)
+
+    return status
+
+
+# Drops the entry here and tells every other process to drop theirs.
+async def invalidate(redis: Redis, kind: str, guild_id: int):
+    _caches[kind].invalidate(guild_id)
+    await redis.publish(INVALIDATE_CHANNEL, f"{kind}:{guild_id}")
+
+
+# Applies invalidations published by any process, this one included. Both caches are cleared
+# whenever the subscription is (re)established, since messages sent while it was down are lost.
+async def listen_for_invalidations(redis: Redis):
+    while True:
+        pubsub = redis.pubsub()
+
+        try:
+            await pubsub.subscribe(INVALIDATE_CHANNEL)
+
+            for cache in _caches.values():
+                cache.clear()
+
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=30)
+
+                if message is None:
+                    continue
+
+                kind, guild_id = message["data"].split(":")
+
+                if kind in _caches:
+                    _caches[kind].invalidate(int(guild_id))
+        except asyncio.CancelledError:
+            raise
+        except (ConnectionError, TimeoutError):
+            logging.warning("Lost the cache invalidation subscription. Reconnecting.")
+            await asyncio.sleep(5)
+        except Exception:
+            logging.exception("Cache invalidation listener failed.")
+        finally:
+            await pubsub.aclose()
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    return {kind: cache.stats() for kind, cache in _caches.items()}
+
+
+# Needs a client created with decode_responses=False, since the windows are packed binary.
+async def guild_idle_windows(redis_raw: Redis, guild_id: int) -> Tuple[IdleWindow, IdleWindow]:
+    times_idle, prev_avgs = await redis_raw.hmget(
+        f"guild:{guild_id}:idle", "times_idle", "prev_avgs"
+    )
+
+    return (
+        IdleWindow.from_bytes(times_idle, IDLE_WINDOW),
+        IdleWindow.from_bytes(prev_avgs, IDLE_WINDOW),
+    )
+
+
+async def guild_idle_stats(redis_raw: Redis, guild_id: int) -> IdleStats:
+    return IdleStats.from_windows(*await guild_idle_windows(redis_raw, guild_id))
+
+
+async def store_idle_stats(redis: Redis, guild_id: int, idle_stats: IdleStats):
+    times_idle, prev_avgs = idle_stats.windows(IDLE_WINDOW)
+    await redis.hset(
+        f"guild:{guild_id}:idle",
+        mapping={"times_idle": times_idle.to_bytes(), "prev_avgs": prev_avgs.to_bytes()},
+    )
@@ -0,0 +1,453 @@
+# Standard modules
+import asyncio
+import json
+import logging
+import os
+from time import monotonic
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional
+
+# Third party modules
+import ijson
+from aiohttp import (
+    ClientError,
+    ClientResponse,
+    ClientSession,
+    ClientTimeout,
+    TCPConnector,
+)
+from dotenv import load_dotenv
+
+# Internal modules
+from lib.enums import Mode
+from lib.operations import Operation, build, operations
+from utility.metrics import metrics
+from utility.outbox import OUTBOX_PATH, Outbox
+from utility.resilience import (
+    RETRY_ATTEMPTS,
+    RETRY_MAX_DELAY,
+    BackendError,
+    CircuitBreaker,
+    CircuitOpenError,
+    MutationDeferred,
+    RetryBudget,
+    backoff,
+)
+from utility.singleflight import SingleFlight
+
+load_dotenv()
+
+api_url_dev = "http://localhost:8000/gql"
+api_base_url_prod = "https://combot.bblankenship.me/v1/"
+
+API_URL = os.getenv("API_URL", api_url_dev)
+# Upper bound on open sockets to the backend. Requests past this wait for a free connection
+# instead of opening new ones.
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", 20))
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", 10))
+API_KEEPALIVE = float(os.getenv("API_KEEPALIVE", 30))
+# Send registered operations as automatic persisted query hashes, falling back to the full text
+# when the backend has not seen the hash yet.
+API_PERSISTED_QUERIES = os.getenv("API_PERSISTED_QUERIES", "true").lower() == "true"
+
+headers = {"Content-Type": "application/json"}
+
+
+class GQLResponse(NamedTuple):
+    status: int
+    body: Dict[str, Any]
+
+
+class GraphQLClient:
+    def __init__(
+        self,
+        url: str = API_URL,
+        pool_size: int = API_POOL_SIZE,
+        timeout: float = API_TIMEOUT,
+        keepalive: float = API_KEEPALIVE,
+        persisted_queries: bool = API_PERSISTED_QUERIES,
+        max_retries: int = RETRY_ATTEMPTS,
+        outbox_path: str = OUTBOX_PATH,
+    ):
+        self.url: str = url
+        self.pool_size: int = pool_size
+        self.timeout: ClientTimeout = ClientTimeout(total=timeout)
+        self.keepalive: float = keepalive
+        self.persisted_queries: bool = persisted_queries
+        self._session: Optional[ClientSession] = None
+        self.flights: SingleFlight = SingleFlight()
+        self.max_retries: int = max_retries
+        self.retry_budget: RetryBudget = RetryBudget()
+        self.breaker: CircuitBreaker = CircuitBreaker()
+        self.outbox_path: str = outbox_path
+        self._outbox: Optional[Outbox] = None
+        self._replay_task: Optional[asyncio.Task] = None
+        # Mutations that went to the outbox instead of the backend.
+        self.deferred: int = 0
+
+    # The session has to be created from inside the running loop, so it is built on first use
+    # and reused by every request after that.
+    def session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            connector = TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive,
+                ttl_dns_cache=300,
+            )
+            self._session = ClientSession(
+                connector=connector, headers=headers, timeout=self.timeout
+            )
+
+        return self._session
+
+    @property
+    def outbox(self) -> Outbox:
+        if self._outbox is None:
+            self._outbox = Outbox(self.outbox_path)
+
+        return self._outbox
+
+    # Connection errors, timeouts, 5xx and 429 responses are retried with jittered exponential
+    # backoff, as long as the shared retry budget allows it. Every failed attempt counts against
+    # the circuit breaker, and while it is open requests fail fast with CircuitOpenError.
+    async def request(
+        self, method: str, payload: Dict, timeout: Optional[float] = None
+    ) -> GQLResponse:
+        request_timeout = ClientTimeout(total=timeout) if timeout else self.timeout
+        data = json.dumps(payload)
+        attempt = 0
+        self.retry_budget.deposit()
+
+        with metrics.timed(payload.get("operationName") or method) as sample:
+            sample.request_bytes = len(data)
+
+            while True:
+                if not self.breaker.allow():
+                    raise CircuitOpenError("Backend circuit is open.")
+
+                trial = self.breaker.state == CircuitBreaker.HALF_OPEN
+
+                try:
+                    async with self.session().request(
+                        method, self.url, data=data, timeout=request_timeout
+                    ) as response:
+                        raw = await response.read()
+                        result = GQLResponse(response.status, _decode(raw))
+                except (ClientError, TimeoutError) as e:
+                    error = BackendError(f"{method} request to {self.url} failed: {e!r}")
+                else:
+                    sample.status = result.status
+                    sample.response_bytes = len(raw)
+
+                    if result.status < 500 and result.status != 429:
+                        self.breaker.record_success()
+
+                        return result
+
+                    error = BackendError(
+                        f"{method} request to {self.url} returned {result.status}.",
+                        result.status,
+                    )
+                finally:
+                    if trial:
+                        self.breaker.release()
+
+                self.breaker.record_failure()
+                attempt += 1
+
+                if attempt > self.max_retries or not self.retry_budget.withdraw():
+                    logging.error(str(error))
+                    raise error
+
+                await asyncio.sleep(backoff(attempt))
+
+    async def post(self, payload: Dict, timeout: Optional[float] = None) -> GQLResponse:
+        return await self.request("POST", payload, timeout)
+
+    async def patch(self, payload: Dict, timeout: Optional[float] = None) -> GQLResponse:
+        return await self.request("PATCH", payload, timeout)
+
+    async def delete(self, payload: Dict, timeout: Optional[float] = None) -> GQLResponse:
+        return await self.request("DELETE", payload, timeout)
+
+    # Identical queries issued while one is already in flight share its response. Mutations are
+    # always sent, and go to the outbox when they cannot be delivered.
+    async def execute(
+        self,
+        operation: Operation,
+        variables: Optional[Dict] = None,
+        method: str = "POST",
+        timeout: Optional[float] = None,
+    ) -> GQLResponse:
+        if operation.mode is not Mode.QUERY:
+            return await self._mutate(operation, variables, method, timeout)
+
+        key = (operation.name, json.dumps(variables, sort_keys=True, default=str))
+
+        return await self.flights.do(
+            key, lambda: self._execute(operation, variables, method, timeout)
+        )
+
+    async def _execute(
+        self,
+        operation: Operation,
+        variables: Optional[Dict],
+        method: str,
+        timeout: Optional[float],
+    ) -> GQLResponse:
+        persisted = self.persisted_queries
+        payload = self._payload(operation, variables, persisted)
+        response = await self.request(method, payload, timeout)
+
+        if not persisted:
+            return response
+
+        error = _persisted_query_error(response.body)
+
+        if error is None:
+            return response
+
+        if error == "PERSISTED_QUERY_NOT_SUPPORTED":
+            logging.warning("Backend does not support persisted queries. Sending full text.")
+            self.persisted_queries = False
+
+        payload = self._payload(operation, variables, self.persisted_queries, with_query=True)
+
+        return await self.request(method, payload, timeout)
+
+    async def _mutate(
+        self,
+        operation: Operation,
+        variables: Optional[Dict],
+        method: str,
+        timeout: Optional[float],
+    ) -> GQLResponse:
+        # Anything already waiting in the outbox has to land first, so new mutations queue
+        # behind it instead of overtaking it.
+        if self.outbox.pending == 0:
+            try:
+                return await self._execute(operation, variables, method, timeout)
+            except BackendError as e:
+                error: BackendError = e
+        else:
+            error = CircuitOpenError(f"{self.outbox.pending} mutations are awaiting replay.")
+
+        await self.outbox.put(operation.name, operation.document, variables or {}, method)
+        self.deferred += 1
+        self.start_replay()
+
+        raise MutationDeferred(f"{operation.name} was queued for replay.") from error
+
+    def start_replay(self):
+        if self.outbox.pending and (self._replay_task is None or self._replay_task.done()):
+            self._replay_task = asyncio.create_task(self.replay())
+
+    async def replay(self):
+        while self.outbox.pending:
+            if self.breaker.state != CircuitBreaker.CLOSED:
+                await asyncio.sleep(max(0.0, self.breaker.retry_at - monotonic()))
+
+            if not await self._replay_batch():
+                await asyncio.sleep(RETRY_MAX_DELAY)
+
+        logging.info("Outbox drained.")
+
+    async def _replay_batch(self) -> bool:
+        for entry in await self.outbox.peek():
+            operation = build(entry.name, Mode.MUTATION, entry.document)
+
+            try:
+                response = await self._execute(operation, entry.variables, entry.method, None)
+            except BackendError:
+                return False
+
+            if response.status != 200 or response.body.get("errors"):
+                # The backend is up but rejected it. Replaying again would only fail the same way.
+                logging.error(
+                    f"Dropping outbox entry {entry.id} ({entry.name}): "
+                    f"{response.body.get('errors')}"
+                )
+
+            await self.outbox.remove(entry.id)
+
+        return True
+
+    # After a persisted query miss the hash is sent together with the full text, which registers
+    # it with the backend for every later call.
+    def _payload(
+        self,
+        operation: Operation,
+        variables: Optional[Dict],
+        persisted: bool,
+        with_query: bool = False,
+    ) -> Dict:
+        payload: Dict[str, Any] = {
+            "operationName": operation.name,
+            "variables": variables or {},
+        }
+
+        if persisted and operations.get(operation.name) is operation:
+            payload["extensions"] = {
+                "persistedQuery": {"version": 1, "sha256Hash": operation.sha256}
+            }
+        else:
+            with_query = True
+
+        if with_query:
+            payload["query"] = operation.document
+
+        return payload
+
+    # Yields every element of the array at `prefix` as soon as it has been parsed off the wire,
+    # so a page is never held in memory as a whole. Scalars found at the paths listed in
+    # `captured` (page info, for example) are written back into that dict.
+    async def stream(
+        self,
+        operation: Operation,
+        variables: Optional[Dict],
+        prefix: str,
+        captured: Dict[str, Any],
+        method: str = "POST",
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[Any]:
+        errors: List[str] = []
+        yielded = False
+        payload = self._payload(operation, variables, self.persisted_queries)
+
+        async for item in self._stream(method, payload, prefix, captured, errors, timeout):
+            yielded = True
+            yield item
+
+        error = _persisted_query_error({"errors": [{"message": e} for e in errors]})
+
+        if error is not None and not yielded:
+            if error == "PERSISTED_QUERY_NOT_SUPPORTED":
+                logging.warning("Backend does not support persisted queries. Sending full text.")
+                self.persisted_queries = False
+
+            errors.clear()
+            payload = self._payload(operation, variables, self.persisted_queries, with_query=True)
+
+            async for item in self._stream(method, payload, prefix, captured, errors, timeout):
+                yield item
+
+        if errors:
+            logging.error(f"{operation.name} returned errors: {errors}")
+
+    async def _stream(
+        self,
+        method: str,
+        payload: Dict,
+        prefix: str,
+        captured: Dict[str, Any],
+        errors: List[str],
+        timeout: Optional[float],
+    ) -> AsyncIterator[Any]:
+        request_timeout = ClientTimeout(total=timeout) if timeout else self.timeout
+        item_prefix = f"{prefix}.item"
+        builder: Optional[ijson.ObjectBuilder] = None
+        depth = 0
+
+        with metrics.timed(payload["operationName"]) as sample:
+            response = await self._open(method, payload, request_timeout)
+            sample.status = response.status
+
+            async with response:
+                events = ijson.parse_async(response.content, use_float=True)
+
+                async for path, event, value in events:
+                    if builder is not None:
+                        builder.event(event, value)
+
+                        if event in ("start_map", "start_array"):
+                            depth += 1
+                        elif event in ("end_map", "end_array"):
+                            depth -= 1
+
+                        if depth == 0:
+                            yield builder.value
+                            builder = None
+                    elif path == item_prefix and event in ("start_map", "start_array"):
+                        builder = ijson.ObjectBuilder()
+                        builder.event(event, value)
+                        depth = 1
+                    elif path == item_prefix:
+                        yield value
+                    elif path in captured:
+                        captured[path] = value
+                    elif path in ("errors.item.extensions.code", "errors.item.message"):
+                        errors.append(value)
+
+    # Sends the request of a streamed call with the same retries, backoff and budget as
+    # request(). Only the response head is awaited, so nothing has been yielded when it retries.
+    async def _open(self, method: str, payload: Dict, timeout: ClientTimeout) -> ClientResponse:
+        attempt = 0
+        self.retry_budget.deposit()
+
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError("Backend circuit is open.")
+
+            trial = self.breaker.state == CircuitBreaker.HALF_OPEN
+
+            try:
+                response = await self.session().request(
+                    method, self.url, json=payload, timeout=timeout
+                )
+            except (ClientError, TimeoutError) as e:
+                error = BackendError(f"{method} request to {self.url} failed: {e!r}")
+            else:
+                if response.status < 500 and response.status != 429:
+                    self.breaker.record_success()
+
+                    return response
+
+                response.release()
+                error = BackendError(
+                    f"{method} request to {self.url} returned {response.status}.",
+                    response.status,
+                )
+            finally:
+                if trial:
+                    self.breaker.release()
+
+            self.breaker.record_failure()
+            attempt += 1
+
+            if attempt > self.max_retries or not self.retry_budget.withdraw():
+                logging.error(str(error))
+                raise error
+
+            await asyncio.sleep(backoff(attempt))
+
+    async def close(self):
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+
+        if self._outbox is not None:
+            self._outbox.close()
+
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+def _decode(raw: bytes) -> Dict[str, Any]:
+    try:
+        return json.loads(raw) if raw else {}
+    except ValueError:
+        # Proxies answer 502/503 with HTML. The status code is what matters then.
+        return {}
+
+
+def _persisted_query_error(body: Dict) -> Optional[str]:
+    for error in body.get("errors") or []:
+        code = (error.get("extensions") or {}).get("code") or error.get("message")
+
+        if code in ("PERSISTED_QUERY_NOT_FOUND", "PersistedQueryNotFound"):
+            return "PERSISTED_QUERY_NOT_FOUND"
+        if code in ("PERSISTED_QUERY_NOT_SUPPORTED", "PersistedQueryNotSupported"):
+            return "PERSISTED_QUERY_NOT_SUPPORTED"
+
+    return None
+
+
+client = GraphQLClient()
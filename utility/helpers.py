@@ -3,14 +3,23 @@ import datetime
 import logging
 from datetime import timedelta
 from time import perf_counter_ns
-from typing import Dict
+from typing import Dict, Iterable, Union
 
 # Third party modules
 import arrow
 
+# Internal modules
+from lib.idle_window import IdleWindow
 
-def calculate_average_idle_time() -> int:
-    pass
+
+# Whole seconds. An IdleWindow answers from its running sum; plain lists are summed once.
+def calculate_average_idle_time(times_idle: Union[IdleWindow, Iterable[int]]) -> int:
+    if isinstance(times_idle, IdleWindow):
+        return int(times_idle.mean)
+
+    times_idle = list(times_idle)
+
+    return sum(times_idle) // len(times_idle) if times_idle else 0
 
 
 # measures the amount of idle time between now and then (the given timestamp, which should be user's last message or
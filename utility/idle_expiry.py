@@ -0,0 +1,262 @@
+# Standard modules
+import asyncio
+import logging
+import os
+import re
+from time import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+# Third party modules
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ConnectionError, ResponseError, TimeoutError
+
+# Internal modules
+import utility.request_handler as rh
+from utility import cache, last_seen
+from utility.batcher import writer
+
+# Members per AddPurgeListEntries mutation.
+PURGE_LIST_BATCH = int(os.getenv("PURGE_LIST_BATCH", 500))
+# Seconds between health checks of the subscription while no key expires.
+EXPIRY_POLL = float(os.getenv("EXPIRY_POLL", 30))
+
+DAY = 86400
+EXPIRED_KEY = re.compile(r"^guild:(\d+):active:(\d+)$")
+
+
+# guild:{id}:active:{mid} exists while a member is active and expires when they have been idle
+# for the guild's inactivity threshold. Redis publishes the expiry, so nothing has to scan
+# members to find who went idle.
+def active_key(guild_id: int, member_id: int) -> str:
+    return f"guild:{guild_id}:active:{member_id}"
+
+
+# Members marked inactive. They should have the inactive role until they are active again.
+def inactive_key(guild_id: int) -> str:
+    return f"guild:{guild_id}:inactive"
+
+
+# Guilds whose inactive set changed since utility.roles last reconciled them.
+CHANGED_KEY = "inactive:changed"
+
+
+# "{guild id}:{member id}" entries scored by when the member becomes due for pruning.
+PURGE_KEY = "purge:deadlines"
+
+
+def purge_entry(guild_id: int, member_id: int) -> str:
+    return f"{guild_id}:{member_id}"
+
+
+# Seconds of idleness before a member is inactive. The bot stores set_inactive in days, while
+# older backend records hold time_before_inactive as [days, hours, minutes].
+def inactive_after(settings: Dict) -> int:
+    if settings.get("set_inactive"):
+        return int(settings["set_inactive"]) * DAY
+
+    days, hours, minutes = (list(settings.get("time_before_inactive") or []) + [0, 0, 0])[:3]
+
+    return days * DAY + hours * 3600 + minutes * 60 or 30 * DAY
+
+
+def prune_after(settings: Dict) -> int:
+    return int(settings.get("auto_prune_timer") or 14) * DAY
+
+
+class Tracked(NamedTuple):
+    # Members whose key was renewed, and members already idle past the threshold.
+    active: List[int]
+    stale: List[int]
+    # Index of the SMISMEMBER reply in the pipeline results, -1 if none was queued.
+    at: int
+
+
+class IdleExpiry:
+    def __init__(self, redis: Redis):
+        self.redis: Redis = redis
+        self._task: Optional[asyncio.Task] = None
+        # utility.roles.RoleReconciler, woken whenever the inactive set changes.
+        self.reconciler = None
+
+        self.expired: int = 0
+        self.reactivated: int = 0
+
+    def _changed(self):
+        if self.reconciler is not None:
+            self.reconciler.wake()
+
+    async def settings(self, guild_id: int) -> Dict:
+        try:
+            return await cache.guild_settings(self.redis, guild_id)
+        except Exception:
+            logging.exception("Could not load settings for guild %s.", guild_id)
+            return {}
+
+    # Queued on the caller's pipeline by every writer of member activity (the aggregator,
+    # onboarding and /baseline). Each member's key is pushed out to their latest activity plus
+    # the threshold, and SMISMEMBER tells which of them were inactive until now. Members whose
+    # latest activity is already past the threshold get no key, so they are returned as stale
+    # for settle() to mark.
+    async def track(self, pipe: Pipeline, guild_id: int, seen: Dict[int, float]) -> Tracked:
+        ttl = inactive_after(await self.settings(guild_id))
+        now = time()
+        active = [m for m, ts in seen.items() if ts + ttl > now]
+        stale = [m for m, ts in seen.items() if ts + ttl <= now]
+
+        for member_id in active:
+            pipe.set(active_key(guild_id, member_id), 1, exat=int(seen[member_id] + ttl) + 1)
+
+        if not active:
+            return Tracked(active, stale, -1)
+
+        pipe.smismember(inactive_key(guild_id), active)
+
+        return Tracked(active, stale, len(pipe) - 1)
+
+    # Run with the results of the pipeline track() was queued on.
+    async def settle(self, guild_id: int, tracked: Tracked, results: List):
+        if tracked.at >= 0:
+            flags = results[tracked.at]
+            await self.reactivate(guild_id, [m for m, i in zip(tracked.active, flags) if i])
+
+        await self.mark_inactive(guild_id, tracked.stale)
+
+    async def start(self):
+        if self._task is not None and not self._task.done():
+            return
+
+        await self._enable_notifications()
+        self._task = asyncio.create_task(self._listen())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    # Keyspace notifications are off by default. Managed Redis often refuses CONFIG SET, in
+    # which case they have to be enabled on the server ("notify-keyspace-events Ex").
+    async def _enable_notifications(self):
+        try:
+            flags = (await self.redis.config_get("notify-keyspace-events")).get(
+                "notify-keyspace-events", ""
+            )
+
+            if "E" not in flags or not ({"x", "A"} & set(flags)):
+                await self.redis.config_set("notify-keyspace-events", "".join({*flags, "E", "x"}))
+        except ResponseError:
+            logging.warning(
+                "Could not enable keyspace notifications. Set notify-keyspace-events to Ex on the "
+                "Redis server, or members will only be marked inactive at startup."
+            )
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+
+            try:
+                await pubsub.psubscribe("__keyevent@*__:expired")
+
+                while True:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=EXPIRY_POLL
+                    )
+
+                    if message is None:
+                        continue
+
+                    match = EXPIRED_KEY.match(message["data"])
+
+                    if match:
+                        await self.mark_inactive(int(match[1]), [int(match[2])])
+            except asyncio.CancelledError:
+                raise
+            except (ConnectionError, TimeoutError):
+                logging.warning("Lost the expiry subscription. Reconnecting.")
+                await asyncio.sleep(5)
+            except Exception:
+                logging.exception("Idle expiry handler failed.")
+            finally:
+                await pubsub.aclose()
+
+    # Expired events are not delivered while the bot is offline, so on startup every member idle
+    # for longer than the threshold, and not already marked, is marked now.
+    async def catch_up(self, guild_ids: Iterable[int]):
+        for guild_id in guild_ids:
+            try:
+                ttl = inactive_after(await self.settings(guild_id))
+                idle = [m for m, _ in await last_seen.idle_members(self.redis, guild_id, ttl)]
+
+                if idle:
+                    marked = await self.redis.smismember(inactive_key(guild_id), idle)
+                    await self.mark_inactive(
+                        guild_id, [m for m, known in zip(idle, marked) if not known]
+                    )
+            except Exception:
+                logging.exception("Could not catch up idle members of guild %s.", guild_id)
+
+    # SADD doubles as a claim, so a member is only handled once even if several processes
+    # receive the same event.
+    async def mark_inactive(self, guild_id: int, member_ids: List[int]):
+        if not member_ids:
+            return
+
+        pipe = self.redis.pipeline(transaction=False)
+
+        for member_id in member_ids:
+            pipe.sadd(inactive_key(guild_id), member_id)
+
+        claimed = [m for m, added in zip(member_ids, await pipe.execute()) if added]
+
+        if not claimed:
+            return
+
+        settings = await self.settings(guild_id)
+        deadline = time() + prune_after(settings)
+        pipe = self.redis.pipeline(transaction=False)
+
+        for member_id in claimed:
+            pipe.hset(f"guild:{guild_id}:member:{member_id}", "status", "inactive")
+            writer.update_member(guild_id, member_id, status="inactive")
+
+        if settings.get("auto_kick"):
+            pipe.zadd(PURGE_KEY, {purge_entry(guild_id, m): deadline for m in claimed}, nx=True)
+
+        pipe.sadd(CHANGED_KEY, guild_id)
+        await pipe.execute()
+        self.expired += len(claimed)
+
+        if settings.get("auto_kick"):
+            for i in range(0, len(claimed), PURGE_LIST_BATCH):
+                try:
+                    await rh.add_many_to_purge_list(guild_id, claimed[i : i + PURGE_LIST_BATCH])
+                except Exception:
+                    logging.exception("Could not queue purge entries of guild %s.", guild_id)
+
+        self._changed()
+
+    async def reactivate(self, guild_id: int, member_ids: List[int]):
+        if not member_ids:
+            return
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.srem(inactive_key(guild_id), *member_ids)
+        pipe.zmscore(PURGE_KEY, [purge_entry(guild_id, m) for m in member_ids])
+        pipe.zrem(PURGE_KEY, *(purge_entry(guild_id, m) for m in member_ids))
+        pipe.sadd(CHANGED_KEY, guild_id)
+
+        for member_id in member_ids:
+            pipe.hset(f"guild:{guild_id}:member:{member_id}", "status", "active")
+            writer.update_member(guild_id, member_id, status="active")
+
+        _, deadlines, *_ = await pipe.execute()
+        self.reactivated += len(member_ids)
+        # Only members who had a deadline are on the backend purge list.
+        unqueued = [m for m, deadline in zip(member_ids, deadlines) if deadline is not None]
+
+        if unqueued:
+            try:
+                await rh.remove_many_from_purge_list(unqueued)
+            except Exception:
+                logging.exception("Could not unqueue purge entries of guild %s.", guild_id)
+
+        self._changed()
@@ -0,0 +1,92 @@
+# Standard modules
+import os
+from collections import Counter, OrderedDict
+from time import time
+from typing import Dict, Optional, Tuple
+
+# Internal modules
+from utility.activity import ActivityAggregator
+
+# Seconds during which further events of that kind from the same member are dropped, as
+# "source=seconds" pairs. Messages are not debounced, since they also feed the guild idle gaps.
+ACTIVITY_DEBOUNCE = os.getenv(
+    "ACTIVITY_DEBOUNCE", "message=0,reaction=60,typing=60,thread=60,interaction=30,presence=300"
+)
+# Sources that count as activity of the guild itself, updating its last_act and idle gaps.
+# Every other source only marks the member active.
+GUILD_SOURCES = ("message",)
+
+
+def parse_windows(spec: str) -> Dict[str, float]:
+    windows = {}
+
+    for pair in filter(None, (p.strip() for p in spec.split(","))):
+        source, _, seconds = pair.partition("=")
+        windows[source.strip()] = float(seconds)
+
+    return windows
+
+
+# Single entry point for every kind of member activity. An event is only passed on to the
+# aggregator if that member has had no event of the same kind within the source's window, so a
+# member spamming reactions costs one write per window however many they add.
+class ActivityIngest:
+    def __init__(self, activity: ActivityAggregator, windows: Optional[Dict[str, float]] = None):
+        self.activity: ActivityAggregator = activity
+        self.windows: Dict[str, float] = (
+            windows if windows is not None else parse_windows(ACTIVITY_DEBOUNCE)
+        )
+        self._horizon: float = max(self.windows.values(), default=0.0)
+        # (source, guild_id, member_id) -> ts of the last accepted event, oldest first.
+        self._last: "OrderedDict[Tuple[str, int, int], float]" = OrderedDict()
+
+        self.accepted: Counter = Counter()
+        self.dropped: Counter = Counter()
+
+    def offer(
+        self,
+        source: str,
+        guild_id: int,
+        member_id: int,
+        channel_id: int,
+        channel_type: str,
+        ts: Optional[float] = None,
+    ) -> bool:
+        ts = ts or time()
+        window = self.windows.get(source, 0.0)
+
+        if window > 0:
+            key = (source, guild_id, member_id)
+            last = self._last.get(key)
+
+            if last is not None and ts - last < window:
+                self.dropped[source] += 1
+                return False
+
+            self._last[key] = ts
+            self._last.move_to_end(key)
+            self._expire(ts)
+
+        self.accepted[source] += 1
+        self.activity.record(
+            guild_id, member_id, channel_id, channel_type, ts, guild=source in GUILD_SOURCES
+        )
+
+        return True
+
+    # Entries past the longest window can no longer drop anything. Accepted timestamps are
+    # appended in order, so expiring from the front is amortised O(1).
+    def _expire(self, now: float):
+        while self._last:
+            key, ts = next(iter(self._last.items()))
+
+            if now - ts < self._horizon:
+                break
+
+            del self._last[key]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            source: {"accepted": self.accepted[source], "dropped": self.dropped[source]}
+            for source in sorted(set(self.accepted) | set(self.dropped))
+        }
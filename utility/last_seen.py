@@ -0,0 +1,61 @@
+# Standard modules
+from time import time
+from typing import Dict, List, Optional, Tuple
+
+# Third party modules
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+
+# guild:{id}:last_seen scores every member id by the epoch seconds of their latest activity, so
+# "who has been idle for longer than X" is one range query instead of a walk over every
+# guild:{id}:member:{mid} hash.
+def key(guild_id: int) -> str:
+    return f"guild:{guild_id}:last_seen"
+
+
+# Queued on the caller's pipeline. GT keeps a late flush from moving a member backwards.
+def touch(pipe: Pipeline, guild_id: int, seen: Dict[int, float]):
+    if seen:
+        pipe.zadd(key(guild_id), {str(m): ts for m, ts in seen.items()}, gt=True)
+
+
+async def forget(redis: Redis, guild_id: int, *member_ids: int):
+    if member_ids:
+        await redis.zrem(key(guild_id), *member_ids)
+
+
+async def last_seen(redis: Redis, guild_id: int, member_id: int) -> Optional[float]:
+    return await redis.zscore(key(guild_id), member_id)
+
+
+def cutoff(idle_for: float, now: Optional[float]) -> str:
+    # Exclusive, so a member seen exactly idle_for ago is not idle yet.
+    return f"({(now or time()) - idle_for}"
+
+
+# (member id, last seen) of members idle for longer than idle_for seconds, longest idle first.
+async def idle_members(
+    redis: Redis,
+    guild_id: int,
+    idle_for: float,
+    offset: int = 0,
+    count: Optional[int] = None,
+    now: Optional[float] = None,
+) -> List[Tuple[int, float]]:
+    rows = await redis.zrangebyscore(
+        key(guild_id),
+        "-inf",
+        cutoff(idle_for, now),
+        start=offset if count is not None else None,
+        num=count,
+        withscores=True,
+    )
+
+    return [(int(member_id), ts) for member_id, ts in rows]
+
+
+async def count_idle(
+    redis: Redis, guild_id: int, idle_for: float, now: Optional[float] = None
+) -> int:
+    return await redis.zcount(key(guild_id), "-inf", cutoff(idle_for, now))
@@ -0,0 +1,84 @@
+# Standard modules
+import asyncio
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Internal modules
+import utility.request_handler as rh
+from lib.typings import Member as GQLMember
+
+LOADER_MAX_BATCH = int(os.getenv("LOADER_MAX_BATCH", 500))
+
+
+# Collects every member lookup issued during the same loop iteration and resolves them with one
+# MembersById query per guild (split into LOADER_MAX_BATCH sized chunks). Results are cached on
+# the instance, so create one loader per command or event rather than sharing it globally.
+class MemberLoader:
+    def __init__(self, max_batch: int = LOADER_MAX_BATCH):
+        self.max_batch: int = max_batch
+        self._cache: Dict[Tuple[int, int], asyncio.Future] = {}
+        self._queue: Dict[int, List[int]] = {}
+        self._scheduled: bool = False
+        # The event loop only keeps weak references to tasks, so pending lookups are held here.
+        self._tasks: Set[asyncio.Task] = set()
+
+    def load(self, guild_id: int, member_id: int) -> asyncio.Future:
+        key = (guild_id, member_id)
+
+        if key in self._cache:
+            return self._cache[key]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._cache[key] = future
+        self._queue.setdefault(guild_id, []).append(member_id)
+
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(self._dispatch)
+
+        return future
+
+    async def load_many(
+        self, guild_id: int, member_ids: Iterable[int]
+    ) -> List[Optional[GQLMember]]:
+        return await asyncio.gather(*(self.load(guild_id, m_id) for m_id in member_ids))
+
+    def clear(self):
+        self._cache.clear()
+
+    def _dispatch(self):
+        self._scheduled = False
+        queue, self._queue = self._queue, {}
+
+        for guild_id, member_ids in queue.items():
+            for i in range(0, len(member_ids), self.max_batch):
+                task = asyncio.create_task(
+                    self._resolve(guild_id, member_ids[i : i + self.max_batch])
+                )
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, guild_id: int, member_ids: List[int]):
+        try:
+            members = await rh.members(guild_id, member_ids)
+        except Exception as e:
+            logging.error(f"Batched lookup of {len(member_ids)} members failed.")
+
+            for m_id in member_ids:
+                # Forget failed keys so a later load can try again.
+                future = self._cache.pop((guild_id, m_id), None)
+
+                if future is not None and not future.done():
+                    future.set_exception(e)
+
+            return
+
+        by_id = {int(m["memberId"]): m for m in members}
+
+        for m_id in member_ids:
+            future = self._cache.get((guild_id, m_id))
+
+            if future is not None and not future.done():
+                future.set_result(by_id.get(m_id))
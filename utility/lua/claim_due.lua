@@ -0,0 +1,18 @@
+-- Leases the entries of a deadline sorted set that are due, so two processes sharing it never
+-- both handle one entry. Claimed entries are re-scored to the end of the lease rather than
+-- removed, so a process that dies mid-batch leaves them to be claimed again once it runs out.
+--
+-- KEYS[1]  sorted set scored by deadline (epoch seconds)
+-- ARGV[1]  now, epoch seconds
+-- ARGV[2]  most entries to take
+-- ARGV[3]  end of the lease, epoch seconds
+--
+-- Returns the claimed entries, earliest deadline first.
+
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+
+for _, entry in ipairs(due) do
+    redis.call('ZADD', KEYS[1], 'XX', ARGV[3], entry)
+end
+
+return due
@@ -0,0 +1,132 @@
+-- Atomically folds a flushed batch of guild activity into guild:{id}:stats and guild:{id}:idle.
+--
+-- KEYS[1]  guild stats hash
+-- KEYS[2]  guild idle hash, holding the times_idle and prev_avgs windows as packed blobs
+-- ARGV[1]  channel id of the latest event
+-- ARGV[2]  channel type of the latest event
+-- ARGV[3]  epoch seconds of the first event in the batch
+-- ARGV[4]  epoch seconds of the latest event in the batch
+-- ARGV[5]  ISO 8601 form of ARGV[4]
+-- ARGV[6]  idle window size
+-- ARGV[7+] idle gaps (seconds) observed between events inside the batch
+--
+-- Returns the new average idle time.
+
+-- Same layout as lib.idle_window.HEADER, followed by capacity little-endian uint32 values.
+local HEADER = '<HHHxxddII'
+local HEADER_SIZE = 32
+
+local key = KEYS[1]
+local first_ts = tonumber(ARGV[3])
+local last_ts = tonumber(ARGV[4])
+local window = tonumber(ARGV[6])
+
+local function push(w, value)
+    local evicted
+
+    if w.count == w.capacity then
+        evicted = w.values[w.head]
+        w.values[w.head] = value
+        w.head = (w.head + 1) % w.capacity
+        w.sum = w.sum - evicted
+        w.sumsq = w.sumsq - evicted * evicted
+    else
+        w.values[(w.head + w.count) % w.capacity] = value
+        w.count = w.count + 1
+    end
+
+    w.sum = w.sum + value
+    w.sumsq = w.sumsq + value * value
+
+    if w.count == 1 then
+        w.min, w.max = value, value
+    elseif evicted and evicted ~= value and (evicted == w.min or evicted == w.max) then
+        w.min, w.max = value, value
+
+        for i = 0, w.count - 1 do
+            local v = w.values[(w.head + i) % w.capacity]
+            w.min = math.min(w.min, v)
+            w.max = math.max(w.max, v)
+        end
+    else
+        w.min = math.min(w.min, value)
+        w.max = math.max(w.max, value)
+    end
+end
+
+local function load_window(blob)
+    local w = {capacity = window, count = 0, head = 0, sum = 0, sumsq = 0, min = 0, max = 0,
+        values = {}}
+
+    if not blob then
+        return w
+    end
+
+    local capacity, count, head, sum, sumsq, min, max = struct.unpack(HEADER, blob)
+    local values, pos = {}, HEADER_SIZE + 1
+
+    for i = 0, capacity - 1 do
+        values[i], pos = struct.unpack('<I', blob, pos)
+    end
+
+    if capacity == window then
+        w.count, w.head, w.sum, w.sumsq, w.min, w.max = count, head, sum, sumsq, min, max
+        w.values = values
+    else
+        -- The window size changed: replay the stored values, oldest first.
+        for i = 0, count - 1 do
+            push(w, values[(head + i) % capacity])
+        end
+    end
+
+    return w
+end
+
+local function dump_window(w)
+    local out = {struct.pack(HEADER, w.capacity, w.count, w.head, w.sum, w.sumsq, w.min, w.max)}
+
+    for i = 0, w.capacity - 1 do
+        out[#out + 1] = struct.pack('<I', w.values[i] or 0)
+    end
+
+    return table.concat(out)
+end
+
+local stored = redis.call('HMGET', KEYS[2], 'times_idle', 'prev_avgs')
+local times_idle = load_window(stored[1])
+local prev_avgs = load_window(stored[2])
+
+local prev_ts = tonumber(redis.call('HGET', key, 'last_ts'))
+local avg = times_idle.count > 0 and math.floor(times_idle.sum / times_idle.count) or 0
+local gaps = {}
+
+if prev_ts and first_ts > prev_ts then
+    gaps[#gaps + 1] = math.floor(first_ts - prev_ts)
+end
+
+for i = 7, #ARGV do
+    gaps[#gaps + 1] = tonumber(ARGV[i])
+end
+
+if #gaps > 0 then
+    if avg > 0 then
+        push(prev_avgs, avg)
+    end
+
+    for _, gap in ipairs(gaps) do
+        push(times_idle, math.max(0, gap))
+    end
+
+    avg = math.floor(times_idle.sum / times_idle.count)
+    redis.call('HSET', KEYS[2], 'times_idle', dump_window(times_idle),
+        'prev_avgs', dump_window(prev_avgs))
+end
+
+-- Never move the last activity backwards when flushes from two processes land out of order.
+if not prev_ts or last_ts > prev_ts then
+    -- The channel id is spliced in as-is, since snowflakes do not survive a Lua number.
+    redis.call('HSET', key, 'last_ts', ARGV[4], 'last_act', '{"ch":' .. ARGV[1]
+        .. ',"type":' .. cjson.encode(ARGV[2]) .. ',"ts":' .. cjson.encode(ARGV[5]) .. '}')
+end
+
+return avg
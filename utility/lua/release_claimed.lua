@@ -0,0 +1,20 @@
+-- Removes entries leased by claim_due.lua once they are handled. An entry whose score is no
+-- longer the lease was re-scheduled in the meantime (e.g. the member went inactive again) and
+-- is kept.
+--
+-- KEYS[1]  sorted set scored by deadline (epoch seconds)
+-- ARGV[1]  end of the lease the entries were claimed with
+-- ARGV[2+] entries
+--
+-- Returns how many entries were removed.
+
+local lease = tonumber(ARGV[1])
+local removed = 0
+
+for i = 2, #ARGV do
+    if tonumber(redis.call('ZSCORE', KEYS[1], ARGV[i])) == lease then
+        removed = removed + redis.call('ZREM', KEYS[1], ARGV[i])
+    end
+end
+
+return removed
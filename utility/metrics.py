@@ -0,0 +1,138 @@
+# Standard modules
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional
+
+# Bucket upper bounds in milliseconds, growing by 1.5x from 0.5ms to roughly a minute.
+LATENCY_BUCKETS: List[float] = [0.5 * 1.5**i for i in range(30)]
+
+
+# Fixed-bucket histogram. Recording is a bisect plus two additions. Quantiles are interpolated
+# within the matching bucket, which is accurate to the bucket width.
+class Histogram:
+    def __init__(self, bounds: List[float] = LATENCY_BUCKETS):
+        self.bounds: List[float] = bounds
+        self.counts: List[int] = [0] * (len(bounds) + 1)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.bounds[i - 1] if i else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+
+            seen += bucket_count
+
+        return self.max
+
+
+class Sample:
+    __slots__ = ("status", "request_bytes", "response_bytes")
+
+    def __init__(self):
+        self.status: Optional[int] = None
+        self.request_bytes: int = 0
+        self.response_bytes: int = 0
+
+
+class OperationStats:
+    def __init__(self):
+        self.latency: Histogram = Histogram()
+        self.errors: int = 0
+        self.statuses: Counter = Counter()
+        self.request_bytes: int = 0
+        self.response_bytes: int = 0
+
+    def summary(self) -> Dict[str, Any]:
+        count = self.latency.count
+
+        return {
+            "count": count,
+            "errors": self.errors,
+            "p50_ms": round(self.latency.quantile(0.5), 2),
+            "p99_ms": round(self.latency.quantile(0.99), 2),
+            "max_ms": round(self.latency.max, 2),
+            "avg_request_bytes": self.request_bytes // count if count else 0,
+            "avg_response_bytes": self.response_bytes // count if count else 0,
+            "statuses": dict(self.statuses),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.operations: Dict[str, OperationStats] = {}
+
+    def record(
+        self,
+        name: str,
+        seconds: float,
+        status: Optional[int] = None,
+        request_bytes: int = 0,
+        response_bytes: int = 0,
+        error: bool = False,
+    ):
+        stats = self.operations.get(name)
+
+        if stats is None:
+            stats = self.operations[name] = OperationStats()
+
+        stats.latency.observe(seconds * 1000)
+        stats.request_bytes += request_bytes
+        stats.response_bytes += response_bytes
+
+        if status is not None:
+            stats.statuses[status] += 1
+        if error:
+            stats.errors += 1
+
+    # Times the block and records it under `name`. The block can fill in status and payload sizes
+    # on the yielded sample. An exception escaping the block is counted as an error.
+    @contextmanager
+    def timed(self, name: str) -> Iterator[Sample]:
+        sample = Sample()
+        start = perf_counter()
+        error = False
+
+        try:
+            yield sample
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(
+                name,
+                perf_counter() - start,
+                sample.status,
+                sample.request_bytes,
+                sample.response_bytes,
+                error or (sample.status is not None and sample.status >= 400),
+            )
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.summary() for name, stats in sorted(self.operations.items())}
+
+    def reset(self):
+        self.operations.clear()
+
+
+metrics = Metrics()
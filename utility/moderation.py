@@ -0,0 +1,255 @@
+# Standard modules
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+from collections import deque
+from contextlib import contextmanager
+from time import monotonic
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+# Third party modules
+from nextcord import Forbidden, HTTPException, NotFound
+from nextcord.ext.commands import Bot
+
+# Actions running at once across every guild.
+MODERATION_CONCURRENCY = int(os.getenv("MODERATION_CONCURRENCY", 10))
+# Actions running at once per bucket. Kicks and role changes are limited per route and guild,
+# so one guild's prune cannot use up the budget of the others.
+MODERATION_PER_BUCKET = int(os.getenv("MODERATION_PER_BUCKET", 2))
+# 429s an action may hit before it is given up.
+MODERATION_RETRIES = int(os.getenv("MODERATION_RETRIES", 3))
+# Seconds of completed actions the throughput figure covers.
+THROUGHPUT_WINDOW = 60
+
+KICK = "kick"
+ADD_ROLE = "add_role"
+REMOVE_ROLE = "remove_role"
+
+
+class ModerationAction:
+    __slots__ = ("kind", "guild_id", "member_id", "role_id", "reason", "attempts", "future")
+
+    def __init__(
+        self, kind: str, guild_id: int, member_id: int, role_id: Optional[int], reason: str
+    ):
+        self.kind: str = kind
+        self.guild_id: int = guild_id
+        self.member_id: int = member_id
+        self.role_id: Optional[int] = role_id
+        self.reason: str = reason
+        self.attempts: int = 0
+        # True once done, False when the member or role is already gone, None when Discord
+        # refused it.
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    # Discord buckets these routes by their major parameter, the guild. Adding and removing a
+    # role share a route.
+    @property
+    def bucket(self) -> Tuple[str, int]:
+        return (KICK if self.kind == KICK else "role", self.guild_id)
+
+
+class Bucket:
+    __slots__ = ("running", "blocked_until", "parked")
+
+    def __init__(self):
+        self.running: int = 0
+        # monotonic() time a 429 told us to wait until.
+        self.blocked_until: float = 0.0
+        # Actions that came up while the bucket was full or blocked, in arrival order.
+        self.parked: Deque[Tuple[int, int, ModerationAction]] = deque()
+
+
+# Runs kicks and role changes concurrently. The queue is ordered by guild priority (lower first)
+# and then by arrival. A guild's priority is the size of the backlogs its callers declared with
+# backlog(), so a few role changes in one guild are not queued behind a large prune in another.
+# An action whose bucket is full or cooling down is parked on the bucket instead of holding a
+# worker, and goes back on the queue once the bucket has room. nextcord still serialises
+# requests within a bucket and waits out exhausted ones; this keeps the queue from piling every
+# guild's actions into one bucket's wait and honours retry_after on 429s nextcord gave up on.
+class ModerationExecutor:
+    def __init__(
+        self,
+        concurrency: int = MODERATION_CONCURRENCY,
+        per_bucket: int = MODERATION_PER_BUCKET,
+    ):
+        self.bot: Optional[Bot] = None
+        self.concurrency: int = concurrency
+        self.per_bucket: int = per_bucket
+        # guild id -> actions declared by the backlogs in progress for that guild.
+        self.priorities: Dict[int, int] = {}
+        self._queue: List[Tuple[int, int, ModerationAction]] = []
+        self._ready: Optional[asyncio.Event] = None
+        self._order = itertools.count()
+        self._buckets: Dict[Tuple[str, int], Bucket] = {}
+        self._workers: List[asyncio.Task] = []
+        self._completed: Deque[float] = deque()
+
+        self.submitted: int = 0
+        self.done: int = 0
+        self.failed: int = 0
+        self.retried: int = 0
+
+    def start(self, bot: Bot):
+        self.bot = bot
+
+        if not self._workers:
+            self._ready = asyncio.Event()
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+
+        self._workers = []
+
+    # Wraps the submission of a guild's batch of `size` actions. Actions submitted inside it are
+    # ordered by the guild's outstanding backlog, smallest first.
+    @contextmanager
+    def backlog(self, guild_id: int, size: int) -> Iterator[None]:
+        self.priorities[guild_id] = self.priorities.get(guild_id, 0) + size
+
+        try:
+            yield
+        finally:
+            remaining = self.priorities.get(guild_id, 0) - size
+
+            if remaining > 0:
+                self.priorities[guild_id] = remaining
+            else:
+                self.priorities.pop(guild_id, None)
+
+    def kick(self, guild_id: int, member_id: int, reason: str = "Inactive") -> asyncio.Future:
+        return self.submit(ModerationAction(KICK, guild_id, member_id, None, reason))
+
+    def add_role(
+        self, guild_id: int, member_id: int, role_id: int, reason: str = "Inactive"
+    ) -> asyncio.Future:
+        return self.submit(ModerationAction(ADD_ROLE, guild_id, member_id, role_id, reason))
+
+    def remove_role(
+        self, guild_id: int, member_id: int, role_id: int, reason: str = "Active again"
+    ) -> asyncio.Future:
+        return self.submit(ModerationAction(REMOVE_ROLE, guild_id, member_id, role_id, reason))
+
+    def submit(self, action: ModerationAction) -> asyncio.Future:
+        self.submitted += 1
+        self._push(action)
+
+        return action.future
+
+    def _push(self, action: ModerationAction, order: Optional[int] = None):
+        priority = self.priorities.get(action.guild_id, 0)
+        order = next(self._order) if order is None else order
+        heapq.heappush(self._queue, (priority, order, action))
+
+        if self._ready is not None:
+            self._ready.set()
+
+    async def _work(self):
+        while True:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            priority, order, action = heapq.heappop(self._queue)
+            bucket = self._buckets.setdefault(action.bucket, Bucket())
+
+            if bucket.running >= self.per_bucket or bucket.blocked_until > monotonic():
+                bucket.parked.append((priority, order, action))
+                continue
+
+            bucket.running += 1
+
+            try:
+                await self._run(action, bucket)
+            finally:
+                bucket.running -= 1
+                self._release(action.bucket, bucket)
+
+    async def _run(self, action: ModerationAction, bucket: Bucket):
+        action.attempts += 1
+
+        try:
+            if action.kind == KICK:
+                await self.bot.http.kick(action.member_id, action.guild_id, reason=action.reason)
+            elif action.kind == ADD_ROLE:
+                await self.bot.http.add_role(
+                    action.guild_id, action.member_id, action.role_id, reason=action.reason
+                )
+            else:
+                await self.bot.http.remove_role(
+                    action.guild_id, action.member_id, action.role_id, reason=action.reason
+                )
+        except NotFound:
+            self._finish(action, False)
+        except Forbidden:
+            logging.warning(
+                f"Not allowed to {action.kind} member {action.member_id} of guild "
+                f"{action.guild_id}."
+            )
+            self._finish(action, None)
+        except HTTPException as e:
+            if e.status == 429 and action.attempts <= MODERATION_RETRIES:
+                retry_after = float(e.response.headers.get("Retry-After", 1))
+                bucket.blocked_until = max(bucket.blocked_until, monotonic() + retry_after)
+                self.retried += 1
+                self._push(action)
+            else:
+                logging.exception(f"Could not {action.kind} member {action.member_id}.")
+                self._finish(action, None)
+        except Exception as e:
+            self.failed += 1
+
+            if not action.future.done():
+                action.future.set_exception(e)
+        else:
+            self._finish(action, True)
+
+    def _finish(self, action: ModerationAction, outcome: Optional[bool]):
+        if outcome is None:
+            self.failed += 1
+        else:
+            self.done += 1
+            self._completed.append(monotonic())
+
+        if not action.future.done():
+            action.future.set_result(outcome)
+
+    # Moves parked actions back into the queue once the bucket has room, after its cooldown if
+    # a 429 set one.
+    def _release(self, key: Tuple[str, int], bucket: Bucket):
+        wait = bucket.blocked_until - monotonic()
+
+        if wait > 0:
+            asyncio.get_running_loop().call_later(wait, self._release, key, bucket)
+            return
+
+        for _ in range(min(len(bucket.parked), self.per_bucket - bucket.running)):
+            _, order, action = bucket.parked.popleft()
+            self._push(action, order)
+
+        if not bucket.running and not bucket.parked:
+            self._buckets.pop(key, None)
+
+    def stats(self) -> Dict:
+        cutoff = monotonic() - THROUGHPUT_WINDOW
+
+        while self._completed and self._completed[0] < cutoff:
+            self._completed.popleft()
+
+        return {
+            "queued": len(self._queue),
+            "parked": sum(len(b.parked) for b in self._buckets.values()),
+            "running": sum(b.running for b in self._buckets.values()),
+            "done": self.done,
+            "failed": self.failed,
+            "retried": self.retried,
+            "per_minute": len(self._completed) * 60 / THROUGHPUT_WINDOW,
+        }
+
+
+moderation = ModerationExecutor()
@@ -0,0 +1,173 @@
+# Standard modules
+import asyncio
+import json
+import os
+from time import time
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+
+# Third party modules
+import arrow
+from nextcord import Guild, Member, Object
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+# Internal modules
+import utility.request_handler as rh
+from lib.typings import Member as GQLMember
+from utility import cache, last_seen
+from utility.idle_expiry import IdleExpiry, Tracked
+
+ONBOARD_CHUNK = int(os.getenv("ONBOARD_CHUNK", 500))
+# Pause between chunks, so onboarding a huge guild leaves room for everything else.
+ONBOARD_PAUSE_MS = int(os.getenv("ONBOARD_PAUSE_MS", 250))
+
+
+class OnboardingResult(NamedTuple):
+    members: int
+    chunks: int
+    resumed: bool
+
+
+# guild:{id}:onboarding holds the highest member id written so far. It only exists while a guild
+# is being onboarded, so its presence after a restart means the join was interrupted.
+def checkpoint_key(guild_id: int) -> str:
+    return f"guild:{guild_id}:onboarding"
+
+
+# Members come in id order, so every member at or below the checkpoint has been written.
+async def _chunks(guild: Guild, after: int, size: int) -> AsyncIterator[List[Member]]:
+    if guild.chunked:
+        members = sorted(
+            (m for m in guild.members if m.id > after and not m.bot), key=lambda m: m.id
+        )
+
+        for i in range(0, len(members), size):
+            yield members[i : i + size]
+
+        return
+
+    chunk: List[Member] = []
+
+    start = Object(id=after) if after else None
+
+    async for member in guild.fetch_members(limit=None, after=start):
+        if member.bot:
+            continue
+
+        chunk.append(member)
+
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def _member_input(member: Member) -> Dict:
+    return {"memberId": member.id, "username": member.name, "nickname": member.nick}
+
+
+# The backend record as flat hash fields, plus its last activity as JSON. The activity is kept
+# apart so it can be written with HSETNX and never replace a newer one from the aggregator.
+def _member_hash(member: Member, record: GQLMember) -> Tuple[Dict[str, str], str]:
+    fields = {
+        k: "" if v is None else json.dumps(v) if isinstance(v, (dict, list)) else str(v)
+        for k, v in record.items()
+        if k != "lastAct"
+    }
+    fields["name"] = member.display_name
+
+    return fields, json.dumps(record["lastAct"]) if record.get("lastAct") else ""
+
+
+# Epoch seconds of a member's latest activity. Members the backend has no activity for count
+# from when they joined, so they get a last_seen score and an active key like everyone else.
+def _seen_at(member: Member, record: GQLMember) -> Optional[float]:
+    if (record.get("lastAct") or {}).get("ts"):
+        return arrow.get(record["lastAct"]["ts"]).timestamp()
+
+    return member.joined_at.timestamp() if member.joined_at else None
+
+
+# Queues the writes for a chunk on pipe and returns what IdleExpiry.settle needs once it ran.
+# records is None when the upsert was deferred to the outbox. Names are still written so the
+# guild is usable while the backend catches up, but nothing is seeded, since the backend may
+# well have activity for these members.
+async def _queue_chunk(
+    pipe: Pipeline,
+    guild_id: int,
+    chunk: List[Member],
+    records: Optional[List[GQLMember]],
+    expiry: IdleExpiry,
+) -> Tracked:
+    by_id = {int(r["memberId"]): r for r in records or []}
+    seen: Dict[int, float] = {}
+    pipe.sadd(f"guild:{guild_id}:members", *(m.id for m in chunk))
+
+    for member in chunk:
+        record = by_id.get(member.id) or {}
+        member_key = f"guild:{guild_id}:member:{member.id}"
+        fields, last_act = _member_hash(member, record)
+        pipe.hset(member_key, mapping=fields)
+
+        if last_act:
+            pipe.hsetnx(member_key, "last_act", last_act)
+
+        ts = _seen_at(member, record) if records is not None else None
+
+        if ts is not None:
+            seen[member.id] = ts
+
+    last_seen.touch(pipe, guild_id, seen)
+
+    return await expiry.track(pipe, guild_id, seen)
+
+
+# Writes a member who just joined, the same way onboarding writes a chunk.
+async def onboard_member(redis: Redis, member: Member, expiry: IdleExpiry):
+    records = await rh.upsert_members(member.guild.id, [_member_input(member)])
+    pipe = redis.pipeline(transaction=True)
+    tracked = await _queue_chunk(pipe, member.guild.id, [member], records, expiry)
+    await expiry.settle(member.guild.id, tracked, await pipe.execute())
+
+
+# Writes every member of a guild to the backend and Redis in chunks. Each chunk costs one
+# UpsertMembers mutation and one MULTI/EXEC pipeline (SADD, HSETs, last_seen, active keys,
+# checkpoint), so an interrupted run picks up after the last chunk that landed in Redis.
+async def onboard_guild(
+    redis: Redis,
+    guild: Guild,
+    chunk_size: int = ONBOARD_CHUNK,
+    pause_ms: int = ONBOARD_PAUSE_MS,
+    expiry: Optional[IdleExpiry] = None,
+) -> OnboardingResult:
+    expiry = expiry or IdleExpiry(redis)
+    key = checkpoint_key(guild.id)
+    state = await redis.hgetall(key)
+    cursor = int(state.get("cursor", 0))
+    done = int(state.get("done", 0))
+    chunks = 0
+
+    if not state:
+        await redis.hset(key, mapping={"cursor": 0, "done": 0, "started": time()})
+
+    async for chunk in _chunks(guild, cursor, chunk_size):
+        records = await rh.upsert_members(guild.id, [_member_input(m) for m in chunk])
+        pipe = redis.pipeline(transaction=True)
+        tracked = await _queue_chunk(pipe, guild.id, chunk, records, expiry)
+        done += len(chunk)
+        pipe.hset(key, mapping={"cursor": chunk[-1].id, "done": done})
+        await expiry.settle(guild.id, tracked, await pipe.execute())
+        chunks += 1
+
+        if pause_ms:
+            await asyncio.sleep(pause_ms / 1000)
+
+    pipe = redis.pipeline(transaction=True)
+    pipe.delete(key)
+    pipe.hset(f"guild:{guild.id}:meta", "onboarded", arrow.utcnow().isoformat())
+    await pipe.execute()
+    await cache.invalidate(redis, "meta", guild.id)
+
+    return OnboardingResult(done, chunks, bool(state))
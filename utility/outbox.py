@@ -0,0 +1,83 @@
+# Standard modules
+import asyncio
+import json
+import os
+import sqlite3
+from time import time
+from typing import Dict, List, NamedTuple
+
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "outbox.sqlite3")
+
+
+class OutboxEntry(NamedTuple):
+    id: int
+    name: str
+    document: str
+    variables: Dict
+    method: str
+
+
+# Durable, ordered store for mutations that could not reach the backend. SQLite calls run in a
+# worker thread so a slow disk never blocks the event loop.
+class Outbox:
+    def __init__(self, path: str = OUTBOX_PATH):
+        self.path: str = path
+        self._db: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                document TEXT NOT NULL,
+                variables TEXT NOT NULL,
+                method TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+            """
+        )
+        self._db.commit()
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self.pending: int = self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    async def put(self, name: str, document: str, variables: Dict, method: str) -> int:
+        async with self._lock:
+            entry_id = await asyncio.to_thread(
+                self._insert, name, document, json.dumps(variables, default=str), method
+            )
+            self.pending += 1
+
+            return entry_id
+
+    async def peek(self, limit: int = 100) -> List[OutboxEntry]:
+        async with self._lock:
+            rows = await asyncio.to_thread(
+                lambda: self._db.execute(
+                    "SELECT id, name, document, variables, method FROM outbox "
+                    "ORDER BY id LIMIT ?",
+                    (limit,),
+                ).fetchall()
+            )
+
+        return [OutboxEntry(r[0], r[1], r[2], json.loads(r[3]), r[4]) for r in rows]
+
+    async def remove(self, entry_id: int):
+        async with self._lock:
+            await asyncio.to_thread(self._delete, entry_id)
+            self.pending = max(0, self.pending - 1)
+
+    def _insert(self, name: str, document: str, variables: str, method: str) -> int:
+        cursor = self._db.execute(
+            "INSERT INTO outbox (name, document, variables, method, created) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (name, document, variables, method, time()),
+        )
+        self._db.commit()
+
+        return cursor.lastrowid
+
+    def _delete(self, entry_id: int):
+        self._db.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,305 @@
+# Standard modules
+import asyncio
+import logging
+import os
+from collections import Counter
+from contextlib import ExitStack
+from time import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Third party modules
+from nextcord.ext.commands import Bot
+from redis.asyncio import Redis
+
+# Internal modules
+import utility.request_handler as rh
+from utility import cache, last_seen
+from utility.idle_expiry import (
+    PURGE_KEY,
+    inactive_after,
+    inactive_key,
+    prune_after,
+    purge_entry,
+)
+from utility.moderation import moderation
+from utility.scripts import lua
+
+# Entries claimed and kicked per round. The kicks of a round run through utility.moderation.
+PURGE_BATCH = int(os.getenv("PURGE_BATCH", 100))
+# Longest sleep between checks, so deadlines added by another process are noticed in time.
+PURGE_POLL = float(os.getenv("PURGE_POLL", 60))
+# Seconds a claimed batch has to finish before another round may claim its entries again.
+PURGE_LEASE = int(os.getenv("PURGE_LEASE", 600))
+# Seconds before a kick Discord refused is tried again.
+PURGE_RETRY = int(os.getenv("PURGE_RETRY", 3600))
+# Members listed per page of /purge preview.
+PREVIEW_PAGE = int(os.getenv("PREVIEW_PAGE", 20))
+# Seconds later pages of /purge preview keep using the snapshot the first page was taken from.
+PREVIEW_TTL = int(os.getenv("PREVIEW_TTL", 600))
+
+
+class PurgeResult(NamedTuple):
+    kicked: int
+    # Already gone from the guild, or the bot no longer is in it.
+    gone: int
+    # Active again, or auto kick was turned off after the deadline was set.
+    skipped: int
+    # Rescheduled PURGE_RETRY seconds later.
+    failed: int
+
+
+class PurgePreview(NamedTuple):
+    members: int
+    # Members with no activity in guild:{id}:last_seen, which the purge never picks.
+    untracked: int
+    inactive: int
+    # Marked inactive and idle past the threshold, the two checks the scheduler makes.
+    removable: int
+    # (member id, last seen, purge deadline) of removable members on the requested page, longest
+    # idle first.
+    page: List[Tuple[int, float, float]]
+
+
+def preview_key(guild_id: int) -> str:
+    return f"guild:{guild_id}:purge:preview"
+
+
+# Who the purge would remove if auto kick were on, decided the way PurgeScheduler does: members
+# of the inactive set whose last_seen is older than the inactivity threshold. They go at their
+# deadline in purge:deadlines, or prune_after from now for those auto kick has not scheduled
+# yet. The intersection is stored as a snapshot for PREVIEW_TTL seconds, so later pages page
+# through the same list while activity keeps arriving. Neither the backend nor Discord is asked.
+async def preview(
+    redis: Redis,
+    guild_id: int,
+    settings: Dict,
+    now: float,
+    page: int = 0,
+    per_page: int = PREVIEW_PAGE,
+    fresh: bool = True,
+) -> PurgePreview:
+    index = last_seen.key(guild_id)
+    snapshot = preview_key(guild_id)
+    idle = last_seen.cutoff(inactive_after(settings), now)
+
+    pipe = redis.pipeline(transaction=False)
+
+    if fresh or not await redis.exists(snapshot):
+        # Scored by last seen. The inactive set only filters, with a weight of 0.
+        pipe.zinterstore(snapshot, {index: 1, inactive_key(guild_id): 0})
+        pipe.expire(snapshot, PREVIEW_TTL)
+
+    pipe.scard(f"guild:{guild_id}:members")
+    pipe.zcard(index)
+    pipe.scard(inactive_key(guild_id))
+    pipe.zcount(snapshot, "-inf", idle)
+    pipe.zrangebyscore(
+        snapshot, "-inf", idle, start=page * per_page, num=per_page, withscores=True
+    )
+    members, tracked, inactive, removable, rows = (await pipe.execute())[-5:]
+    deadlines = []
+
+    if rows:
+        deadlines = await redis.zmscore(
+            PURGE_KEY, [purge_entry(guild_id, int(member_id)) for member_id, _ in rows]
+        )
+
+    unscheduled = now + prune_after(settings)
+
+    return PurgePreview(
+        members,
+        max(0, members - tracked),
+        inactive,
+        removable,
+        [
+            (int(member_id), ts, unscheduled if deadline is None else deadline)
+            for (member_id, ts), deadline in zip(rows, deadlines)
+        ],
+    )
+
+
+# Deadlines are set when a member is marked inactive, and only while auto kick is on. Switching
+# it on gives everyone already inactive a deadline auto_prune_timer days from now (an existing,
+# earlier one is kept), and switching it off drops them again. Returns the members changed.
+async def set_auto_kick(redis: Redis, guild_id: int, settings: Dict, enabled: bool) -> int:
+    deadline = time() + prune_after(settings)
+    changed = 0
+    batch: List[int] = []
+
+    async def flush():
+        nonlocal changed
+        entries = [purge_entry(guild_id, m) for m in batch]
+
+        if enabled:
+            changed += await redis.zadd(PURGE_KEY, dict.fromkeys(entries, deadline), nx=True)
+            await rh.add_many_to_purge_list(guild_id, batch)
+        else:
+            changed += await redis.zrem(PURGE_KEY, *entries)
+            await rh.remove_many_from_purge_list(batch)
+
+        batch.clear()
+
+    async for member_id in redis.sscan_iter(inactive_key(guild_id), count=PURGE_BATCH):
+        batch.append(int(member_id))
+
+        if len(batch) >= PURGE_BATCH:
+            await flush()
+
+    if batch:
+        await flush()
+
+    return changed
+
+
+# Sleeps until the earliest deadline in purge:deadlines, then leases what is due in batches of
+# PURGE_BATCH. Each batch costs one Redis round trip per step and one backend mutation, however
+# long the purge list is.
+class PurgeScheduler:
+    def __init__(self, redis: Redis, bot: Bot, batch: int = PURGE_BATCH):
+        self.redis: Redis = redis
+        self.bot: Bot = bot
+        self.batch: int = batch
+        self._claim_due = redis.register_script(lua("claim_due"))
+        self._release_claimed = redis.register_script(lua("release_claimed"))
+        self._wake: asyncio.Event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.removed: int = 0
+        self.failed: int = 0
+        self.batches: int = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    # For callers that just added a deadline earlier than the one being slept on.
+    def wake(self):
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_due()
+                delay = await self._next_delay()
+            except Exception:
+                logging.exception("Purge round failed.")
+                delay = PURGE_POLL
+
+            self._wake.clear()
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _next_delay(self) -> float:
+        head = await self.redis.zrange(PURGE_KEY, 0, 0, withscores=True)
+
+        if not head:
+            return PURGE_POLL
+
+        return min(PURGE_POLL, max(0.0, head[0][1] - time()))
+
+    async def run_due(self, now: Optional[float] = None) -> PurgeResult:
+        totals = PurgeResult(0, 0, 0, 0)
+
+        while True:
+            start = now or time()
+            lease = int(start) + PURGE_LEASE
+            due = await self._claim_due(keys=[PURGE_KEY], args=[start, self.batch, lease])
+
+            if not due:
+                break
+
+            result = await self._process(due, lease)
+            totals = PurgeResult(*(a + b for a, b in zip(totals, result)))
+            self.batches += 1
+
+            if len(due) < self.batch:
+                break
+
+        return totals
+
+    async def _process(self, due: List[str], lease: int) -> PurgeResult:
+        by_guild: Dict[int, List[int]] = {}
+
+        for entry in due:
+            guild_id, member_id = entry.split(":")
+            by_guild.setdefault(int(guild_id), []).append(int(member_id))
+
+        # A member who came back between the deadline and now is still in the claim. Being in the
+        # inactive set is not enough on its own: the last_seen index has to agree that they have
+        # been idle past the threshold, so a writer that missed reactivating them cannot cause a
+        # kick.
+        pipe = self.redis.pipeline(transaction=False)
+
+        for guild_id, member_ids in by_guild.items():
+            pipe.smismember(inactive_key(guild_id), member_ids)
+            pipe.zmscore(last_seen.key(guild_id), member_ids)
+
+        replies = await pipe.execute()
+        now = time()
+        targets: List[Tuple[int, int]] = []
+        skipped: List[int] = []
+
+        for i, (guild_id, member_ids) in enumerate(by_guild.items()):
+            settings = await cache.guild_settings(self.redis, guild_id)
+            idle_since = now - inactive_after(settings)
+            inactive, seen = replies[2 * i], replies[2 * i + 1]
+
+            for member_id, flagged, ts in zip(member_ids, inactive, seen):
+                if settings.get("auto_kick") and flagged and ts is not None and ts < idle_since:
+                    targets.append((guild_id, member_id))
+                else:
+                    skipped.append(member_id)
+
+        with ExitStack() as backlogs:
+            for guild_id, size in Counter(g for g, _ in targets).items():
+                backlogs.enter_context(moderation.backlog(guild_id, size))
+
+            outcomes = await asyncio.gather(*(self._kick(g, m) for g, m in targets))
+        removed = [t for t, outcome in zip(targets, outcomes) if outcome is not None]
+        failed = [t for t, outcome in zip(targets, outcomes) if outcome is None]
+
+        pipe = self.redis.pipeline(transaction=False)
+
+        for guild_id, member_id in removed:
+            pipe.srem(f"guild:{guild_id}:members", member_id)
+            pipe.srem(inactive_key(guild_id), member_id)
+            pipe.delete(f"guild:{guild_id}:member:{member_id}")
+            pipe.zrem(last_seen.key(guild_id), member_id)
+
+        if failed:
+            retry_at = time() + PURGE_RETRY
+            pipe.zadd(PURGE_KEY, {purge_entry(g, m): retry_at for g, m in failed})
+
+        # Only now are the entries handled; until here a crash leaves them leased, not lost.
+        await self._release_claimed(keys=[PURGE_KEY], args=[lease, *due], client=pipe)
+        await pipe.execute()
+        # Skipped entries go too, or the next full purge list would still hold them.
+        await rh.remove_many_from_purge_list([m for _, m in removed] + skipped)
+
+        self.removed += len(removed)
+        self.failed += len(failed)
+        kicked = sum(1 for outcome in outcomes if outcome)
+
+        return PurgeResult(kicked, len(removed) - kicked, len(skipped), len(failed))
+
+    # True once kicked, False when the member or guild is already gone, None when Discord
+    # refused and the kick should be retried.
+    async def _kick(self, guild_id: int, member_id: int) -> Optional[bool]:
+        if self.bot.get_guild(guild_id) is None:
+            return False
+
+        try:
+            return await moderation.kick(guild_id, member_id)
+        except Exception:
+            logging.exception(f"Could not kick member {member_id} of guild {guild_id}.")
+            return None
+
+    def stats(self) -> Dict[str, int]:
+        return {"removed": self.removed, "failed": self.failed, "batches": self.batches}
@@ -1,33 +1,54 @@
 # Standard modules
 import os
+from typing import Dict
 
 # Third party modules
 from dotenv import load_dotenv
-from redis import Redis
-from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.asyncio import BlockingConnectionPool, Redis
 
 load_dotenv()
 
 R_HOST = os.getenv("REDIS_HOST", "localhost")
 R_PORT = os.getenv("REDIS_PORT", 6379)
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", 20))
+# Seconds a command waits for a free connection before failing.
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 5))
 
 
-def create_redis_connection():
-    try:
-        r = Redis(
-            host=R_HOST,
-            port=R_PORT,
-            decode_responses=True,
-            socket_connect_timeout=5,
-            socket_timeout=5,
-            retry_on_timeout=True,
-            health_check_interval=30,
-        )
-
-        r.ping()
-
-        return r
-    except RedisConnectionError:
-        raise
-    except Exception:
-        raise
+# Every caller shares the returned client and its pool of at most REDIS_POOL_SIZE connections.
+# When all of them are busy, commands queue for one instead of opening more. Connections idle
+# for longer than health_check_interval are pinged before reuse. Nothing connects until the
+# first command, so this is safe to call at import time.
+def create_redis_connection(decode_responses: bool = True) -> Redis:
+    pool = BlockingConnectionPool(
+        host=R_HOST,
+        port=R_PORT,
+        max_connections=REDIS_POOL_SIZE,
+        timeout=REDIS_POOL_TIMEOUT,
+        decode_responses=decode_responses,
+        socket_connect_timeout=5,
+        socket_timeout=5,
+        retry_on_timeout=True,
+        health_check_interval=30,
+    )
+
+    return Redis.from_pool(pool)
+
+
+# Created here rather than in main.py, which runs as __main__ and would be imported a second
+# time as main by the cogs, creating a second pair of pools.
+redis = create_redis_connection()
+# For binary values, such as the packed idle windows, which the decoding client cannot read.
+redis_raw = create_redis_connection(decode_responses=False)
+
+
+def pool_stats(redis: Redis) -> Dict[str, int]:
+    pool = redis.connection_pool
+    in_use = len(pool._in_use_connections)
+
+    return {
+        "in_use": in_use,
+        "idle": len(pool._available_connections),
+        "max": pool.max_connections,
+        "utilisation_pct": round(100 * in_use / pool.max_connections),
+    }
@@ -1,581 +1,261 @@
 # Standard modules
 import logging
-import traceback
-from time import perf_counter, perf_counter_ns
-from typing import Dict, List, TypedDict
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 # Third-party modules
-import requests
 from nextcord import Member
-from requests import Response
 
-from lib.typings import Member as GQLMember, DiscordGuild
+# Internal modules
+from lib import operations as ops
+from lib.typings import DiscordGuild, Member as GQLMember
+from utility.client import GQLResponse, client
+from utility.resilience import BackendError, MutationDeferred
 
-api_url_dev = "http://localhost:8000/gql"
-api_base_url_prod = "https://combot.bblankenship.me/v1/"
+PAGE_SIZE = 100
 
+# Latency, payload size, status and error counts for every call here are recorded per operation
+# by the client (see utility.metrics), so these functions only build variables and unpack results.
 
-class Query(TypedDict):
-    query: str
-    variables: Dict
 
+async def get_purge_list():
+    return await client.execute(ops.PURGE_LIST)
 
-headers = {"Content-Type": "application/json"}
 
+async def remove_from_purge_list(member_id: int):
+    response: GQLResponse = await client.execute(
+        ops.DELETE_PURGE_LIST_ENTRY, {"memberId": member_id}
+    )
+
+    if response.status != 200:
+        raise BackendError(
+            f"Failed to remove member {member_id} from purge list.", response.status
+        )
+
+
+async def remove_many_from_purge_list(member_ids: List[int]):
+    if not member_ids:
+        return
+
+    try:
+        response: GQLResponse = await client.execute(
+            ops.DELETE_PURGE_LIST_ENTRIES, {"memberIds": member_ids}
+        )
+    except MutationDeferred:
+        logging.warning(
+            f"Backend unavailable. Removal of {len(member_ids)} purge list entries queued for "
+            "replay."
+        )
+
+        return
 
-def get_purge_list():
-    func_start: float = perf_counter()
-    payload: Query = {
-        "query": """
-            query PurgeList {
-                code
-                success
-                message
-                errors
-                list {
-                    guildId
-                    members {
-                        memberId
-                    }
-                }
-            }
-        """
-    }
-    logging.info("Fetching purge list...")
+    if response.status != 200:
+        raise BackendError(
+            f"Failed to remove {len(member_ids)} members from purge list.", response.status
+        )
 
-    response: Response = requests.post(api_url_dev, headers=headers, json=payload)
-    func_end: float = perf_counter()
-    time_to_complete: float = func_end - func_start
 
-    logging.info("Purge list retrieved.")
-    logging.info(
-        f"Operation completed in {time_to_complete} seconds.\n-------------------------"
+async def add_to_purge_list(guild_id: int, member_id: int):
+    return await client.execute(
+        ops.ADD_TO_PURGE_LIST, {"memberId": member_id, "guildId": guild_id}
     )
 
-    return response
 
+async def add_many_to_purge_list(guild_id: int, member_ids: List[int]):
+    if not member_ids:
+        return
 
-def remove_from_purge_list(member_id: int):
-    func_start: float = perf_counter()
-    payload: Query = {
-        "query": """
-            mutation DeletePurgeListEntry($memberId: Snowflake!) {
-                deletePurgeListEntry(memberId: $memberId) {
-                    code
-                    success
-                    errors
-                }
-            }
-        """
-    }
+    try:
+        response: GQLResponse = await client.execute(
+            ops.ADD_PURGE_LIST_ENTRIES, {"guildId": guild_id, "memberIds": member_ids}
+        )
+    except MutationDeferred:
+        logging.warning(
+            f"Backend unavailable. {len(member_ids)} purge list entries for guild {guild_id} "
+            "queued for replay."
+        )
 
-    logging.info(f"Removing member {member_id} from purge list...")
+        return
 
-    response: Response = requests.post(api_url_dev, headers=headers, json=payload)
-    func_end: float = perf_counter()
-    time_to_complete: float = func_end - func_start
+    if response.status != 200:
+        raise BackendError(
+            f"Failed to add {len(member_ids)} members of guild {guild_id} to purge list.",
+            response.status,
+        )
 
-    logging.info(
-        f"Operation finished in {time_to_complete} seconds.\n-------------------------"
-    )
 
-    if response.status_code == 200:
-        pass
-    else:
-        raise
-
-
-def add_to_purge_list(guild_id: int, member_id: int):
-    func_start: float = perf_counter()
-    payload: Query = {
-        "query": """
-            mutation AddToPurgeList($memberId: Snowflake!, $guildId: Snowflake!) {
-                addToPurgeList(memberId: $memberId, guildId: $guildId) {
-                    code
-                    success
-                    errors
-                }
-            }
-        """,
-        "variables": {"memberId": member_id, "guildId": guild_id},
-    }
-
-    logging.info("Adding new purge entry.")
-
-    response: Response = requests.post(api_url_dev, headers=headers, json=payload)
-    func_end: float = perf_counter()
-    time_to_complete: float = func_end - func_start
-
-    logging.info(
-        f"Operation finished in {time_to_complete} seconds.\n-------------------------"
-    )
+async def guild(guild_id: int) -> DiscordGuild:
+    response: GQLResponse = await client.execute(ops.GUILD, {"guildId": guild_id})
+
+    return response.body["data"]["guild"]["guild"]
+
+
+# Narrow lookups for command paths that only need a guild's settings or status.
+async def guild_settings(guild_id: int) -> Dict:
+    response: GQLResponse = await client.execute(ops.GUILD_SETTINGS, {"guildId": guild_id})
+
+    return response.body["data"]["guild"]["guild"]["guild"]["settings"]
 
-    return response
-
-
-def guild(guild_id: int) -> DiscordGuild:
-    func_start = perf_counter()
-
-    payload: Query = {
-        "query": """
-                query Guild($guild_id: Snowflake!) {
-                    guild {
-                        guild(guild_id: $snowflake) {
-                            code
-                            success
-                            created
-                            errors
-                            guild {
-                                guildId
-                                lastAct {
-                                    ch
-                                    type
-                                    ts
-                                }
-                                idleStats {
-                                    timesIdle
-                                    prevAvgs
-                                }
-                                status
-                                settings
-                                members {
-                                   memberId
-                                   adminAccess
-                                   status
-                                   flags
-                                   lastAct {
-                                        ch
-                                        type
-                                        ts
-                                    }
-                                    idleStats {
-                                        timesIdle
-                                        prevAvgs
-                                    }
-                                   dateAdded
-                                }
-                                dateAdded
-                            }
-                        }
-                    }
-                }
-            """,
-        "variables": {"guild_id": guild_id},
-    }
-
-    response: Response = requests.post(api_url_dev, headers=headers, json=payload)
-
-    logging.info("Guild query complete.")
-
-    func_end = perf_counter()
-    time_to_complete = func_end - func_start
-
-    logging.info(
-        f"Operation finished in {time_to_complete} seconds.\n-------------------------"
-    )
 
-    return response.json()["data"]["guild"]["guild"]
+async def guild_status(guild_id: int) -> Dict:
+    response: GQLResponse = await client.execute(ops.GUILD_STATUS, {"guildId": guild_id})
+
+    return response.body["data"]["guild"]["guild"]["guild"]
 
 
 # Will get a specified guild or all guilds if no id is specified.
-def get_guilds() -> list[DiscordGuild]:
-    func_start = perf_counter()
-    payload: Query = {
-        "query": """
-            query Guilds {
-                guild {
-                    guilds {
-                        code
-                        success
-                        errors
-                        guilds {
-                            guildId
-                            lastAct {
-                                ch
-                                type
-                                ts
-                            }
-                            idleStats {
-                                timesIdle
-                                prevAvgs
-                            }
-                            status
-                            settings
-                            members {
-                                memberId
-                                adminAccess
-                                status
-                                flags
-                                lastAct {
-                                    ch
-                                    type
-                                    ts
-                                }
-                                idleStats {
-                                    timesIdle
-                                    prevAvgs
-                                }
-                                dateAdded
-                            }
-                            dateAdded
-                        }
-                    }
-                }
-            }
-        """
-    }
-    logging.info("Initiating guild query...")
-
-    response: Response = requests.post(api_url_dev, headers=headers, json=payload)
-    func_end = perf_counter()
-    time_to_complete = func_end - func_start
-
-    logging.info("Guild query complete.")
-    logging.info(
-        f"Operation finished in {time_to_complete} seconds.\n-------------------------"
-    )
+async def get_guilds() -> list[DiscordGuild]:
+    response: GQLResponse = await client.execute(ops.GUILDS)
+
+    return response.body["data"]["guild"]["guilds"]
+
+
+# Streams every guild (without members) one page at a time.
+async def iter_guilds(page_size: int = PAGE_SIZE) -> AsyncIterator[DiscordGuild]:
+    async for guild in _paginate(
+        ops.GUILDS_PAGE, {}, "data.guild.guildsPage", "guilds", page_size
+    ):
+        yield guild
+
+
+# Streams every member, or only those of guild_id, one page at a time.
+async def iter_members(
+    guild_id: Optional[int] = None, page_size: int = PAGE_SIZE
+) -> AsyncIterator[GQLMember]:
+    async for member in _paginate(
+        ops.MEMBERS_PAGE, {"guildId": guild_id}, "data.member.membersPage", "members", page_size
+    ):
+        yield member
 
-    return response.json()["data"]["guild"]["guilds"]
 
+async def _paginate(
+    operation: ops.Operation, variables: Dict, root: str, field: str, page_size: int
+) -> AsyncIterator[Any]:
+    cursor: Optional[str] = None
+    pages: int = 0
 
-def reset_guild(guild_id: int):
+    while True:
+        page_info: Dict[str, Any] = {
+            f"{root}.pageInfo.endCursor": None,
+            f"{root}.pageInfo.hasNextPage": False,
+        }
+
+        async for item in client.stream(
+            operation,
+            {**variables, "first": page_size, "after": cursor},
+            f"{root}.{field}",
+            page_info,
+        ):
+            yield item
+
+        pages += 1
+        cursor = page_info[f"{root}.pageInfo.endCursor"]
+
+        if not page_info[f"{root}.pageInfo.hasNextPage"] or cursor is None:
+            logging.info(f"{operation.name} finished after {pages} pages.")
+            break
+
+
+async def reset_guild(guild_id: int):
     logging.info(f"Resetting guild data for guild {guild_id}.")
 
 
-def get_members() -> GQLMember:
-    func_start: float = perf_counter()
-
-    payload: Query = {
-        "query": """
-            query Members {
-                member {
-                    member {
-                        code
-                        success
-                        errors
-                        members {
-                            memberId
-                            adminAccess
-                            status
-                            flags
-                            lastAct {
-                                ch
-                                type
-                                ts
-                            }
-                            idleStats {
-                                timesIdle
-                                prevAvgs
-                            }
-                            dateAdded
-                        }
-                    }
-                }
-            }
-        """
-    }
-
-    logging.info("Initiating member query...")
-
-    response: Response = requests.post(api_url_dev, headers=headers, json=payload)
-    func_end: float = perf_counter()
-    time_to_complete: float = func_end - func_start
-
-    logging.info("Query complete.")
-    logging.info(
-        f"Operation finished in {time_to_complete} seconds.\n-------------------------"
+async def get_members() -> GQLMember:
+    response: GQLResponse = await client.execute(ops.MEMBERS)
+
+    return response.body["data"]["member"]["members"]
+
+
+async def member(guild_id: int, member: Member) -> GQLMember:
+    response: GQLResponse = await client.execute(
+        ops.MEMBER, {"guildId": guild_id, "memberId": member.id}
     )
 
-    return response.json()["data"]["member"]["member"]
-
-
-def member(guild_id: int, member: Member) -> GQLMember:
-    logging.info("Attempting to fetch a member...")
-
-    func_start: float = perf_counter()
-
-    payload: Query = {
-        "query": """
-            query GetMember($guildId: Snowflake!, $memberId: Snowflake!) {
-                member {
-                    member(guildId: $guildId, memberId: $memberId) {
-                        code
-                        success
-                        created
-                        errors
-                        member {
-                            memberId
-                            adminAccess
-                            status
-                            flags
-                            lastAct {
-                                ch
-                                type
-                                ts
-                            }
-                            idleStats {
-                                timesIdle
-                                prevAvgs
-                            }
-                            dateAdded
-                        }
-                    }
-                }
-            }
-        """,
-        "variables": {
-            "guildId": guild_id,
-            "memberId": member.id,
-        },
-    }
-
-    response: Response = requests.post(api_url_dev, headers=headers, json=payload)
-
-    func_end: float = perf_counter()
-    time_to_complete = func_end - func_start
-
-    logging.info("Query complete.")
-    logging.info(
-        f"Operation finished in {time_to_complete} seconds.\n-------------------------"
+    return response.body["data"]["member"]["member"]
+
+
+async def members(guild_id: int, member_ids: List[int]) -> List[GQLMember]:
+    response: GQLResponse = await client.execute(
+        ops.MEMBERS_BY_ID, {"guildId": guild_id, "ids": member_ids}
     )
 
-    return response.json()["data"]["member"]["member"]
-
-
-def update_guild(guild_id: int, **data) -> DiscordGuild:
-    logging.info("Updating guild...")
-    func_start: float = perf_counter()
-
-    payload: Query = {
-        "query": """
-            mutation UpdateGuild (
-                $guildId: Snowflake!,
-                $input: GuildUpdate
-            ) {
-                guild {
-                    updateGuild (
-                        guildId: $guildId,
-                        input: $input
-                    ) {
-                        guild {
-                            guildId
-                            lastAct {
-                                ch
-                                type
-                                ts
-                            }
-                            idleStats {
-                                timesIdle
-                                prevAvgs
-                            }
-                            status
-                            settings
-                            dateAdded
-                        }
-                    }
-                }
-            }
-        """,
-        "variables": {"guildId": guild_id, "input": {k: v for k, v in data}},
-    }
-
-    logging.info("Building payload...")
-
-    item_list: List[str] = list(data.keys())
-    loop_times: List[float] = []
-
-    for k, v in data.items():
-        loop_start: float = perf_counter_ns() / 1000
-        payload["variables"][k] = v
-        percentage_complete: int = int((item_list.index(k) + 1) / len(item_list) * 100)
-        loop_end: float = perf_counter_ns() / 1000
-        time_to_complete: float = loop_end - loop_start
-        loop_times.append(time_to_complete)
-
-        logging.info(
-            f"Payload {percentage_complete}% complete. {time_to_complete} microseconds."
+    return response.body["data"]["member"]["members"]["members"] or []
+
+
+# Creates or updates a chunk of members with one mutation and returns their stored records, or
+# None if the backend is down and the upsert was queued for replay.
+async def upsert_members(guild_id: int, members: List[Dict]) -> Optional[List[GQLMember]]:
+    try:
+        response: GQLResponse = await client.execute(
+            ops.UPSERT_MEMBERS, {"guildId": guild_id, "members": members}
+        )
+    except MutationDeferred:
+        logging.warning(
+            f"Backend unavailable. Upsert of {len(members)} members in guild {guild_id} queued "
+            "for replay."
         )
 
-        if percentage_complete == 100:
-            logging.info("Payload complete.")
-            logging.info(f"Items to be patched:\n{payload['variables']}\n")
-            logging.info(f"Operation finished in {sum(loop_times)} microseconds.")
+        return None
 
-    logging.info("Patching...")
+    if response.status != 200:
+        raise BackendError(f"Failed to upsert members of guild {guild_id}.", response.status)
 
-    guild: Response = requests.patch(api_url_dev, headers=headers, json=payload)
+    return response.body["data"]["member"]["upsertMembers"]["members"] or []
 
-    if guild.status_code != 200:
-        func_end = perf_counter()
-        time_to_complete = func_end - func_start
-        logging.error("Patching guild failed.")
-        logging.info(
-            f"Operation finished in {time_to_complete} seconds.\n-------------------------"
+
+async def update_guild(guild_id: int, **data) -> DiscordGuild:
+    try:
+        guild: GQLResponse = await client.execute(
+            ops.UPDATE_GUILD, {"guildId": guild_id, "input": data}, "PATCH"
         )
+    except MutationDeferred:
+        logging.warning(f"Backend unavailable. Update to guild {guild_id} queued for replay.")
 
-        return guild.status_code
+        return None
 
-    func_end: float = perf_counter()
-    time_to_complete: float = func_end - func_start
+    if guild.status != 200:
+        logging.error("Patching guild failed.")
 
-    logging.info(
-        f"Operation finished in {time_to_complete} seconds.\n-------------------------"
-    )
+        return guild.status
 
-    return guild.json()["data"]["guild"]["guild"]
+    return guild.body["data"]["guild"]["updateGuild"]
 
 
 # data - Received as 'nickname', 'last_activity', etc
-def update_member(guild_id: int, member_id: int, **data) -> GQLMember:
-    func_start: float = perf_counter()
-
-    payload: Query = {
-        "query": """
-            mutation UpdateMember(
-                $memberId: Snowflake!,
-                $guildId: Snowflake!,
-                $input: MemberUpdate
-            ) {
-                member {
-                    updateMember(
-                        memberId: $memberId,
-                        guildId: $guildId,
-                        input: $input
-                    ) {
-                        code
-                        success
-                        errors
-                        member {
-                            snowflake
-                            name
-                            lastAct {
-                                ch
-                                type
-                                ts
-                            }
-                            idleStats {
-                                timesIdle
-                                avgIdleTime
-                                prevAvgs
-                            }
-                        status
-                        dateAdded
-                    }
-                }
-            }
-        """,
-        "variables": {
-            "guild_id": guild_id,
-            "memberId": member_id,
-            "input": {k: v for k, v in data},
-        },
-    }
-
-    # Need to DRY this up some.
-    item_list: List[str] = list(data.keys())
-    loop_times: List[float] = []
-
-    for k, v in data.items():
-        loop_start: float = perf_counter_ns() / 1000
-
-        payload["variables"][k] = v
-
-        percentage_complete: int = int((item_list.index(k) + 1) / len(item_list) * 100)
-        loop_end: float = perf_counter_ns() / 1000
-        time_to_complete: float = loop_end - loop_start
-        loop_times.append(time_to_complete)
-        logging.info(
-            f"Payload {percentage_complete}% complete. {time_to_complete} microseconds."
+async def update_member(guild_id: int, member_id: int, **data) -> GQLMember:
+    try:
+        member: GQLResponse = await client.execute(
+            ops.UPDATE_MEMBER,
+            {"guildId": guild_id, "memberId": member_id, "input": data},
+            "PATCH",
         )
+    except MutationDeferred:
+        logging.warning(f"Backend unavailable. Update to member {member_id} queued for replay.")
 
-        if percentage_complete == 100:
-            logging.info("Payload complete.")
-            logging.info(f"Items to be patched:\n{payload['variables']}\n")
-            logging.info(f"Operation finished in {sum(loop_times)} microseconds.")
-
-    logging.info("Patching member...")
+        return None
 
-    member: Response = requests.patch(api_url_dev, headers=headers, json=payload)
-
-    if member.status_code != 200:
+    if member.status != 200:
         logging.info("Unable to patch member.")
 
-        return member.status_code
+        return member.status
 
-    func_end: float = perf_counter()
-    time_to_complete: float = func_end - func_start
+    return member.body["data"]["member"]["updateMember"]
 
-    logging.info("Member successfully patched.")
-    logging.info(
-        f"Operation finished in {time_to_complete} seconds.\n-------------------------"
-    )
 
-    return member.json()["data"]["member"]["member"]
-
-
-def remove_guild(guild_id: int):
-    func_start: float = perf_counter()
-    payload: Query = {
-        "query": """
-            mutation DeleteGuild ($guildId: Snowflake!) {
-                deleteGuild (guildId: $guildId) {
-                    guild {
-                        code
-                        success
-                        errors
-                    }
-                }
-            }
-        """,
-        "variables": {"guildId": guild_id},
-    }
-
-    guild: Response = requests.delete(api_url_dev, headers=headers, json=payload)
-    func_end: float = perf_counter()
-    time_to_complete: float = func_end - func_start
-
-    if guild.json()["data"]["guild"]["code"] == 200:
+async def remove_guild(guild_id: int):
+    guild: GQLResponse = await client.execute(ops.DELETE_GUILD, {"guildId": guild_id}, "DELETE")
+
+    if guild.body["data"]["guild"]["deleteGuild"]["code"] == 200:
         logging.info("Guild removed.")
-        logging.info(
-            f"Operation finished in {time_to_complete} seconds.\n-------------------------"
-        )
     else:
-        logging.debug(f"Failed to remove guild.\n\n{traceback.format_exc()}")
-        logging.info(
-            f"Operation finished in {time_to_complete} seconds.\n-------------------------"
-        )
+        logging.error(f"Failed to remove guild {guild_id}.")
 
 
-def remove_member(member_id: int):
-    logging.info(f"Removing member {member_id}.")
-    func_start: float = perf_counter()
-
-    payload: Query = {
-        "query": """
-            mutation DeleteMember ($memberId: Snowflake!) {
-                deleteMember (memberId: $memberId) {
-                    member {
-                        code
-                        success
-                        errors
-                    }
-                }
-            }
-        """,
-        "variables": {"memberId": member_id},
-    }
-
-    member: Response = requests.delete(api_url_dev, headers=headers, json=payload)
-    func_end: float = perf_counter()
-    time_to_complete: float = func_end - func_start
-
-    if member.json()["data"]["member"]["code"] == 200:
-        logging.info("Member removed.")
-        logging.info(
-            f"Operation finished in {time_to_complete} seconds.\n-------------------------"
-        )
+async def remove_member(member_id: int):
+    member: GQLResponse = await client.execute(
+        ops.DELETE_MEMBER, {"memberId": member_id}, "DELETE"
+    )
+
+    if member.body["data"]["member"]["deleteMember"]["code"] == 200:
+        logging.info(f"Member {member_id} removed.")
     else:
-        logging.debug(f"Failed to remove member.\n\n{traceback.format_exc()}")
-        logging.info(
-            f"Operation finished in {time_to_complete} seconds.\n-------------------------"
-        )
+        logging.error(f"Failed to remove member {member_id}.")
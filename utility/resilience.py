@@ -0,0 +1,139 @@
+# Standard modules
+import logging
+import os
+import random
+from time import monotonic
+from typing import Optional
+
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", 3))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 0.2))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 5))
+# Each request earns RETRY_BUDGET_RATIO of a retry, on top of RETRY_BUDGET_MIN_RATE retries per
+# second, so retries can never exceed a fixed share of traffic during an outage.
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", 0.2))
+RETRY_BUDGET_MIN_RATE = float(os.getenv("RETRY_BUDGET_MIN_RATE", 1))
+RETRY_BUDGET_CAPACITY = float(os.getenv("RETRY_BUDGET_CAPACITY", 20))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", 30))
+
+
+class BackendError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status: Optional[int] = status
+
+
+class CircuitOpenError(BackendError):
+    pass
+
+
+# Raised for a mutation that could not be delivered and was written to the outbox instead. It
+# will be replayed once the backend recovers.
+class MutationDeferred(BackendError):
+    pass
+
+
+def backoff(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    # Full jitter, so retries from many callers don't arrive in lockstep.
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class RetryBudget:
+    def __init__(
+        self,
+        ratio: float = RETRY_BUDGET_RATIO,
+        min_rate: float = RETRY_BUDGET_MIN_RATE,
+        capacity: float = RETRY_BUDGET_CAPACITY,
+    ):
+        self.ratio: float = ratio
+        self.min_rate: float = min_rate
+        self.capacity: float = capacity
+        self.tokens: float = capacity
+        self.exhausted: int = 0
+        self._last_refill: float = monotonic()
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.min_rate)
+        self._last_refill = now
+
+    def deposit(self):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        self._refill()
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+
+        self.exhausted += 1
+
+        return False
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+    ):
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self.state: str = self.CLOSED
+        self.failures: int = 0
+        self.opened_at: float = 0.0
+        self._trial_in_flight: bool = False
+
+    @property
+    def retry_at(self) -> float:
+        return self.opened_at + self.reset_timeout
+
+    # While open every call fails fast. Once reset_timeout has passed a single trial call is let
+    # through, and its outcome decides whether the breaker closes or opens again.
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.OPEN and monotonic() >= self.retry_at:
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+
+        return False
+
+    # Called by the trial call once it ends, however it ends. A trial that was cancelled or raised
+    # before recording an outcome would otherwise keep the breaker half open for good.
+    def release(self):
+        if self.state == self.HALF_OPEN:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logging.info("Backend recovered. Circuit closed.")
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logging.warning(
+                    f"Circuit opened after {self.failures} failures. "
+                    f"Failing fast for {self.reset_timeout} seconds."
+                )
+
+            self.state = self.OPEN
+            self.opened_at = monotonic()
+            self._trial_in_flight = False
@@ -0,0 +1,167 @@
+# Standard modules
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+# Third party modules
+from nextcord import Guild, Role
+from nextcord.ext.commands import Bot
+from nextcord.utils import get
+from redis.asyncio import Redis
+
+# Internal modules
+from utility import cache
+from utility.idle_expiry import CHANGED_KEY, inactive_key
+from utility.moderation import moderation
+
+# Name of the role given to inactive members, unless the guild settings name a role id.
+INACTIVE_ROLE = os.getenv("INACTIVE_ROLE", "Inactive")
+# Role changes submitted at once per guild.
+ROLE_BATCH = int(os.getenv("ROLE_BATCH", 50))
+# Guilds visited per pass.
+ROLE_GUILDS = int(os.getenv("ROLE_GUILDS", 100))
+# Longest sleep between passes, so changes made by another process are picked up.
+ROLE_POLL = float(os.getenv("ROLE_POLL", 30))
+
+
+# Members who have the inactive role, as far as the bot knows. Diffed against
+# guild:{id}:inactive, the members who should have it.
+def has_role_key(guild_id: int) -> str:
+    return f"guild:{guild_id}:inactive:role"
+
+
+def inactive_role(guild: Guild, settings: Dict) -> Optional[Role]:
+    role_id = settings.get("inactive_role")
+
+    return guild.get_role(int(role_id)) if role_id else get(guild.roles, name=INACTIVE_ROLE)
+
+
+# Keeps the inactive role in line with guild:{id}:inactive. Only guilds listed in
+# inactive:changed are visited, and for those SDIFF in both directions yields the members to
+# change, so a pass costs the size of the change rather than the size of the guild.
+class RoleReconciler:
+    def __init__(self, redis: Redis, bot: Bot, batch: int = ROLE_BATCH):
+        self.redis: Redis = redis
+        self.bot: Bot = bot
+        self.batch: int = batch
+        self._wake: asyncio.Event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.added: int = 0
+        self.removed: int = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def wake(self):
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+
+            try:
+                guild_ids = await self.redis.spop(CHANGED_KEY, ROLE_GUILDS)
+
+                for guild_id in guild_ids:
+                    try:
+                        await self.reconcile(int(guild_id))
+                    except Exception:
+                        logging.exception("Could not reconcile the inactive role of %s.", guild_id)
+                        await self.redis.sadd(CHANGED_KEY, guild_id)
+
+                if len(guild_ids) == ROLE_GUILDS:
+                    self._wake.set()
+            except Exception:
+                logging.exception("Inactive role pass failed.")
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), ROLE_POLL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def reconcile(self, guild_id: int) -> Tuple[int, int]:
+        guild = self.bot.get_guild(guild_id)
+
+        if guild is None:
+            return 0, 0
+
+        role = inactive_role(guild, await cache.guild_settings(self.redis, guild_id))
+
+        if role is None:
+            return 0, 0
+
+        await self._seed(guild, role)
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.sdiff(inactive_key(guild_id), has_role_key(guild_id))
+        pipe.sdiff(has_role_key(guild_id), inactive_key(guild_id))
+        grant, revoke = await pipe.execute()
+
+        with moderation.backlog(guild_id, len(grant) + len(revoke)):
+            added = await self._apply(guild_id, role.id, [int(m) for m in grant], True)
+            removed = await self._apply(guild_id, role.id, [int(m) for m in revoke], False)
+
+        # SPOP took the guild off inactive:changed before anything was applied. Whatever is still
+        # unsettled puts it back, so a later pass retries it.
+        if added + removed < len(grant) + len(revoke):
+            await self.redis.sadd(CHANGED_KEY, guild_id)
+
+        return added, removed
+
+    # The set is built once per role from the members Discord says have it, so roles given by
+    # hand before the bot tracked them are not applied twice.
+    async def _seed(self, guild: Guild, role: Role):
+        if (await cache.guild_meta(self.redis, guild.id)).get("inactive_role") == str(role.id):
+            return
+
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.delete(has_role_key(guild.id))
+
+        if role.members:
+            pipe.sadd(has_role_key(guild.id), *(m.id for m in role.members))
+
+        pipe.hset(f"guild:{guild.id}:meta", "inactive_role", role.id)
+        await pipe.execute()
+        await cache.invalidate(self.redis, "meta", guild.id)
+
+    async def _apply(self, guild_id: int, role_id: int, member_ids: List[int], grant: bool) -> int:
+        changed = 0
+
+        for i in range(0, len(member_ids), self.batch):
+            chunk = member_ids[i : i + self.batch]
+            submit = moderation.add_role if grant else moderation.remove_role
+            outcomes = await asyncio.gather(
+                *(submit(guild_id, m, role_id) for m in chunk), return_exceptions=True
+            )
+
+            # False means the member left, which settles the difference as well. Whatever
+            # Discord refused stays in the difference and is retried on the guild's next pass.
+            settled = [m for m, outcome in zip(chunk, outcomes) if outcome in (True, False)]
+
+            if settled and grant:
+                await self.redis.sadd(has_role_key(guild_id), *settled)
+            elif settled:
+                await self.redis.srem(has_role_key(guild_id), *settled)
+
+            changed += len(settled)
+
+        if grant:
+            self.added += changed
+        else:
+            self.removed += changed
+
+        return changed
+
+    # Keeps the set current when the role is given or taken outside the bot.
+    async def role_changed(self, guild_id: int, member_id: int, has_role: bool):
+        if has_role:
+            await self.redis.sadd(has_role_key(guild_id), member_id)
+        else:
+            await self.redis.srem(has_role_key(guild_id), member_id)
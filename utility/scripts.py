@@ -0,0 +1,12 @@
+# Standard modules
+from functools import lru_cache
+from pathlib import Path
+
+LUA_DIR = Path(__file__).parent / "lua"
+
+
+# Lua sources are read once. redis-py's register_script() then runs them with EVALSHA and only
+# falls back to sending the source when the server has not cached it yet.
+@lru_cache(maxsize=None)
+def lua(name: str) -> str:
+    return (LUA_DIR / f"{name}.lua").read_text()
@@ -0,0 +1,34 @@
+# Standard modules
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+# Concurrent callers asking for the same key share one in-flight call and its result. The key is
+# released as soon as the call finishes, so nothing is cached past that point. Callers receive the
+# same result object and must not mutate it.
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls: int = 0
+        self.collapsed: int = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        flight = self._inflight.get(key)
+
+        if flight is not None:
+            self.collapsed += 1
+        else:
+            flight = asyncio.ensure_future(fn())
+            self._inflight[key] = flight
+            flight.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shielded so one caller being cancelled does not cancel the call for everyone else.
+        return await asyncio.shield(flight)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._inflight),
+        }
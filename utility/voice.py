@@ -0,0 +1,218 @@
+# Standard modules
+import asyncio
+import logging
+import os
+from time import time
+from typing import Dict, List, Optional, Set, Tuple
+
+# Third party modules
+from redis.asyncio import Redis
+
+# Internal modules
+from utility.activity import ActivityAggregator
+
+VOICE_FLUSH_MS = int(os.getenv("VOICE_FLUSH_MS", 5000))
+# Epoch seconds of the last flush made while sessions were open. After a cold restart it is the
+# closest known time to when the previous run stopped watching them.
+HEARTBEAT_KEY = "voice:heartbeat"
+
+
+class VoiceSession:
+    __slots__ = ("channel_id", "start", "muted_since", "muted")
+
+    def __init__(
+        self, channel_id: int, start: float, muted_since: float = 0.0, muted: float = 0.0
+    ):
+        self.channel_id: int = channel_id
+        self.start: float = start
+        # When the current mute or deafen began, 0 while unmuted.
+        self.muted_since: float = muted_since
+        # Seconds spent muted earlier in this session.
+        self.muted: float = muted
+
+    def set_muted(self, muted: bool, ts: float):
+        if muted and not self.muted_since:
+            self.muted_since = ts
+        elif not muted and self.muted_since:
+            self.muted += max(0.0, ts - self.muted_since)
+            self.muted_since = 0.0
+
+    # (seconds, muted seconds) if the session ended at ts.
+    def totals(self, ts: float) -> Tuple[float, float]:
+        muted = self.muted + (max(0.0, ts - self.muted_since) if self.muted_since else 0.0)
+
+        return max(0.0, ts - self.start), muted
+
+    def encode(self) -> str:
+        return f"{self.channel_id}:{self.start!r}:{self.muted_since!r}:{self.muted!r}"
+
+    @classmethod
+    def decode(cls, raw: str) -> "VoiceSession":
+        channel_id, start, muted_since, muted = raw.split(":")
+
+        return cls(int(channel_id), float(start), float(muted_since), float(muted))
+
+
+# Tracks voice sessions in memory and writes them behind to Redis, like ActivityAggregator does
+# for messages, so a busy voice channel costs one pipeline per flush rather than a round trip per
+# state change.
+#
+#   guild:{id}:voice:sessions       member id -> open session, so a restart can pick them up
+#   guild:{id}:voice:minutes        member id -> minutes spent in voice
+#   guild:{id}:voice:muted_minutes  member id -> minutes of that spent muted or deafened
+#   guild:{id}:stats voice_minutes  guild total
+#   voice:heartbeat                 last flush while any session was open
+class VoiceTracker:
+    def __init__(
+        self, redis: Redis, activity: ActivityAggregator, interval_ms: int = VOICE_FLUSH_MS
+    ):
+        self.redis: Redis = redis
+        self.activity: ActivityAggregator = activity
+        self.interval: float = interval_ms / 1000
+        self.sessions: Dict[int, Dict[int, VoiceSession]] = {}
+        # When the gateway connection was lost, so sessions that ended while the bot was away are
+        # closed then rather than when it noticed.
+        self.disconnected_at: Optional[float] = None
+        self._dirty: Dict[int, Set[int]] = {}
+        # guild_id -> member_id -> [seconds, muted seconds] from closed sessions not yet flushed.
+        self._closed: Dict[int, Dict[int, List[float]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def update(
+        self,
+        guild_id: int,
+        member_id: int,
+        channel_id: Optional[int],
+        muted: bool,
+        ts: Optional[float] = None,
+        record: bool = True,
+    ):
+        ts = ts or time()
+        sessions = self.sessions.setdefault(guild_id, {})
+        session = sessions.get(member_id)
+        last_channel = channel_id or (session.channel_id if session else 0)
+
+        if session is not None and session.channel_id != channel_id:
+            self._close(guild_id, member_id, session, ts)
+            session = None
+
+        if channel_id is not None:
+            if session is None:
+                sessions[member_id] = VoiceSession(channel_id, ts, ts if muted else 0.0)
+                self._mark(guild_id, member_id)
+            elif bool(session.muted_since) != muted:
+                session.set_muted(muted, ts)
+                self._mark(guild_id, member_id)
+
+        if record:
+            self.activity.record(guild_id, member_id, last_channel, "voice", ts, guild=False)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _close(self, guild_id: int, member_id: int, session: VoiceSession, ts: float):
+        seconds, muted = session.totals(max(ts, session.start))
+        totals = self._closed.setdefault(guild_id, {}).setdefault(member_id, [0.0, 0.0])
+        totals[0] += seconds
+        totals[1] += muted
+        del self.sessions[guild_id][member_id]
+        self._mark(guild_id, member_id)
+
+    def _mark(self, guild_id: int, member_id: int):
+        self._dirty.setdefault(guild_id, set()).add(member_id)
+
+    # Brings a guild in line with who is actually in voice after a (re)connect. `in_voice` maps
+    # member id -> (channel id, muted). Sessions persisted by a previous run are adopted first.
+    # Nothing is known about them after that run's last heartbeat, so they end there: the time
+    # the bot was down is never counted as time in voice.
+    async def reconcile(self, guild_id: int, in_voice: Dict[int, Tuple[int, bool]]):
+        now = time()
+        sessions = self.sessions.setdefault(guild_id, {})
+
+        stored, heartbeat = await asyncio.gather(
+            self.redis.hgetall(f"guild:{guild_id}:voice:sessions"),
+            self.redis.get(HEARTBEAT_KEY),
+        )
+        ended = min(self.disconnected_at or now, now)
+        stopped = min(float(heartbeat), now) if heartbeat else ended
+        adopted: Set[int] = set()
+
+        for member_id, raw in stored.items():
+            if int(member_id) not in sessions:
+                sessions[int(member_id)] = VoiceSession.decode(raw)
+                adopted.add(int(member_id))
+
+        for member_id in [m for m in sessions if m not in in_voice]:
+            at = stopped if member_id in adopted else ended
+            self._close(guild_id, member_id, sessions[member_id], at)
+
+        for member_id, (channel_id, muted) in in_voice.items():
+            session = sessions.get(member_id)
+
+            # Anyone who moved while the bot was away is treated as having moved when it left.
+            # An adopted session restarts now, as they may have left and come back meanwhile.
+            if member_id in adopted:
+                self._close(guild_id, member_id, session, stopped)
+            elif session is not None and session.channel_id != channel_id:
+                self._close(guild_id, member_id, session, ended)
+
+            self.update(guild_id, member_id, channel_id, muted, now, record=False)
+
+    # Keeps running while sessions are open, so the heartbeat stays current.
+    async def _run(self):
+        while self._dirty or self._closed or any(self.sessions.values()):
+            await asyncio.sleep(self.interval)
+
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("Voice flush failed.")
+
+    # Persists the open sessions and closed totals one last time. The sessions are picked up
+    # again by reconcile() on the next start.
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+        await self.flush()
+
+    async def flush(self):
+        watching = any(self.sessions.values())
+
+        if not self._dirty and not self._closed and not watching:
+            return
+
+        dirty, self._dirty = self._dirty, {}
+        closed, self._closed = self._closed, {}
+        pipe = self.redis.pipeline(transaction=False)
+
+        for guild_id, member_ids in dirty.items():
+            sessions = self.sessions.get(guild_id, {})
+            key = f"guild:{guild_id}:voice:sessions"
+            opened = {m: sessions[m].encode() for m in member_ids if m in sessions}
+            gone = [m for m in member_ids if m not in sessions]
+
+            if opened:
+                pipe.hset(key, mapping=opened)
+            if gone:
+                pipe.hdel(key, *gone)
+
+        for guild_id, members in closed.items():
+            total = 0.0
+
+            for member_id, (seconds, muted) in members.items():
+                pipe.hincrbyfloat(f"guild:{guild_id}:voice:minutes", member_id, seconds / 60)
+
+                if muted:
+                    pipe.hincrbyfloat(
+                        f"guild:{guild_id}:voice:muted_minutes", member_id, muted / 60
+                    )
+
+                total += seconds
+
+            pipe.hincrbyfloat(f"guild:{guild_id}:stats", "voice_minutes", total / 60)
+
+        if watching:
+            pipe.set(HEARTBEAT_KEY, repr(time()))
+
+        await pipe.execute()